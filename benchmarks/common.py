@@ -0,0 +1,97 @@
+"""
+Helpers shared by the benchmarks: timing, the maps they run on and the metadata of a run.
+"""
+from constants.enums import FieldType
+from simulation import initialize
+from simulation.pheromones import Coords, PathIndex
+from simulation.shortest_path import distance_field
+
+from PIL import Image
+
+import contextlib
+import io
+import os
+import platform
+import statistics
+import subprocess
+import time
+import numpy as np
+
+MAP_IMAGE = "assets/mapav4.png"
+SIMPLE_SAVE = "ant.npz"
+
+
+def timed(function, repeats: int) -> dict:
+    """Milliseconds per call of `function`, over `repeats` calls."""
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        "repeats": repeats,
+        "mean_ms": statistics.fmean(samples),
+        "median_ms": statistics.median(samples),
+        "min_ms": min(samples),
+    }
+
+
+def quiet():
+    """Swallow the progress prints of the simulation."""
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def image_array(path: str = MAP_IMAGE) -> np.ndarray:
+    with Image.open(path) as image:
+        return np.asarray(image)[:, :, :3]
+
+
+def map_grid(path: str = MAP_IMAGE) -> np.ndarray:
+    with quiet():
+        return initialize.mapImageToFieldType(image_array(path))
+
+
+def simple_grid() -> np.ndarray:
+    with np.load(SIMPLE_SAVE) as loaded:
+        return loaded["grid"]
+
+
+def synthetic_grid(size: tuple[int, int], spacing: int = 4, gaps: float = 0.1, seed: int = 0) -> np.ndarray:
+    """Grass crossed by a lattice of paths every `spacing` cells, with a fraction of the path cells removed."""
+    grid = np.full(size, FieldType.GRASS.value, dtype=np.uint8)
+    grid[::spacing, :] = FieldType.PATH.value
+    grid[:, ::spacing] = FieldType.PATH.value
+    removed = np.random.default_rng(seed).random(size) < gaps
+    grid[removed & (grid == FieldType.PATH.value)] = FieldType.GRASS.value
+    return grid
+
+
+def far_apart(grid: np.ndarray) -> tuple[Coords, Coords]:
+    """A path cell and the path cell furthest away from it that can be reached."""
+    index = PathIndex.from_grid(grid)
+    source = tuple(int(c) for c in index.coords[0])
+    target = tuple(int(c) for c in index.coords[distance_field(index, source).argmax()])
+    return source, target
+
+
+def metadata() -> dict:
+    """What the results depend on, to tell runs apart when comparing them."""
+    # imported here, so importing the benchmarks doesn't load Numba
+    from simulation import kernels
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        # without Numba the COMPILED engine steps with NumPy
+        "numba": kernels.numba.__version__ if kernels.AVAILABLE else None,
+        "cpus": os.cpu_count(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+    }
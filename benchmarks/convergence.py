@@ -0,0 +1,82 @@
+"""
+Convergence quality of a pheromone run against the exact shortest path.
+
+Every interval ticks the route the ants learned is compared with the optimum:
+    python -m benchmarks.convergence --simple-map --source 6,15 --target 6,31
+"""
+from constants.types import parse_coords
+from settings.simulation_settings import get_default_simulation_settings
+from simulation.headless import HeadlessSimulation
+from simulation.shortest_path import distance_field, UNREACHABLE
+
+import argparse
+import contextlib
+import io
+import json
+import time
+
+
+def measure(sim: HeadlessSimulation, ticks: int, interval: int) -> list[dict]:
+    """
+    Returns:
+        One record per check with the tick, the elapsed time, the learned route length,
+        the optimal length and their ratio (None while the ants have no route).
+    """
+    optimum = int(distance_field(sim.store.index, sim.target)[sim.store.index.id_of(sim.source)])
+    if optimum == UNREACHABLE:
+        raise ValueError(f"target {sim.target} can't be reached from {sim.source}")
+
+    records = []
+    start = time.perf_counter()
+    while sim.ticks < ticks:
+        # the population reports every generation, which would drown the table
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(min(interval, ticks - sim.ticks)):
+                sim.step()
+        route = sim.routes.route(sim.source, sim.target)
+        length = route.length if route is not None else None
+        records.append({
+            "tick": sim.ticks,
+            "seconds": time.perf_counter() - start,
+            "route_length": length,
+            "optimal_length": optimum,
+            "ratio": length / optimum if length is not None and optimum > 0 else None,
+        })
+    return records
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", type=parse_coords, required=True, help="source tile as x,y")
+    parser.add_argument("--target", type=parse_coords, required=True, help="target tile as x,y")
+    parser.add_argument("--ticks", type=int, default=10_000)
+    parser.add_argument("--interval", type=int, default=100, help="ticks between measurements")
+    parser.add_argument("--simple-map", action="store_true", help="use the small map saved in ant.npz")
+    parser.add_argument("--node-max-smell", type=float)
+    parser.add_argument("--exploration-chance", type=float)
+    parser.add_argument("--spawn-interval", type=int)
+    parser.add_argument("--json", help="also write the records to this file")
+    args = parser.parse_args()
+
+    sim_settings = get_default_simulation_settings()
+    sim_settings.generic.simple_map = args.simple_map
+    sim_settings.generic.create_grid_from_img = not args.simple_map
+    if args.node_max_smell is not None:
+        sim_settings.generic.node_max_smell = args.node_max_smell
+    if args.exploration_chance is not None:
+        sim_settings.population.exploration_chance = args.exploration_chance
+    if args.spawn_interval is not None:
+        sim_settings.population.spawn_interval = args.spawn_interval
+    save_name = "ant.npz" if args.simple_map else "agh.npz"
+
+    sim = HeadlessSimulation(save_name, sim_settings, args.source, args.target)
+    records = measure(sim, args.ticks, args.interval)
+
+    print(f"{'tick':>8} {'seconds':>8} {'route':>6} {'optimum':>8} {'ratio':>6}")
+    for record in records:
+        ratio = f"{record['ratio']:.2f}" if record["ratio"] is not None else "-"
+        route = record["route_length"] if record["route_length"] is not None else "-"
+        print(f"{record['tick']:>8} {record['seconds']:>8.2f} {route:>6} {record['optimal_length']:>8} {ratio:>6}")
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(records, file, indent=2)
@@ -0,0 +1,67 @@
+"""
+Frame time of every `AntRenderer` draw method, drawn offscreen with SDL's dummy video driver.
+"""
+from benchmarks.common import far_apart, quiet, timed
+from settings.display_settings import DisplaySettings
+from settings.simulation_settings import get_default_simulation_settings
+
+import os
+
+
+def run(repeats: int = 200, ants: int = 1_000, ticks: int = 200, node_capacity: int = 0) -> list[dict]:
+    # has to be set before pygame opens the window
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    from simulation.drawing import AntRenderer
+    from simulation.simulation import PygameSimulation
+
+    sim_settings = get_default_simulation_settings()
+    sim_settings.population.ants_per_generation = ants
+    sim_settings.population.spawn_interval = 10 ** 9
+    sim_settings.generic.seed = 0
+    # without a limit the ants spread along the route instead of queueing on the source
+    sim_settings.generic.node_capacity = node_capacity
+    renderer = AntRenderer()
+    with quiet():
+        sim = PygameSimulation("agh.npz", renderer, sim_settings, DisplaySettings())
+        source, target = far_apart(sim.grid)
+        sim.set_source(source)
+        sim.set_target(target)
+        for _ in range(ticks):
+            sim.population.step(sim.grid, sim.objects, sim.nodes)
+        sim.show_pheromones = True
+        # builds the resources and caches the static layers
+        renderer.draw(sim)
+
+    def draw_uncached_grid():
+        renderer.terrain_view = None
+        renderer.draw_grid(sim)
+
+    def draw_fitted_frame():
+        # the whole map in the window, through the downsampled terrain when it doesn't fit
+        renderer.camera.fit()
+        renderer.draw(sim)
+
+    def draw_refreshed_pheromones():
+        renderer.pheromone_view = None
+        renderer.draw_pheromones(sim)
+
+    def draw_frame():
+        renderer.draw(sim)
+
+    methods = {
+        "draw_grid": lambda: renderer.draw_grid(sim),
+        "draw_grid (uncached)": draw_uncached_grid,
+        "draw_pheromones": lambda: renderer.draw_pheromones(sim),
+        "draw_pheromones (refreshed)": draw_refreshed_pheromones,
+        "draw_population": lambda: renderer.draw_population(sim),
+        "draw_source_and_target": lambda: renderer.draw_source_and_target(sim),
+        "draw_text": lambda: renderer.draw_text(sim),
+        "draw": draw_frame,
+        "draw (whole map)": draw_fitted_frame,
+    }
+    screen_size = list(sim.screen.get_size())
+    return [
+        {"method": name, "screen_size": screen_size, "ants": len(sim.population),
+         "node_capacity": node_capacity, **timed(method, repeats)}
+        for name, method in methods.items()
+    ]
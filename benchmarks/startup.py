@@ -0,0 +1,54 @@
+"""
+Startup costs: memory and time of `init_nodes` and time of converting a map image with `mapImageToFieldType`.
+"""
+from benchmarks.common import image_array, map_grid, quiet, simple_grid, synthetic_grid, timed
+from settings.simulation_settings import get_default_simulation_settings
+from simulation import initialize
+
+import time
+import tracemalloc
+import numpy as np
+
+SYNTHETIC_SIZES = ((500, 500), (1000, 1000), (2000, 2000))
+# the map image repeated this many times in both directions
+IMAGE_TILINGS = (1, 4, 16)
+
+
+def init_nodes_cost(name: str, grid: np.ndarray) -> dict:
+    """Time of a single `init_nodes` call and the memory it allocates, numpy arrays included."""
+    sim_settings = get_default_simulation_settings()
+    sim_settings.generic.grid_size = grid.shape
+    with quiet():
+        tracemalloc.start()
+        start = time.perf_counter()
+        nodes = initialize.init_nodes(grid, sim_settings)
+        elapsed = time.perf_counter() - start
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {
+        "map": name,
+        "grid_size": list(grid.shape),
+        "path_cells": nodes.store.index.size,
+        "seconds": elapsed,
+        "retained_bytes": current,
+        "peak_bytes": peak,
+    }
+
+
+def map_conversion_cost(tiling: int, repeats: int) -> dict:
+    image = np.tile(image_array(), (tiling, tiling, 1))
+
+    def convert():
+        with quiet():
+            initialize.mapImageToFieldType(image)
+
+    return {"image_size": [image.shape[1], image.shape[0]], **timed(convert, repeats)}
+
+
+def run(repeats: int = 5) -> dict:
+    grids = [("simple", simple_grid()), ("mapav4", map_grid())]
+    grids += [(f"synthetic {w}x{h}", synthetic_grid((w, h))) for w, h in SYNTHETIC_SIZES]
+    return {
+        "init_nodes": [init_nodes_cost(name, grid) for name, grid in grids],
+        "map_conversion": [map_conversion_cost(tiling, repeats) for tiling in IMAGE_TILINGS],
+    }
@@ -0,0 +1,73 @@
+"""
+Ticks per second of `Population.step` for growing numbers of ants.
+"""
+from benchmarks.common import far_apart, map_grid, quiet
+from constants.enums import PheromoneStorage, StepEngine
+from settings.simulation_settings import get_default_simulation_settings
+from simulation.headless import HeadlessSimulation
+
+import time
+import numpy as np
+
+ANT_COUNTS = (10, 100, 1_000, 10_000)
+# with a capacity the ants of a generation queue on the spawn cell and the ticks mostly measure the queue,
+# no limit by default so they measure the stepping
+NODE_CAPACITIES = (0,)
+
+
+def ticks_per_second(grid: np.ndarray, engine: StepEngine, ants: int, max_ticks: int, max_seconds: float,
+                     storage: PheromoneStorage = PheromoneStorage.CHUNKED, node_capacity: int = 0, warmup: int = 5,
+                     seed: int = 0) -> dict:
+    """
+    Step a single generation of `ants` ants for max_ticks, or for max_seconds when that is shorter.
+    The first `warmup` ticks aren't measured.
+    """
+    sim_settings = get_default_simulation_settings()
+    sim_settings.population.engine = engine
+    sim_settings.population.ants_per_generation = ants
+    # one generation for the whole measurement, a new one only comes when all the ants arrived
+    sim_settings.population.spawn_interval = 10 ** 9
+    sim_settings.generic.seed = seed
+    sim_settings.generic.pheromone_storage = storage
+    sim_settings.generic.node_capacity = node_capacity
+    source, target = far_apart(grid)
+
+    with quiet():
+        sim = HeadlessSimulation(None, sim_settings, source, target, grid=grid)
+        for _ in range(warmup):
+            sim.step()
+
+        ticks = 0
+        start = time.perf_counter()
+        deadline = start + max_seconds
+        while ticks < max_ticks:
+            sim.step()
+            ticks += 1
+            if time.perf_counter() >= deadline:
+                break
+        elapsed = time.perf_counter() - start
+
+    return {
+        "engine": engine.name,
+        "ants": ants,
+        "storage": storage.name,
+        "node_capacity": node_capacity,
+        "ticks": ticks,
+        "seconds": elapsed,
+        "ticks_per_second": ticks / elapsed,
+        "ant_steps_per_second": ticks * ants / elapsed,
+    }
+
+
+def run(max_ticks: int = 500, max_seconds: float = 5.0, ant_counts: tuple[int, ...] = ANT_COUNTS,
+        engines: tuple[StepEngine, ...] = tuple(StepEngine),
+        storages: tuple[PheromoneStorage, ...] = tuple(PheromoneStorage),
+        node_capacities: tuple[int, ...] = NODE_CAPACITIES) -> list[dict]:
+    grid = map_grid()
+    return [
+        ticks_per_second(grid, engine, ants, max_ticks, max_seconds, storage, node_capacity)
+        for node_capacity in node_capacities
+        for storage in storages
+        for engine in engines
+        for ants in ant_counts
+    ]
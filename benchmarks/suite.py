@@ -0,0 +1,69 @@
+"""
+Benchmarks of the simulation and rendering hot paths, saved as JSON to compare runs between commits:
+    python -m benchmarks.suite --output before.json
+    python -m benchmarks.suite --output after.json --compare before.json
+"""
+from benchmarks import render, startup, step
+from benchmarks.common import metadata
+
+import argparse
+import json
+
+SECTIONS = ("step", "startup", "render")
+
+# how the records of two runs are matched and which of their numbers are compared
+COMPARED = {
+    "step": (("engine", "ants", "storage", "node_capacity"), ("ticks_per_second",)),
+    "init_nodes": (("map",), ("seconds", "peak_bytes")),
+    "map_conversion": (("image_size",), ("median_ms",)),
+    "render": (("method", "node_capacity"), ("median_ms",)),
+}
+
+
+def run(sections: tuple[str, ...] = SECTIONS, quick: bool = False) -> dict:
+    results = {"metadata": metadata()}
+    if "step" in sections:
+        results["step"] = step.run(max_ticks=50 if quick else 500, max_seconds=1.0 if quick else 5.0)
+    if "startup" in sections:
+        results.update(startup.run(repeats=1 if quick else 5))
+    if "render" in sections:
+        results["render"] = render.run(repeats=20 if quick else 200)
+    return results
+
+
+def compare(baseline: dict, results: dict) -> list[str]:
+    """A line for every number measured in both runs, with the new value relative to the baseline."""
+    lines = []
+    for section, (keys, values) in COMPARED.items():
+        # records of older runs may lack a key, they then match nothing
+        before = {tuple(str(record.get(key)) for key in keys): record for record in baseline.get(section, [])}
+        for record in results.get(section, []):
+            key = tuple(str(record.get(key)) for key in keys)
+            if key not in before:
+                continue
+            for value in values:
+                old, new = before[key][value], record[value]
+                ratio = f"{new / old:.2f}x" if old else "-"
+                lines.append(f"{section} {' '.join(key)} {value}: {old:.4g} -> {new:.4g} ({ratio})")
+    return lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="benchmark.json", help="where to write the results")
+    parser.add_argument("--compare", help="results of an earlier run to compare with")
+    parser.add_argument("--only", nargs="+", choices=SECTIONS, default=SECTIONS, help="run only these benchmarks")
+    parser.add_argument("--quick", action="store_true", help="fewer repeats, for a rough check")
+    args = parser.parse_args()
+
+    results = run(tuple(args.only), args.quick)
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(json.dumps({name: value for name, value in results.items() if name != "metadata"}, indent=2))
+    print("Saved results to", args.output)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        print(f"\ncompared with {baseline['metadata']['commit']}:")
+        print("\n".join(compare(baseline, results)))
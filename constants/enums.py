@@ -22,3 +22,19 @@ class ObjectType(Enum):
     HUNTER = 1
     SOURCE = 2
     TARGET = 3
+
+
+class StepEngine(Enum):
+    REFERENCE = 0
+    VECTORIZED = 1
+    COMPILED = 2
+
+
+class SpawnMode(Enum):
+    SINGLE_PAIR = 0
+    ALL_PAIRS = 1
+
+
+class PheromoneStorage(Enum):
+    CHUNKED = 0
+    SPARSE = 1
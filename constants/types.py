@@ -0,0 +1,8 @@
+# (x, y) position of a grid cell
+Coords = tuple[int, int]
+
+
+def parse_coords(text: str) -> Coords:
+    """Read an "x,y" command line argument."""
+    x, y = text.split(",")
+    return int(x), int(y)
@@ -0,0 +1,47 @@
+from constants.types import parse_coords
+from settings.simulation_settings import get_default_simulation_settings
+from simulation.headless import HeadlessSimulation
+from simulation.snapshot import Checkpointer
+
+import argparse
+import time
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the ant simulation without a window.")
+    parser.add_argument("--source", type=parse_coords, required=True, help="source tile as x,y")
+    parser.add_argument("--target", type=parse_coords, required=True, help="target tile as x,y")
+    parser.add_argument("--ticks", type=int, default=10_000, help="maximum number of ticks")
+    parser.add_argument("--check-interval", type=int, default=500,
+                        help="ticks between convergence checks, 0 to always run all ticks")
+    parser.add_argument("--patience", type=int, default=5,
+                        help="number of checks the best path has to stay the same to stop")
+    parser.add_argument("--simple-map", action="store_true", help="use the small map saved in ant.npz")
+    parser.add_argument("--output", default="headless_run.npz", help="where to write the pheromones and best path")
+    parser.add_argument("--checkpoint", help="save the run to this snapshot file while it runs, it loads like any save")
+    parser.add_argument("--checkpoint-interval", type=int, default=1000, help="ticks between checkpoints")
+    parser.add_argument("--metrics-log", help="log the phase timings and ant counts of every tick to a .csv or .json file")
+    parser.add_argument("--profile", help="dump cProfile stats of the run to this file")
+    args = parser.parse_args()
+
+    sim_settings = get_default_simulation_settings()
+    sim_settings.generic.simple_map = args.simple_map
+    sim_settings.generic.create_grid_from_img = not args.simple_map
+    save_name = "ant.npz" if args.simple_map else "agh.npz"
+    sim_settings.metrics.enabled = args.metrics_log is not None or args.profile is not None
+    sim_settings.metrics.log_path = args.metrics_log
+    sim_settings.metrics.profile_path = args.profile
+
+    sim = HeadlessSimulation(save_name, sim_settings, args.source, args.target)
+    start = time.perf_counter()
+    checkpointer = Checkpointer(args.checkpoint) if args.checkpoint is not None else None
+    converged = sim.run(args.ticks, args.check_interval, args.patience, checkpointer, args.checkpoint_interval)
+    elapsed = time.perf_counter() - start
+    sim.metrics.close()
+
+    path = sim.best_path()
+    print(f"{'converged' if converged else 'stopped'} after {sim.ticks} ticks "
+          f"({sim.ticks / elapsed:.0f} ticks/s)")
+    print("best path length:", len(path) - 1 if path is not None else "no path found")
+    sim.save(args.output)
+    print("Saved pheromones and best path to", args.output)
@@ -1,6 +1,5 @@
 from constants.enums import FieldType
 from dataclasses import dataclass
-import pygame as pg
 
 
 @dataclass
@@ -13,17 +12,26 @@ class DisplaySettings:
         FieldType.WATER: (0, 0, 255),
         FieldType.URBAN: (100, 100, 100)
     }
-    ant_image = pg.image.load("assets/ant.png")
-    colony_image = pg.image.load("assets/colony.png")
-    food_image = pg.image.load("assets/food.png")
-    # read from from ant.npz
-    GRID_WIDTH_OLD = 30
-    GRID_HEIGHT_OLD = 50
+    # loaded by the renderer the first time they are drawn
+    ant_image_path: str = "assets/ant.png"
+    colony_image_path: str = "assets/colony.png"
+    food_image_path: str = "assets/food.png"
+    # grid sizes are read from ant.npz and the map image
     TILE_SIZE_OLD = 20
 
     # new map
-    GRID_WIDTH_NEW = 273
-    GRID_HEIGHT_NEW = 47
     TILE_SIZE_NEW = 7
 
+    # the window fits the whole map at the tile size above up to this size, the rest is reached by panning
+    MAX_WINDOW_SIZE: tuple[int, int] = (1600, 1000)
+
     MAX_FPS: int = 60
+    # simulation ticks run before drawing every frame, changed at runtime with + and -
+    TICKS_PER_FRAME: int = 1
+    MAX_TICKS_PER_FRAME: int = 4096
+    # in the time budgeted mode (toggled with b) the simulation runs for this fraction of every frame instead
+    SIMULATION_BUDGET: float = 0.75
+    # step the simulation in a background thread instead of between frames
+    THREADED_SIMULATION: bool = False
+    # the pheromone heatmap is recomputed at most once per this many ticks
+    PHEROMONE_REFRESH_TICKS: int = 5
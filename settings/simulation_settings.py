@@ -1,69 +1,116 @@
-from constants.enums import TimeStep
-from dataclasses import dataclass
-from simulation.ant import Coords
-
-@dataclass
-class GenericSimulationSettings:
-    """
-    Simulation metadata and other implementation details.
-
-    Attributes:
-        grid_size: The size of the grid in (x, y) format.
-        tile_size: The size of a single tile in the grid in meters.
-        time_step: The time step of the simulation.
-        duration: The duration of the simulation in time steps.
-        map_image_path: The path to the image file used to generate the grid.
-    """
-    grid_size: tuple[int, int] = (100, 100)
-    time_step: TimeStep = TimeStep.HOURLY
-    tile_size: int = 5
-    duration: int = 1000
-    map_image_path: str = "assets/mapav4.png"
-    create_grid_from_img: bool = True
-    simple_map: bool = False
-    target: Coords = (6, 31)
-    source: Coords = (6, 15)
-    # TODO find optimal settings
-    node_capacity: int = 1
-    node_max_smell: float = 4.0
-
-@dataclass
-class PopulationSettings:
-    """
-    Simulation metadata and other implementation details.
-
-    Attributes:
-        spawn_interval: The interval at which new ants are spawned.
-        time_to_spawn: The time remaining until the next spawn.
-
-    """
-    spawn_interval: int = 150
-    time_to_spawn: int = 0
-
-
-
-
-
-@dataclass
-class SimulationSettings:
-    """
-    Simulation settings for the fox model.
-
-    Attributes:
-        generic: Simulation parameters related to implementation details.
-    """
-    generic: GenericSimulationSettings
-    population: PopulationSettings
-
-
-def get_default_simulation_settings() -> SimulationSettings:
-    """
-    Get the default settings for the fox model.
-
-    Returns:
-        The default settings.
-    """
-    return SimulationSettings(
-        generic=GenericSimulationSettings(),
-        population=PopulationSettings(),
-    )
+from constants.enums import TimeStep, StepEngine, SpawnMode, PheromoneStorage
+from dataclasses import dataclass, field
+from constants.types import Coords
+
+@dataclass
+class GenericSimulationSettings:
+    """
+    Simulation metadata and other implementation details.
+
+    Attributes:
+        grid_size: The size of the grid in (x, y) format.
+        tile_size: The size of a single tile in the grid in meters.
+        time_step: The time step of the simulation.
+        duration: The duration of the simulation in time steps.
+        map_image_path: The path to the image file used to generate the grid.
+        node_capacity: The number of ants a node holds at once, ants heading into a full node wait.
+            0 for no limit.
+        pheromone_storage: CHUNKED allocates the values of a destination in chunks of nodes as they are written,
+            SPARSE keeps only the nodes with values of at least pheromone_cutoff.
+        pheromone_cutoff: Values below it are dropped by the SPARSE storage.
+        evaporation_rate: Fraction of every pheromone value lost every tick, only with the SPARSE storage.
+        seed: Seed of the simulation random number generator, None for a different run every time.
+    """
+    grid_size: tuple[int, int] = (100, 100)
+    time_step: TimeStep = TimeStep.HOURLY
+    tile_size: int = 5
+    duration: int = 1000
+    map_image_path: str = "assets/mapav4.png"
+    create_grid_from_img: bool = True
+    simple_map: bool = False
+    target: Coords | None = (6, 31)
+    source: Coords | None = (6, 15)
+    # TODO find optimal settings
+    node_capacity: int = 1
+    node_max_smell: float = 4.0
+    pheromone_storage: PheromoneStorage = PheromoneStorage.CHUNKED
+    pheromone_cutoff: float = 1e-4
+    evaporation_rate: float = 0.0
+    seed: int | None = None
+
+@dataclass
+class PopulationSettings:
+    """
+    Simulation metadata and other implementation details.
+
+    Attributes:
+        spawn_interval: The interval at which new ants are spawned.
+        time_to_spawn: The time remaining until the next spawn.
+        ants_per_generation: The number of ants spawned at once.
+        exploration_chance: The chance that an ant picks a random neighbor instead of following pheromones.
+        engine: REFERENCE steps every Ant object separately, VECTORIZED steps the whole colony at once,
+            COMPILED steps it with Numba kernels, or like VECTORIZED when Numba is not installed.
+            REFERENCE writes the pheromones of every ant before the next one chooses its step, the others
+            choose for all the ants first, so with more than one ant REFERENCE takes different steps,
+            with or without a node capacity. VECTORIZED and COMPILED take the same ones.
+        spawn_mode: SINGLE_PAIR sends ants from the generic source to the generic target,
+            ALL_PAIRS sends them from every active destination to uniformly random other ones.
+        destinations: The active destinations of the ALL_PAIRS mode.
+        random_destinations: The number of path cells picked as active destinations when none are given.
+        ants_per_node: The number of ants every active destination launches per spawn in the ALL_PAIRS mode.
+    """
+    spawn_interval: int = 150
+    time_to_spawn: int = 0
+    ants_per_generation: int = 10
+    exploration_chance: float = 0.3
+    engine: StepEngine = StepEngine.VECTORIZED
+    spawn_mode: SpawnMode = SpawnMode.SINGLE_PAIR
+    destinations: list[Coords] = field(default_factory=list)
+    random_destinations: int = 16
+    ants_per_node: int = 10
+
+
+@dataclass
+class MetricsSettings:
+    """
+    Timing and counting of the simulation phases.
+
+    Attributes:
+        enabled: Whether the phases are timed and the ants counted, off costs close to nothing.
+        log_path: A .csv or .json file to log every tick into, None for no log.
+        profile_path: A file to dump cProfile stats of the run into, None for no profiling.
+    """
+    enabled: bool = False
+    log_path: str | None = None
+    profile_path: str | None = None
+
+
+
+
+
+@dataclass
+class SimulationSettings:
+    """
+    Simulation settings for the fox model.
+
+    Attributes:
+        generic: Simulation parameters related to implementation details.
+        metrics: Instrumentation of the simulation.
+    """
+    generic: GenericSimulationSettings
+    population: PopulationSettings
+    metrics: MetricsSettings = field(default_factory=MetricsSettings)
+
+
+def get_default_simulation_settings() -> SimulationSettings:
+    """
+    Get the default settings for the fox model.
+
+    Returns:
+        The default settings.
+    """
+    return SimulationSettings(
+        generic=GenericSimulationSettings(),
+        population=PopulationSettings(),
+        metrics=MetricsSettings(),
+    )
@@ -0,0 +1,81 @@
+import math
+import numpy as np
+
+# on-screen tile sizes in pixels the zoom is limited to
+MIN_TILE_SIZE = 1 / 64
+MAX_TILE_SIZE = 64
+
+
+class Camera:
+    """
+    The part of the grid shown in the window.
+
+    Attributes:
+        grid_size: The (W, H) size of the grid in tiles.
+        screen_size: The (w, h) size of the window in pixels.
+        tile_size: On-screen size of a tile in pixels, below 1 when zoomed out far.
+        x, y: Grid position of the top left corner of the window, in tiles.
+    """
+    def __init__(self, grid_size: tuple[int, int], screen_size: tuple[int, int], tile_size: float):
+        self.grid_size = grid_size
+        self.screen_size = screen_size
+        self.tile_size = float(tile_size)
+        self.x = 0.0
+        self.y = 0.0
+
+    @property
+    def key(self) -> tuple[float, float, float]:
+        """Changes whenever the view does, for caching what was drawn for it."""
+        return self.x, self.y, self.tile_size
+
+    @property
+    def level(self) -> int:
+        """Mip level of the view, 0 while a tile takes at least a pixel and one more every time tiles halve."""
+        return max(0, math.floor(-math.log2(self.tile_size)))
+
+    def visible(self) -> tuple[int, int, int, int]:
+        """(x0, y0, x1, y1) range of the tiles in the window, the ends excluded."""
+        x0 = max(0, math.floor(self.x))
+        y0 = max(0, math.floor(self.y))
+        x1 = min(self.grid_size[0], math.ceil(self.x + self.screen_size[0] / self.tile_size))
+        y1 = min(self.grid_size[1], math.ceil(self.y + self.screen_size[1] / self.tile_size))
+        return x0, y0, max(x0, x1), max(y0, y1)
+
+    def to_screen(self, x: np.ndarray | float, y: np.ndarray | float):
+        """Pixel position of the top left corner of tiles."""
+        return (x - self.x) * self.tile_size, (y - self.y) * self.tile_size
+
+    def to_grid(self, px: float, py: float) -> tuple[int, int]:
+        """The tile under a pixel, clamped to the grid."""
+        x = math.floor(self.x + px / self.tile_size)
+        y = math.floor(self.y + py / self.tile_size)
+        return min(max(x, 0), self.grid_size[0] - 1), min(max(y, 0), self.grid_size[1] - 1)
+
+    def pan(self, dx: float, dy: float):
+        """Move the view by a number of pixels."""
+        self.x += dx / self.tile_size
+        self.y += dy / self.tile_size
+        self.clamp()
+
+    def zoom(self, factor: float, around: tuple[float, float]):
+        """Scale the tiles by a factor, keeping the point under the `around` pixel in place."""
+        gx = self.x + around[0] / self.tile_size
+        gy = self.y + around[1] / self.tile_size
+        self.tile_size = min(max(self.tile_size * factor, MIN_TILE_SIZE), MAX_TILE_SIZE)
+        self.x = gx - around[0] / self.tile_size
+        self.y = gy - around[1] / self.tile_size
+        self.clamp()
+
+    def fit(self):
+        """Zoom out or in to show the whole grid."""
+        fitting = min(self.screen_size[0] / self.grid_size[0], self.screen_size[1] / self.grid_size[1])
+        self.tile_size = min(max(fitting, MIN_TILE_SIZE), MAX_TILE_SIZE)
+        self.x = self.y = 0.0
+        self.clamp()
+
+    def clamp(self):
+        # the view can't leave the grid, a grid smaller than the window stays at the top left
+        width = self.screen_size[0] / self.tile_size
+        height = self.screen_size[1] / self.tile_size
+        self.x = min(max(self.x, 0.0), max(0.0, self.grid_size[0] - width))
+        self.y = min(max(self.y, 0.0), max(0.0, self.grid_size[1] - height))
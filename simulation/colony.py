@@ -0,0 +1,171 @@
+from simulation.congestion import Congestion
+from simulation.metrics import Metrics
+from simulation.pheromones import Coords, PheromoneStore
+
+import numpy as np
+
+# index shift from a direction to the opposite one (up <-> down, right <-> left)
+OPPOSITE_SHIFT = 2
+
+
+class Colony:
+    """
+    Whole-colony step engine, the batched counterpart of stepping every `Ant` separately.
+
+    Ant state is kept in flat arrays indexed by ant, with cells referred to by
+    their `PathIndex` id:
+        node: the cell the ant is standing on.
+        source: the cell the ant was spawned in.
+        destination: the cell the ant is heading to.
+        age: the number of ticks the ant has lived, waiting ones included.
+        waiting: the number of ticks the ant has been waiting for a place in a full node.
+
+    Ants take up a place in the node they stand on as kept by `congestion`.
+    """
+    def __init__(self, store: PheromoneStore, exploration_chance: float, rng: np.random.Generator = None,
+                 metrics: Metrics = None, congestion: Congestion = None):
+        self.store = store
+        self.exploration_chance = exploration_chance
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.congestion = congestion if congestion is not None else Congestion(store.index.size, 0)
+
+
+        self.node = np.zeros(0, dtype=np.int32)
+        self.source = np.zeros(0, dtype=np.int32)
+        self.source_layer = np.zeros(0, dtype=np.int32)
+        self.destination = np.zeros(0, dtype=np.int32)
+        self.age = np.zeros(0, dtype=np.int32)
+        self.waiting = np.zeros(0, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self.node)
+
+    def positions(self) -> np.ndarray:
+        """(N, 2) array with the (x, y) position of every ant."""
+        return self.store.index.coords[self.node]
+
+    def clear(self):
+        self.metrics.count("expired", len(self))
+        self.keep(np.zeros(len(self), dtype=bool))
+
+    def drop_at(self, node: int):
+        """Remove the ants standing on or heading to a node."""
+        self.keep((self.node != node) & (self.destination != node))
+
+    def keep(self, alive: np.ndarray):
+        # the removed ants give their places back
+        self.congestion.leave(self.node[~alive])
+        self.node = self.node[alive]
+        self.source = self.source[alive]
+        self.source_layer = self.source_layer[alive]
+        self.destination = self.destination[alive]
+        self.age = self.age[alive]
+        self.waiting = self.waiting[alive]
+
+    def spawn(self, sources: list[Coords], destinations: list[Coords]):
+        index = self.store.index
+        source = index.ids_of(np.array(sources, dtype=np.int32).reshape(-1, 2))
+        destination = index.ids_of(np.array(destinations, dtype=np.int32).reshape(-1, 2))
+        if (source < 0).any() or (destination < 0).any():
+            raise ValueError("ants can only travel between path cells")
+        # every ant deposits on the layer of its source
+        source_layer = np.array([self.store.layer_id(pos) for pos in map(tuple, sources)], dtype=np.int32)
+
+        self.node = np.concatenate([self.node, source])
+        self.source = np.concatenate([self.source, source])
+        self.source_layer = np.concatenate([self.source_layer, source_layer])
+        self.destination = np.concatenate([self.destination, destination])
+        self.age = np.concatenate([self.age, np.zeros(len(source), dtype=np.int32)])
+        self.waiting = np.concatenate([self.waiting, np.zeros(len(source), dtype=np.int32)])
+        self.congestion.enter(source)
+        self.metrics.count("spawned", len(source))
+
+    def choose_step_direction(self) -> np.ndarray:
+        count = len(self)
+        # read from the index every tick, its links change when the map is edited
+        has_neighbor = self.store.index.neighbors[self.node] >= 0
+
+        destination_layer = self.store.layer_of_node[self.destination]
+        smells = np.zeros((count, 4), dtype=np.float32)
+        known = destination_layer >= 0
+        smells[known] = self.store.read(destination_layer[known], self.node[known])
+        smells *= has_neighbor
+
+        # all the random numbers of the tick in one batch, the same two per ant as `Ant.choose_step_direction`
+        draws = self.rng.random((count, 2))
+
+        exploring = draws[:, 0] < self.exploration_chance
+        exploring &= self.destination != self.source
+        # edge case of initial exploration when all pheromones are 0
+        exploring |= ~smells.any(axis=1)
+
+        # uniformly random direction among the existing neighbors
+        pick = (draws[:, 1] * has_neighbor.sum(axis=1)).astype(np.int32)
+        explored = (np.cumsum(has_neighbor, axis=1) > pick[:, None]).argmax(axis=1)
+
+        return np.where(exploring, explored, smells.argmax(axis=1))
+
+    def step(self):
+        if len(self) == 0:
+            return
+        self.age += 1
+
+        with self.metrics.timer("choose"):
+            direction = self.choose_step_direction()
+        with self.metrics.timer("move"):
+            moved, blocked = self.move(direction)
+
+        self.transfer(moved, direction)
+
+        arrived = self.node == self.destination
+        if self.metrics.enabled:
+            self.metrics.count("stalled", len(self) - int(moved.sum()))
+            self.metrics.count("blocked", int(blocked.sum()))
+            self.metrics.count("arrived", int(arrived.sum()))
+        if arrived.any():
+            self.keep(~arrived)
+
+    def move(self, direction: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Step the ants in the directions, returns which ants moved and which were held back by full nodes."""
+        target = self.store.index.neighbors[self.node, direction]
+        moved = target >= 0
+        blocked = self.admit(moved, target)
+        self.node = np.where(moved, target, self.node)
+        return moved, blocked
+
+    def admit(self, moved: np.ndarray, target: np.ndarray) -> np.ndarray:
+        """
+        Hold back the ants heading into full nodes, moving the places of the rest.
+
+        Clears `moved` for the held back ants, which wait and grow older where they are.
+        Returns which ants were held back.
+        """
+        if not self.congestion.limited:
+            return np.zeros(len(self), dtype=bool)
+        candidates = np.flatnonzero(moved)
+        # ants arriving at their destination leave the nodes right away, so they always fit
+        fits = self.congestion.admit(self.node[candidates], target[candidates], self.waiting[candidates],
+                                     exempt=target[candidates] == self.destination[candidates])
+        blocked = np.zeros(len(self), dtype=bool)
+        blocked[candidates[~fits]] = True
+        moved &= ~blocked
+        self.waiting = np.where(blocked, self.waiting + 1, 0)
+        self.congestion.move(self.node[moved], target[moved])
+        return blocked
+
+    def transfer(self, moved: np.ndarray, direction: np.ndarray):
+        layer = self.source_layer[moved]
+        node = self.node[moved]
+        back = (direction[moved] + OPPOSITE_SHIFT) % 4
+        delta = self.pheromone_deposited()[moved]
+
+        # the visited entry is the link leading back to where the ant came from
+        with self.metrics.timer("deposit"):
+            self.store.deposit_many(layer, node, back, delta)
+        # then all the entries of the node for the source decay
+        with self.metrics.timer("decay"):
+            self.store.decay_many(layer, node, delta)
+
+    def pheromone_deposited(self) -> np.ndarray:
+        return (1 / np.sqrt(self.age)).astype(np.float32)
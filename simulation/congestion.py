@@ -0,0 +1,109 @@
+import numpy as np
+
+# rounds of `Congestion.admit` that let ants follow the ones leaving a full node within the same tick,
+# ants further back in a longer queue move up on the next tick
+ADMISSION_ROUNDS = 8
+
+
+class Congestion:
+    """
+    Number of ants standing on every node and the node capacity limiting it.
+
+    An ant that wants to step into a node with no spare capacity waits where it is,
+    growing older, so trails through congested nodes get less pheromone. Ants
+    contending for the last places of a node are admitted in the order of how long
+    they have been waiting. Ants give their place back when they move on, arrive or
+    are removed with their generation.
+
+    Attributes:
+        capacity: The number of ants a node holds at once, 0 for no limit.
+        occupancy: (P,) array with the number of ants on every node id, only kept when there is a limit.
+    """
+    def __init__(self, size: int, capacity: int):
+        self.capacity = capacity
+        self.occupancy = np.zeros(size if self.limited else 0, dtype=np.int32)
+
+    @property
+    def limited(self) -> bool:
+        return self.capacity > 0
+
+    def spare(self, node: int) -> int:
+        if not self.limited:
+            return 1
+        return self.capacity - int(self.occupancy[node])
+
+    def enter(self, nodes: np.ndarray | int):
+        if self.limited:
+            np.add.at(self.occupancy, nodes, 1)
+
+    def leave(self, nodes: np.ndarray | int):
+        if self.limited:
+            np.subtract.at(self.occupancy, nodes, 1)
+
+    def move(self, from_nodes: np.ndarray | int, to_nodes: np.ndarray | int):
+        self.leave(from_nodes)
+        self.enter(to_nodes)
+
+    def resize(self, size: int):
+        """Make room for the nodes added to the index."""
+        if self.limited and size > len(self.occupancy):
+            grown = np.zeros(max(size, len(self.occupancy) + len(self.occupancy) // 8), dtype=np.int32)
+            grown[:len(self.occupancy)] = self.occupancy
+            self.occupancy = grown
+
+    def clear(self):
+        self.occupancy[:] = 0
+
+    def admit(self, nodes: np.ndarray, targets: np.ndarray, waiting: np.ndarray,
+              exempt: np.ndarray | None = None) -> np.ndarray:
+        """
+        Which of the ants stepping from `nodes` into `targets` fit, all in the same tick.
+
+        A node takes as many ants as it has spare capacity plus the ants moving out of it,
+        so ants may follow each other, and swap places, within a tick. The longest waiting
+        ants go first, ties go to the ant spawned first.
+
+        Args:
+            waiting: The number of ticks every ant has been waiting for a place.
+            exempt: Ants admitted regardless of capacity, the ones arriving at their destination.
+        """
+        count = len(targets)
+        if not self.limited or count == 0:
+            return np.ones(count, dtype=bool)
+        exempt = np.zeros(count, dtype=bool) if exempt is None else exempt
+
+        # the ants contending for every target sorted by priority, ranks count from 0 in every group
+        order = np.lexsort((np.arange(count), -waiting, targets))
+        sorted_targets = targets[order]
+        group_start = np.flatnonzero(np.r_[True, sorted_targets[1:] != sorted_targets[:-1]])
+        group_sizes = np.diff(np.r_[group_start, count])
+        unique_targets = sorted_targets[group_start]
+        spare = self.capacity - self.occupancy[unique_targets]
+
+        def fitting(contending: np.ndarray, places: np.ndarray) -> np.ndarray:
+            # the first `places` contending ants of every group fit, the others don't contend for anything
+            sorted_contending = contending[order]
+            taken = np.cumsum(sorted_contending)
+            rank = taken - np.repeat(taken[group_start] - sorted_contending[group_start], group_sizes) - 1
+            fits = np.empty(count, dtype=bool)
+            fits[order] = ~sorted_contending | (rank < np.repeat(places, group_sizes))
+            return fits
+
+        # start from everyone moving and drop the ants that don't fit until the rest is consistent,
+        # which lets a queue move up together and finds swaps
+        moving = np.ones(count, dtype=bool)
+        for _ in range(ADMISSION_ROUNDS):
+            places = spare + self._leaving(nodes[moving], unique_targets)
+            admitted = moving & fitting(moving & ~exempt, places)
+            if (admitted == moving).all():
+                return admitted
+            moving = admitted
+        # out of rounds, fall back to what fits without anyone leaving
+        return fitting(~exempt, spare)
+
+    @staticmethod
+    def _leaving(from_nodes: np.ndarray, targets: np.ndarray) -> np.ndarray:
+        """Number of the ants leaving every one of the sorted `targets`."""
+        position = np.searchsorted(targets, from_nodes).clip(max=len(targets) - 1)
+        hits = targets[position] == from_nodes
+        return np.bincount(position[hits], minlength=len(targets))
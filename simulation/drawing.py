@@ -1,110 +1,327 @@
 import numpy as np
 
+from simulation.camera import Camera
 from simulation.simulation import PygameSimulation
-from constants.enums import FieldType
+from simulation.worker import FrameSnapshot
+from settings.display_settings import DisplaySettings
+from constants.enums import FieldType, ObjectType
 import pygame as pg
 
+# columns of the grid turned into colors at once when building the first mip level
+TERRAIN_BAND = 512
+# fraction of the window the arrow keys move the view by
+PAN_STEP = 0.25
+ZOOM_STEP = 2 ** 0.5
+
+
+def downsample(colors: np.ndarray) -> np.ndarray:
+    """Average the 2x2 blocks of a (w, h, 3) color array, an odd last column or row is repeated."""
+    w, h = colors.shape[:2]
+    padded = np.pad(colors, ((0, w % 2), (0, h % 2), (0, 0)), mode="edge").astype(np.uint16)
+    summed = padded[0::2, 0::2] + padded[1::2, 0::2] + padded[0::2, 1::2] + padded[1::2, 1::2]
+    return (summed // 4).astype(np.uint8)
+
+
+class TerrainPyramid:
+    """
+    Terrain colors of the grid at every mip level, level L having one pixel per 2^L x 2^L tiles.
+
+    Level 0 is read straight from the grid, the others are built the first time the
+    view is zoomed out far enough to need them.
+    """
+    def __init__(self, grid: np.ndarray, field_colors: dict[FieldType, tuple[int, int, int]]):
+        self.grid = grid
+        self.palette = np.zeros((len(FieldType), 3), dtype=np.uint8)
+        for field, color in field_colors.items():
+            self.palette[field.value] = color
+        self.levels: list[np.ndarray | None] = [None]
+
+    def level(self, level: int) -> np.ndarray:
+        while len(self.levels) <= level:
+            if len(self.levels) == 1:
+                bands = [
+                    downsample(self.palette[self.grid[x:x + TERRAIN_BAND]])
+                    for x in range(0, self.grid.shape[0], TERRAIN_BAND)
+                ]
+                self.levels.append(np.concatenate(bands))
+            else:
+                self.levels.append(downsample(self.levels[-1]))
+        return self.levels[level]
+
+    def region(self, level: int, x0: int, y0: int, x1: int, y1: int) -> np.ndarray:
+        """Colors of the [x0, x1) x [y0, y1) pixels of a level."""
+        if level == 0:
+            return self.palette[self.grid[x0:x1, y0:y1]]
+        return self.level(level)[x0:x1, y0:y1]
+
+    def update(self, x: int, y: int):
+        """Recolor the pixels of a changed tile in the levels built so far."""
+        for level in range(1, len(self.levels)):
+            x, y = x // 2, y // 2
+            block = self.region(level - 1, 2 * x, 2 * y, 2 * x + 2, 2 * y + 2)
+            self.levels[level][x, y] = downsample(block)[0, 0]
+
+
+class RendererResources:
+    """
+    Images, sprites scaled to a tile size and fonts, loaded or created the first time they are needed.
+    """
+    def __init__(self, display_settings: DisplaySettings):
+        self.display_settings = display_settings
+        self.images: dict[str, pg.Surface] = {}
+        self.sprites: dict[tuple[str, int], pg.Surface] = {}
+        self.fonts: dict[tuple[str, int], pg.font.Font] = {}
+
+    def image(self, name: str) -> pg.Surface:
+        """The image of `DisplaySettings.<name>_image_path`."""
+        if name not in self.images:
+            self.images[name] = pg.image.load(getattr(self.display_settings, f"{name}_image_path"))
+        return self.images[name]
+
+    def sprite(self, name: str, tile_size: int) -> pg.Surface:
+        key = (name, tile_size)
+        if key not in self.sprites:
+            self.sprites[key] = self.render_sprite(name, tile_size)
+        return self.sprites[key]
+
+    def render_sprite(self, name: str, tile_size: int) -> pg.Surface:
+        if name == "ant":
+            # red marker under the ant image, so ants stay visible on small tiles
+            sprite = pg.Surface((tile_size, tile_size), flags=pg.SRCALPHA)
+            rect_size = tile_size // 4
+            pg.draw.rect(sprite, (255, 0, 0), pg.Rect(rect_size, rect_size, rect_size, rect_size))
+            sprite.blit(pg.transform.scale(self.image("ant"), (tile_size, tile_size)), (0, 0))
+            return sprite
+        return pg.transform.scale(self.image(name), (tile_size, tile_size))
+
+    def font(self, name: str, size: int) -> pg.font.Font:
+        key = (name, size)
+        if key not in self.fonts:
+            self.fonts[key] = pg.font.SysFont(name, size)
+        return self.fonts[key]
+
 
 class AntRenderer(PygameSimulation.IRenderer):
+    """
+    Draws the part of the map inside the camera view, so the cost of a frame depends
+    on the window size and not on the map size.
+    """
+    def __init__(self):
+        self.camera: Camera | None = None
+        self.terrain: TerrainPyramid | None = None
+        self.resources: RendererResources | None = None
+        # what was drawn for the current view, as (view key, surface, screen position)
+        self.terrain_view: tuple[tuple, pg.Surface, tuple[float, float]] | None = None
+        self.pheromone_view: tuple[tuple, pg.Surface, tuple[float, float]] | None = None
+        # bumped whenever a tile is edited
+        self.terrain_version = 0
+        # the (flavor, version, tick) the pheromone view shows
+        self.pheromone_state: tuple[tuple[int, int], int, int] | None = None
+        # the simulation state drawn in the current frame
+        self.frame: FrameSnapshot | None = None
+        # surfaces the views are drawn into, reused until the size of the view changes
+        self.surfaces: dict[str, pg.Surface] = {}
+
+    def ensure_view(self, sim: PygameSimulation):
+        if self.camera is None:
+            self.camera = Camera(sim.grid.shape, sim.screen.get_size(), sim.sim_settings.generic.tile_size)
+            self.terrain = TerrainPyramid(sim.grid, sim.display_settings.field_colors)
+
+    def handle_view_event(self, sim: PygameSimulation, event: pg.event.Event) -> bool:
+        self.ensure_view(sim)
+        camera = self.camera
+        width, height = camera.screen_size
+        if event.type == pg.MOUSEWHEEL:
+            camera.zoom(ZOOM_STEP ** event.y, pg.mouse.get_pos())
+        elif event.type == pg.MOUSEMOTION and event.buttons[2]:
+            # dragging with the right button
+            camera.pan(-event.rel[0], -event.rel[1])
+        elif event.type != pg.KEYDOWN:
+            return False
+        elif event.key == pg.K_LEFT:
+            camera.pan(-PAN_STEP * width, 0)
+        elif event.key == pg.K_RIGHT:
+            camera.pan(PAN_STEP * width, 0)
+        elif event.key == pg.K_UP:
+            camera.pan(0, -PAN_STEP * height)
+        elif event.key == pg.K_DOWN:
+            camera.pan(0, PAN_STEP * height)
+        elif event.key == pg.K_PAGEUP:
+            camera.zoom(ZOOM_STEP, (width / 2, height / 2))
+        elif event.key == pg.K_PAGEDOWN:
+            camera.zoom(1 / ZOOM_STEP, (width / 2, height / 2))
+        elif event.key == pg.K_0:
+            camera.fit()
+        else:
+            return False
+        return True
+
+    def level_view(self) -> tuple[int, tuple[int, int, int, int], tuple[float, float, int, int]]:
+        """
+        The mip level of the view, the range of its pixels covering the visible tiles
+        and the (left, top, width, height) screen rectangle they are drawn into.
+        """
+        camera = self.camera
+        level = camera.level
+        step = 1 << level
+        x0, y0, x1, y1 = camera.visible()
+        region = (x0 // step, y0 // step, -(-x1 // step), -(-y1 // step))
+        left, top = camera.to_screen(region[0] * step, region[1] * step)
+        width = round((region[2] - region[0]) * step * camera.tile_size)
+        height = round((region[3] - region[1]) * step * camera.tile_size)
+        return level, region, (left, top, max(width, 1), max(height, 1))
+
     def draw_text(self, sim: PygameSimulation):
-        font = pg.font.SysFont("Arial", 20)
-        text = font.render("paused" if sim.paused else "running", True, (255, 0, 0))
+        font = self.resources.font("Arial", 20)
+        if sim.paused:
+            status = "paused"
+        elif sim.worker is not None:
+            status = f"running in the background, tick {self.frame.ticks}"
+        elif sim.time_budgeted:
+            status = f"running, {sim.ticks_last_frame} ticks/frame (time budget)"
+        else:
+            status = f"running, {sim.ticks_per_frame} ticks/frame"
+        text = font.render(status, True, (255, 0, 0))
         sim.screen.blit(text, (10, 10))
 
-    def tile_at_mouse_pos(self, sim: PygameSimulation):
-        mouse_pos = pg.mouse.get_pos()
-        x = mouse_pos[0] // sim.sim_settings.generic.tile_size
-        y = mouse_pos[1] // sim.sim_settings.generic.tile_size
+    def draw_metrics(self, sim: PygameSimulation):
+        font = self.resources.font("Arial", 14)
+        for i, line in enumerate(sim.metrics.overlay_lines()):
+            sim.screen.blit(font.render(line, True, (255, 0, 0)), (10, 36 + 16 * i))
 
-        x = max(min(x, sim.sim_settings.generic.grid_size[0] - 1), 0)
-        y = max(min(y, sim.sim_settings.generic.grid_size[1] - 1), 0)
+    def tile_at_mouse_pos(self, sim: PygameSimulation):
+        self.ensure_view(sim)
+        x, y = self.camera.to_grid(*pg.mouse.get_pos())
 
         if isinstance(sim.selected_tile_type, FieldType):
-            sim.grid[x, y] = sim.selected_tile_type
+            sim.paint_tile((x, y), sim.selected_tile_type)
+            self.update_grid_layer(sim, x, y)
         else:
             # Initialize sim.objects if it's None
             if sim.objects is None:
-                sim.objects = np.full(sim.sim_settings.generic.grid_size, None)
+                sim.objects = np.full(sim.sim_settings.generic.grid_size, ObjectType.NOTHING.value, dtype=np.uint8)
 
-            if sim.nodes[x][y] is not None:
-                sim.objects[x, y] = sim.selected_tile_type
+            with sim.state_lock():
+                on_path = (x, y) in sim.store.index
+            if on_path:
+                sim.objects[x, y] = sim.selected_tile_type.value
             else:
                 print("select field on path to place object")
 
         return x, y
 
+    def update_grid_layer(self, sim: PygameSimulation, x: int, y: int):
+        if self.terrain is None:
+            return
+        self.terrain.update(x, y)
+        self.terrain_version += 1
+
+    def view_surface(self, name: str, size: tuple[int, int], alpha: bool = False) -> pg.Surface:
+        """
+        The surface of the given size kept under the name, a new one is only made when the size changes.
+        Surfaces of the same kind share a pixel format, so they can be scaled into one another.
+        """
+        surface = self.surfaces.get(name)
+        if surface is None or surface.get_size() != size:
+            surface = pg.Surface(size, flags=pg.SRCALPHA if alpha else 0, depth=32)
+            if pg.display.get_surface() is not None:
+                surface = surface.convert_alpha() if alpha else surface.convert()
+            self.surfaces[name] = surface
+        return surface
+
+    def render_terrain_view(self, sim: PygameSimulation):
+        level, region, (left, top, width, height) = self.level_view()
+        colors = self.terrain.region(level, *region)
+        terrain = self.view_surface("terrain level", colors.shape[:2])
+        pg.surfarray.blit_array(terrain, colors)
+        # nearest neighbor scaling, every pixel of the level becomes a block of tiles on screen
+        surface = pg.transform.scale(terrain, (width, height), self.view_surface("terrain", (width, height)))
+        self.terrain_view = ((self.camera.key, self.terrain_version), surface, (left, top))
+
     def draw_grid(self, sim: PygameSimulation):
-        for x in range(sim.grid.shape[0]):
-            for y in range(sim.grid.shape[1]):
-                pg.draw.rect(sim.screen, sim.display_settings.field_colors[sim.grid[x, y]],
-                             pg.Rect(x * sim.sim_settings.generic.tile_size, y * sim.sim_settings.generic.tile_size,
-                                     sim.sim_settings.generic.tile_size, sim.sim_settings.generic.tile_size), 0)
+        if self.terrain_view is None or self.terrain_view[0] != (self.camera.key, self.terrain_version):
+            self.render_terrain_view(sim)
+        _, surface, position = self.terrain_view
+        # the grid may not cover the whole window once zoomed out
+        sim.screen.fill((0, 0, 0))
+        sim.screen.blit(surface, position)
 
     def draw_population(self, sim: PygameSimulation):
-        population = sim.population
-        for ant in population.ants:
-            ax, ay = ant.pos
-            tile = sim.sim_settings.generic.tile_size
-            rect_size = tile // 4
-            offset = rect_size
-            r = pg.rect.Rect(ax * tile + offset, ay * tile + offset, rect_size, rect_size)
-            pg.draw.rect(sim.screen, ant.color, r)
-            scaled = pg.transform.scale(sim.display_settings.ant_image,
-                                        (sim.sim_settings.generic.tile_size,
-                                         sim.sim_settings.generic.tile_size))
-            sim.screen.blit(scaled, (ax * sim.sim_settings.generic.tile_size, ay * sim.sim_settings.generic.tile_size))
+        camera = self.camera
+        x0, y0, x1, y1 = camera.visible()
+        positions = self.frame.positions
+        visible = (positions[:, 0] >= x0) & (positions[:, 0] < x1) & (positions[:, 1] >= y0) & (positions[:, 1] < y1)
+        x, y = camera.to_screen(positions[visible, 0], positions[visible, 1])
+        sprite = self.resources.sprite("ant", max(2, round(camera.tile_size)))
+        sim.screen.blits([(sprite, (int(px), int(py))) for px, py in zip(x, y)], doreturn=False)
+
+    def render_pheromone_view(self, sim: PygameSimulation, flavor: tuple[int, int]):
+        level, (lx0, ly0, lx1, ly1), (left, top, width, height) = self.level_view()
+        with sim.state_lock():
+            index = sim.store.index
+            nodes = index.ids_in(lx0 << level, ly0 << level, lx1 << level, ly1 << level)
+            # the worker thread already computed the intensity when it publishes the snapshots,
+            # unless cells were added to the map since
+            if self.frame.flavor == flavor and self.frame.intensity is not None and \
+                    len(self.frame.intensity) == index.size:
+                intensity = self.frame.intensity[nodes]
+            else:
+                intensity = sim.store.intensity(flavor, nodes)
+            x = (index.coords[nodes, 0] >> level) - lx0
+            y = (index.coords[nodes, 1] >> level) - ly0
+
+        alpha = np.zeros((lx1 - lx0, ly1 - ly0), dtype=np.uint8)
+        # zoomed out, a pixel shows the strongest trail of its tiles
+        np.maximum.at(alpha, (x, y), (150 * intensity).astype(np.uint8))
+        heatmap = self.view_surface("heatmap level", alpha.shape, alpha=True)
+        heatmap.fill((255, 0, 0, 0))
+        # blit_array only writes the colors, the alpha is written through a view of the pixels
+        pg.surfarray.pixels_alpha(heatmap)[:] = alpha
+
+        scaled = self.view_surface("heatmap", (width, height), alpha=True)
+        surface = pg.transform.scale(heatmap, (width, height), scaled)
+        self.pheromone_view = (self.camera.key, surface, (left, top))
+        self.pheromone_state = (flavor, self.frame.version, self.frame.ticks)
 
     def draw_pheromones(self, sim: PygameSimulation):
         TMP_PHEROMONE_FLAVOR = sim.sim_settings.generic.source
-        # Define the size of the pheromone surface
-        pheromone_surface = pg.Surface(
-            (sim.sim_settings.generic.grid_size[0] * sim.sim_settings.generic.tile_size,
-             sim.sim_settings.generic.grid_size[1] * sim.sim_settings.generic.tile_size),
-            flags=pg.SRCALPHA
-        )
-
-        for x in range(sim.sim_settings.generic.grid_size[0]):
-            for y in range(sim.sim_settings.generic.grid_size[1]):
-                node = sim.nodes[x][y]
-                if node is not None:  # Only process nodes for PATH fields
-                    intensity = node.mean_intensity(TMP_PHEROMONE_FLAVOR, x, y, sim.nodes)
-                    color = (255, 0, 0, int(150 * intensity))
-                    tile_size = sim.sim_settings.generic.tile_size
-
-                    pg.draw.rect(
-                        pheromone_surface,
-                        color,
-                        pg.Rect(
-                            x * tile_size,
-                            y * tile_size,
-                            tile_size,
-                            tile_size
-                        ),
-                        0
-                    )
-
-        sim.screen.blit(pheromone_surface, (0, 0))
+        if self.pheromone_view is None or self.pheromone_view[0] != self.camera.key:
+            stale = True
+        else:
+            flavor, version, ticks = self.pheromone_state
+            # a version changed without a tick means the map was edited, which is shown right away
+            refresh_due = self.frame.ticks - ticks >= sim.display_settings.PHEROMONE_REFRESH_TICKS or \
+                self.frame.ticks == ticks
+            stale = flavor != TMP_PHEROMONE_FLAVOR or (version != self.frame.version and refresh_due)
+        if stale:
+            self.render_pheromone_view(sim, TMP_PHEROMONE_FLAVOR)
 
+        _, surface, position = self.pheromone_view
+        sim.screen.blit(surface, position)
 
     def draw_source_and_target(self, sim: PygameSimulation):
-        if sim.source is not None:
-            sx, sy = sim.source
-            scaled = pg.transform.scale(sim.display_settings.colony_image,
-                                        (sim.sim_settings.generic.tile_size,
-                                         sim.sim_settings.generic.tile_size))
-            sim.screen.blit(scaled, (sx * sim.sim_settings.generic.tile_size, sy * sim.sim_settings.generic.tile_size))
-        if sim.target is not None:
-            tx, ty = sim.target
-            scaled = pg.transform.scale(sim.display_settings.food_image,
-                                        (sim.sim_settings.generic.tile_size,
-                                         sim.sim_settings.generic.tile_size))
-            sim.screen.blit(scaled, (tx * sim.sim_settings.generic.tile_size, ty * sim.sim_settings.generic.tile_size))
+        camera = self.camera
+        size = max(4, round(camera.tile_size))
+        for pos, name in ((sim.source, "colony"), (sim.target, "food")):
+            if pos is not None:
+                sim.screen.blit(self.resources.sprite(name, size), camera.to_screen(*pos))
 
     def draw(self, sim: PygameSimulation):
-        self.draw_grid(sim)
+        if self.resources is None:
+            self.resources = RendererResources(sim.display_settings)
+        self.ensure_view(sim)
+        self.frame = sim.frame()
+        metrics = sim.metrics
+        with metrics.timer("draw_grid"):
+            self.draw_grid(sim)
         if sim.show_pheromones:
-            self.draw_pheromones(sim)
+            with metrics.timer("draw_pheromones"):
+                self.draw_pheromones(sim)
         if sim.show_ants:
-            self.draw_population(sim)
-        self.draw_source_and_target(sim)
+            with metrics.timer("draw_population"):
+                self.draw_population(sim)
+        with metrics.timer("draw_source_and_target"):
+            self.draw_source_and_target(sim)
         self.draw_text(sim)
+        if metrics.enabled:
+            self.draw_metrics(sim)
@@ -0,0 +1,122 @@
+from constants.enums import FieldType
+from settings.simulation_settings import SimulationSettings
+from simulation import initialize
+from simulation.metrics import Metrics
+from simulation.pheromones import Coords
+from simulation.population import Population
+from simulation.routes import Route, RouteTable
+from simulation.snapshot import Checkpointer, PheromoneRows
+
+import numpy as np
+
+
+class HeadlessSimulation:
+    """
+    Runs `Population.step` as fast as possible, without a window or pygame.
+    """
+    def __init__(self, save_name: str | None, sim_settings: SimulationSettings, source: Coords, target: Coords,
+                 grid: np.ndarray | None = None):
+        """
+        Args:
+            save_name: The save to load the grid from when the settings don't point at a map image.
+            grid: An already loaded grid to use instead, save_name is ignored then.
+        """
+        self.sim_settings = sim_settings
+        self.sim_settings.generic.source = source
+        self.sim_settings.generic.target = target
+        self.source = source
+        self.target = target
+        self.metrics = Metrics.from_settings(sim_settings.metrics)
+
+        if grid is not None:
+            self.sim_settings.generic.grid_size = grid.shape
+            self.grid, self.objects = grid, None
+            with self.metrics.timer("init_nodes"):
+                self.nodes = initialize.init_nodes(grid, sim_settings)
+        else:
+            self.sim_settings.generic.grid_size = initialize.detect_grid_size(save_name, sim_settings)
+            self.grid, self.objects, self.nodes = initialize.grid_and_objects(save_name, sim_settings, self.metrics)
+        for name, (x, y) in (("source", source), ("target", target)):
+            if self.nodes[x][y] is None:
+                raise ValueError(f"{name} {(x, y)} is not on a path")
+        self.store = self.nodes.store
+        self.routes = RouteTable(self.store)
+
+        self.population = Population(sim_settings, self.metrics)
+        self.ticks = 0
+
+    def step(self):
+        self.population.step(self.grid, self.objects, self.nodes)
+        self.ticks += 1
+
+    def paint_tile(self, pos: Coords, field_type: FieldType):
+        """
+        Change the terrain of a tile between ticks, e.g. to close a path in the middle of a run.
+        Painting over the source or the target unsets it, the run only steps again once it is set.
+        """
+        self.grid[pos] = field_type.value
+        version = self.store.version
+        changed = self.population.update_cell(self.nodes, pos, field_type == FieldType.PATH)
+        if changed:
+            self.routes.carry_over(version, changed)
+        self.source = self.sim_settings.generic.source
+        self.target = self.sim_settings.generic.target
+
+    def set_source(self, source: Coords):
+        self.source = self.sim_settings.generic.source = self._on_path("source", source)
+
+    def set_target(self, target: Coords):
+        self.target = self.sim_settings.generic.target = self._on_path("target", target)
+
+    def _on_path(self, name: str, pos: Coords) -> Coords:
+        if pos not in self.store.index:
+            raise ValueError(f"{name} {pos} is not on a path")
+        return pos
+
+    def best_path(self) -> Route | None:
+        if self.source is None or self.target is None:
+            return None
+        result = self.routes.route(self.source, self.target)
+        return list(result.path) if result is not None else None
+
+    def run(self, max_ticks: int, check_interval: int = 0, patience: int = 5,
+            checkpointer: Checkpointer | None = None, checkpoint_interval: int = 0) -> bool:
+        """
+        Step the simulation for max_ticks or until the best path stops changing.
+
+        Args:
+            max_ticks: The maximum number of ticks to run.
+            check_interval: Ticks between convergence checks, 0 disables them.
+            patience: The number of consecutive checks the best path has to stay the same.
+            checkpointer: Where to save the run every checkpoint_interval ticks, None for no checkpoints.
+
+        Returns:
+            Whether the run converged before max_ticks.
+        """
+        previous = None
+        stable = 0
+        with self.metrics.profiling():
+            for _ in range(max_ticks):
+                self.step()
+                if checkpointer is not None and checkpoint_interval > 0 and self.ticks % checkpoint_interval == 0:
+                    checkpointer.checkpoint(self.grid, self.objects, self.store)
+                if check_interval <= 0 or self.ticks % check_interval != 0:
+                    continue
+
+                path = self.best_path()
+                stable = stable + 1 if path is not None and path == previous else 0
+                previous = path
+                if stable >= patience:
+                    return True
+        return False
+
+    def save(self, file_name: str):
+        path = self.best_path()
+        np.savez(
+            file_name,
+            **PheromoneRows.of(self.store).arrays(),
+            layer_destinations=np.array(list(self.store.layers), dtype=np.int32).reshape(-1, 2),
+            path_cells=self.store.index.coords,
+            best_path=np.array(path if path is not None else [], dtype=np.int32).reshape(-1, 2),
+            ticks=self.ticks,
+        )
@@ -1,123 +1,115 @@
 from settings.simulation_settings import SimulationSettings
-from settings.display_settings import DisplaySettings
-from constants.enums import FieldType
-from simulation.node import Node
-from PIL import Image
+from constants.enums import FieldType, PheromoneStorage
+from simulation.metrics import Metrics
+from simulation.node import NodeGrid
+from simulation.pheromones import ChunkedPheromoneStore, PathIndex
+from simulation.snapshot import Snapshot, is_legacy_save, load_snapshot, migrate_legacy_save
+from simulation.sparse_pheromones import SparsePheromoneStore
+from simulation.tiled_map import field_types, image_size, load_map_grid
 
 import os
 import numpy as np
-import pygame as pg
+
+def detect_grid_size(save_name: str, sim_settings: SimulationSettings) -> tuple[int, int]:
+    """Grid size in (x, y) format of the map the settings point at."""
+    if sim_settings.generic.create_grid_from_img:
+        return image_size(sim_settings.generic.map_image_path)
+    migrate_if_legacy(save_name, sim_settings)
+    with np.load(save_name, allow_pickle=False) as loaded_data:
+        return loaded_data["grid"].shape
+
+def migrate_if_legacy(save_name: str, sim_settings: SimulationSettings):
+    # only the migration reads the pickled arrays of the old format
+    if os.path.exists(save_name) and is_legacy_save(save_name):
+        print("Migrating old save format, the original is kept as", save_name + ".legacy")
+        migrate_legacy_save(save_name, sim_settings)
 
 def create_grid(sim_settings: SimulationSettings):
     map_img_path = sim_settings.generic.map_image_path
     if os.path.exists(map_img_path) and sim_settings.generic.create_grid_from_img:
-        image = Image.open(map_img_path)
-        print("image size: ", image.size)
-        print(sim_settings.generic.grid_size)
-
+        # the grid size always comes from the map, the image is converted once and memory-mapped after that
+        grid = load_map_grid(map_img_path)
+        sim_settings.generic.grid_size = grid.shape
         print("Loaded grid from file")
-        img_array = np.asarray(image)[:,:,:3]
-        assert img_array.shape[0] == sim_settings.generic.grid_size[1] # numpy uses height first
-        assert img_array.shape[1] == sim_settings.generic.grid_size[0]
-
-        print("img_array size: ", img_array.shape)
-
-        grid = mapImageToFieldType(img_array)
+        print("grid size: ", grid.shape)
     else:
         print("Created new grid")
-        grid = np.full(sim_settings.generic.grid_size, FieldType.GRASS, dtype=FieldType)
+        grid = np.full(sim_settings.generic.grid_size, FieldType.GRASS.value, dtype=np.uint8)
     return grid
 
-def load_grid_from_file(save_name: str, sim_settings: SimulationSettings):
+def load_grid_from_file(save_name: str, sim_settings: SimulationSettings) -> Snapshot:
     if os.path.exists(save_name):
-        loaded_data = np.load(save_name, allow_pickle=True)
-        loaded_grid = loaded_data['grid']
-        loaded_objects = loaded_data['objects']
-        loaded_nodes = loaded_data.get("nodes")
-        loaded_nodes = loaded_nodes if loaded_nodes is not None else []
-
-        grid_ok = loaded_grid.shape == sim_settings.generic.grid_size
-        objects_ok = loaded_objects is None or loaded_objects.shape == sim_settings.generic.grid_size
-
-        if grid_ok and objects_ok:
-            return loaded_grid, loaded_objects, loaded_nodes
-        elif loaded_grid.shape != sim_settings.generic.grid_size:
+        migrate_if_legacy(save_name, sim_settings)
+        # the pheromones are only copied into the store, so checkpoints saved uncompressed are mapped instead of read
+        snapshot = load_snapshot(save_name, mmap=True)
+
+        if snapshot.grid.shape != sim_settings.generic.grid_size:
             raise ValueError(f"Grid size in file does not match simulation settings\n"
-                            f"Grid size in file: {loaded_grid.shape}\n"
+                            f"Grid size in file: {snapshot.grid.shape}\n"
                             f"Expected grid size: {sim_settings.generic.grid_size}")
-        else:
+        elif snapshot.objects.shape != sim_settings.generic.grid_size:
             raise ValueError(f"Object grid size in file does not match simulation settings\n"
-                            f"Grid size in file: {loaded_objects.shape}\n"
+                            f"Grid size in file: {snapshot.objects.shape}\n"
                             f"Expected grid size: {sim_settings.generic.grid_size}")
+        return snapshot
     else:
         raise FileNotFoundError(f"save path {save_name} does not exist")
 
-def init_nodes(grid, sim_settings: SimulationSettings):
-    nodes = []
+def init_nodes(grid, sim_settings: SimulationSettings) -> NodeGrid:
     print("creating nodes")
-    is_tile_traversable = np.isin(grid, [FieldType.PATH])
-    # print("available fields: ", is_tile_traversable.shape)
-    # print(is_tile_traversable)
-    for x, column in enumerate(grid):
-        node_column = []
-        for y, val in enumerate(column):
-            if val == FieldType.PATH:
-                up = y > 0 and is_tile_traversable[x][y - 1]
-                right = x < sim_settings.generic.grid_size[0] - 1 and is_tile_traversable[x + 1][y]
-                down = y < sim_settings.generic.grid_size[1] - 1 and is_tile_traversable[x][y + 1]
-                left = x > 0 and is_tile_traversable[x - 1][y]
-
-                node_column.append(Node(is_tile_traversable, (up, right, down, left), sim_settings.generic))
-            else:
-                node_column.append(None)
-        nodes.append(node_column)
-    return nodes
-
-
-def grid_and_objects(save_name: str, sim_settings: SimulationSettings) -> tuple[
-    np.ndarray, np.ndarray, list[list[Node]]]:
+    settings = sim_settings.generic
+    index = PathIndex.from_grid(grid)
+    if settings.pheromone_storage == PheromoneStorage.SPARSE:
+        store = SparsePheromoneStore(index, settings.node_max_smell, settings.pheromone_cutoff,
+                                     settings.evaporation_rate)
+    elif settings.evaporation_rate > 0:
+        raise ValueError("evaporation_rate needs the SPARSE pheromone storage")
+    else:
+        store = ChunkedPheromoneStore(index, settings.node_max_smell)
+    return NodeGrid(store, settings)
+
+
+def grid_and_objects(save_name: str, sim_settings: SimulationSettings, metrics: Metrics | None = None) -> tuple[
+    np.ndarray, np.ndarray, NodeGrid]:
     grid: np.ndarray
-    nodes: list[list[Node]] = []
     objects = None
+    snapshot = None
+    metrics = metrics if metrics is not None else Metrics()
 
-    if sim_settings.generic.create_grid_from_img:
-        print("processing image")
-        grid = create_grid(sim_settings)
-    else:
-        print("loading file")
-        grid, objects, nodes = load_grid_from_file(save_name, sim_settings)
+    with metrics.timer("load_grid"):
+        if sim_settings.generic.create_grid_from_img:
+            print("processing image")
+            grid = create_grid(sim_settings)
+        else:
+            print("loading file")
+            snapshot = load_grid_from_file(save_name, sim_settings)
+            grid, objects = snapshot.grid, snapshot.objects
 
-    if len(nodes) == 0:
+    with metrics.timer("init_nodes"):
         nodes = init_nodes(grid, sim_settings)
+    if snapshot is not None:
+        snapshot.restore_pheromones(nodes.store)
 
     return grid, objects, nodes
 
 
-def window(sim_settings: SimulationSettings):
+def window(sim_settings: SimulationSettings, max_size: tuple[int, int] | None = None):
+    # imported here so that the simulation itself can be set up without pygame
+    import pygame as pg
+
     window_size = (sim_settings.generic.tile_size * sim_settings.generic.grid_size[0],
                     sim_settings.generic.tile_size * sim_settings.generic.grid_size[1])
+    if max_size is not None:
+        # larger maps are shown through the renderer's camera
+        window_size = (min(window_size[0], max_size[0]), min(window_size[1], max_size[1]))
     return pg.display.set_mode(window_size)
 
 
 def mapImageToFieldType(image: np.ndarray):
-    mappedImage = np.zeros(image[:,:,1].shape, dtype=FieldType)
+    mappedImage = field_types(image)
     print("mapped image size: ", mappedImage.shape)
-    g = 0
-    p = 0
-    b = 0
-    for i in range(image.shape[0]):
-        for j in range(image.shape[1]):
-            if np.array_equal(image[i, j], [255, 255, 255]):
-                mappedImage[i, j] = FieldType.GRASS
-                g += 1
-            elif np.array_equal(image[i, j], [255, 191, 0]):
-                p += 1
-                mappedImage[i, j] = FieldType.PATH
-            elif np.array_equal(image[i, j], [0, 0, 0]):
-                mappedImage[i, j] = FieldType.BUILDINGS
-                b += 1
-            else:
-                raise ValueError(f"Unknown color at {i}, {j}: {image[i, j]}")
-    print(f"Grass: {g}, Path: {p}, Buildings: {b}")
-
-    return mappedImage.transpose() # numpy uses height first
\ No newline at end of file
+    counts = np.bincount(mappedImage.ravel(), minlength=len(FieldType))
+    print(f"Grass: {counts[FieldType.GRASS.value]}, Path: {counts[FieldType.PATH.value]}, "
+          f"Buildings: {counts[FieldType.BUILDINGS.value]}")
+
+    return mappedImage.transpose() # numpy uses height first
@@ -0,0 +1,148 @@
+from simulation.colony import OPPOSITE_SHIFT, Colony
+from simulation.pheromones import CHUNK_BITS, CHUNK_SIZE, ZERO_BELOW, ChunkedPheromoneStore
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# whether the kernels are compiled, without Numba `CompiledColony` steps like `Colony`
+AVAILABLE = numba is not None
+
+
+def _jit(parallel: bool = False):
+    if numba is None:
+        return lambda function: function
+    return numba.njit(cache=True, parallel=parallel)
+
+
+prange = numba.prange if numba is not None else range
+
+
+@_jit(parallel=True)
+def choose_directions(neighbors, slots, pool, layer_of_node, node, source, destination, draws,
+                      exploration_chance, directions):
+    """
+    `Colony.choose_step_direction` over the chunked pheromone values, an ant at a time in parallel.
+
+    Every ant only writes its own direction, so the ants are independent.
+    """
+    for ant in prange(len(node)):
+        here = node[ant]
+        layer = layer_of_node[destination[ant]]
+        slot = slots[layer, here >> CHUNK_BITS] if layer >= 0 else -1
+        offset = here & (CHUNK_SIZE - 1)
+
+        # the strongest smell through an existing link, the first one on ties like argmax
+        strongest = 0
+        strongest_smell = 0.0
+        count = 0
+        for direction in range(4):
+            if neighbors[here, direction] < 0:
+                continue
+            count += 1
+            if slot >= 0 and pool[slot, offset, direction] > strongest_smell:
+                strongest = direction
+                strongest_smell = pool[slot, offset, direction]
+
+        exploring = draws[ant, 0] < exploration_chance and destination[ant] != source[ant]
+        if not exploring and strongest_smell > 0:
+            directions[ant] = strongest
+            continue
+
+        # uniformly random direction among the existing neighbors
+        pick = int(draws[ant, 1] * count)
+        directions[ant] = 0
+        for direction in range(4):
+            if neighbors[here, direction] < 0:
+                continue
+            if pick == 0:
+                directions[ant] = direction
+                break
+            pick -= 1
+
+
+@_jit(parallel=True)
+def advance(neighbors, node, direction, moved):
+    """The move of `Colony.move` without a node capacity, every ant only writes its own node."""
+    for ant in prange(len(node)):
+        target = neighbors[node[ant], direction[ant]]
+        moved[ant] = target >= 0
+        if target >= 0:
+            node[ant] = target
+
+
+@_jit()
+def deposit(pool, slots, nodes, directions, deltas, max_smell):
+    """
+    `ChunkedPheromoneStore.deposit_many` into allocated chunks.
+
+    Ants on the same node write the same entries, so this runs an ant at a time.
+    """
+    for i in range(len(nodes)):
+        pool[slots[i], nodes[i] & (CHUNK_SIZE - 1), directions[i]] += deltas[i]
+    for i in range(len(nodes)):
+        offset = nodes[i] & (CHUNK_SIZE - 1)
+        pool[slots[i], offset, directions[i]] = min(pool[slots[i], offset, directions[i]], max_smell)
+
+
+@_jit()
+def decay(pool, slots, nodes, deltas):
+    """`ChunkedPheromoneStore.decay_many` of allocated chunks, an ant at a time for the same reason as `deposit`."""
+    for i in range(len(nodes)):
+        factor = np.float32(1) / (np.float32(1) + deltas[i])
+        offset = nodes[i] & (CHUNK_SIZE - 1)
+        for direction in range(4):
+            value = pool[slots[i], offset, direction] * factor
+            pool[slots[i], offset, direction] = value if value >= ZERO_BELOW else np.float32(0)
+
+
+class CompiledColony(Colony):
+    """
+    `Colony` choosing the directions and writing the pheromones with compiled kernels.
+
+    The random numbers are still drawn with the generator of the colony, so a seeded run
+    takes the same steps as with `Colony`. With a node capacity the ants are admitted into
+    full nodes by `Congestion` in NumPy, and the ants that arrived are removed in NumPy.
+    The kernels read the chunks of a `ChunkedPheromoneStore`, with another store or
+    without Numba the NumPy steps of `Colony` are used.
+    """
+    @property
+    def compiled(self) -> bool:
+        return AVAILABLE and isinstance(self.store, ChunkedPheromoneStore)
+
+    def choose_step_direction(self) -> np.ndarray:
+        if not self.compiled:
+            return super().choose_step_direction()
+        store = self.store
+        directions = np.empty(len(self), dtype=np.int32)
+        choose_directions(store.index.neighbors, store.slots, store.pool, store.layer_of_node, self.node,
+                          self.source, self.destination, self.rng.random((len(self), 2)),
+                          self.exploration_chance, directions)
+        return directions
+
+    def move(self, direction: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        if not self.compiled or self.congestion.limited:
+            return super().move(direction)
+        moved = np.empty(len(self), dtype=np.bool_)
+        advance(self.store.index.neighbors, self.node, direction, moved)
+        return moved, np.zeros(len(self), dtype=bool)
+
+    def transfer(self, moved: np.ndarray, direction: np.ndarray):
+        if not self.compiled:
+            return super().transfer(moved, direction)
+        store = self.store
+        layer = self.source_layer[moved]
+        node = self.node[moved]
+        back = (direction[moved] + OPPOSITE_SHIFT) % 4
+        delta = self.pheromone_deposited()[moved]
+        # allocating can replace the pool, so it is read afterwards
+        slots = store.allocate(layer, node)
+
+        with self.metrics.timer("deposit"):
+            deposit(store.pool, slots, node, back, delta, np.float32(store.max_smell))
+        with self.metrics.timer("decay"):
+            decay(store.pool, slots, node, delta)
+        store.version += 1
@@ -0,0 +1,138 @@
+from contextlib import contextmanager, nullcontext
+
+import cProfile
+import csv
+import json
+import os
+import threading
+import time
+
+# phases of a tick written to every row of the log, in this order
+TICK_PHASES = ("spawn", "choose", "move", "deposit", "decay", "step")
+COUNTERS = ("spawned", "arrived", "stalled", "blocked", "expired")
+
+# returned by `Metrics.timer` when the metrics are off, so that timing a phase costs a single call
+NULL_TIMER = nullcontext()
+
+
+class _Timer:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics: "Metrics", name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.metrics.add_time(self.name, time.perf_counter() - self.start)
+
+
+class Metrics:
+    """
+    Timers and counters of the simulation phases.
+
+    Times are summed per tick and written with the tick's counts to the log by `end_tick`,
+    the overlay shows their moving averages and the counts since the start instead.
+    Everything is a no-op when the metrics are off. The worker thread times and counts the
+    simulation while the UI thread times the drawing and reads the overlay, so every read and
+    write of the values holds `lock`.
+
+    Attributes:
+        enabled: Whether anything is measured.
+        times: Seconds spent in every phase during the current tick.
+        counts: Counts of the current tick.
+        averages: Exponential moving average of the seconds spent in every phase.
+        totals: Counts since the start.
+    """
+    def __init__(self, enabled: bool = False, log_path: str | None = None, profile_path: str | None = None,
+                 smoothing: float = 0.05):
+        """
+        Args:
+            log_path: A .csv or .json (one object per line) file to write a row per tick into.
+            profile_path: A file to dump cProfile stats of the `profiling` blocks into.
+            smoothing: Weight of the newest value in the moving averages.
+        """
+        self.enabled = enabled
+        self.profile_path = profile_path
+        self.smoothing = smoothing
+        self.times: dict[str, float] = {}
+        self.counts: dict[str, int] = {}
+        self.averages: dict[str, float] = {}
+        self.totals: dict[str, int] = dict.fromkeys(COUNTERS, 0)
+        self.lock = threading.Lock()
+
+        self.log_file = None
+        self.log_writer = None
+        if enabled and log_path is not None:
+            self.log_file = open(log_path, "w", newline="")
+            if os.path.splitext(log_path)[1] == ".csv":
+                self.log_writer = csv.DictWriter(self.log_file, ("tick",) + TICK_PHASES + COUNTERS,
+                                                 extrasaction="ignore", restval=0)
+                self.log_writer.writeheader()
+
+    @staticmethod
+    def from_settings(settings) -> "Metrics":
+        """Metrics described by `MetricsSettings`."""
+        return Metrics(settings.enabled, settings.log_path, settings.profile_path)
+
+    def timer(self, name: str):
+        """Context manager adding the time spent in its block to the phase."""
+        return _Timer(self, name) if self.enabled else NULL_TIMER
+
+    def add_time(self, name: str, seconds: float):
+        with self.lock:
+            self.times[name] = self.times.get(name, 0.0) + seconds
+            average = self.averages.get(name)
+            self.averages[name] = seconds if average is None else average + self.smoothing * (seconds - average)
+
+    def count(self, name: str, amount: int = 1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + amount
+            self.totals[name] = self.totals.get(name, 0) + amount
+
+    def end_tick(self, tick: int):
+        """Write the row of the finished tick and start a new one."""
+        if not self.enabled:
+            return
+        with self.lock:
+            row = {"tick": tick, **self.times, **self.counts}
+            self.times = {}
+            self.counts = {}
+            if self.log_file is not None:
+                if self.log_writer is not None:
+                    self.log_writer.writerow(row)
+                else:
+                    self.log_file.write(json.dumps(row) + "\n")
+
+    def overlay_lines(self) -> list[str]:
+        """Lines of text for the on-screen overlay."""
+        with self.lock:
+            averages = dict(self.averages)
+            totals = dict(self.totals)
+        lines = [f"{name}: {seconds * 1000:.3f} ms" for name, seconds in averages.items()]
+        lines.append(", ".join(f"{name}: {count}" for name, count in totals.items()))
+        return lines
+
+    @contextmanager
+    def profiling(self):
+        """Profile the block with cProfile when a profile path is set."""
+        if not self.enabled or self.profile_path is None:
+            yield
+            return
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(self.profile_path)
+
+    def close(self):
+        with self.lock:
+            if self.log_file is not None:
+                self.log_file.close()
+                self.log_file = None
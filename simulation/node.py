@@ -1,3 +1,6 @@
+from simulation.congestion import Congestion
+from simulation.pheromones import NEIGHBOR_OFFSETS, Coords, PheromoneStore
+
 import numpy as np
 from enum import Enum
 from typing import assert_never
@@ -6,7 +9,6 @@ from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from settings.simulation_settings import GenericSimulationSettings
 
-Coords = tuple[int, int]
 Pheromone = Coords
 
 
@@ -43,54 +45,111 @@ Intensity = float
 
 
 class Node:
-    def __init__(self, available_fields: np.ndarray, neighborhood: tuple[bool, bool, bool, bool],
-                 settings: "GenericSimulationSettings"):
+    def __init__(self, store: PheromoneStore, pos: Coords, neighborhood: tuple[bool, bool, bool, bool],
+                 settings: "GenericSimulationSettings", congestion: Congestion):
         # neighbor order: top, right, bottom, left
-        self.has_neighbor: np.ndarray = np.array(neighborhood)
-        self.pheromones: dict[Coords, np.ndarray] = {}
+        self.has_neighbor: np.ndarray = np.asarray(neighborhood)
+        self.store = store
+        self.pos = pos
+        self.id = store.index.id_of(pos)
+        self.congestion = congestion
         self.capacity = settings.node_capacity
-        self.spare_capacity = self.capacity
         self.max_smell = settings.node_max_smell
 
-        # TODO: remove this and use Grid 
-        for x in range(available_fields.shape[0]):
-            for y in range(available_fields.shape[1]):
-                if available_fields[x][y]:
-                    self.pheromones[(x, y)] = np.zeros(4)
+    def pheromones(self, destination: Coords) -> np.ndarray:
+        return self.store.get(destination, self.id)
+
+    @property
+    def spare_capacity(self) -> int:
+        return self.congestion.spare(self.id)
 
     def can_move_into(self) -> bool:
         return self.spare_capacity > 0
 
-    def mean_intensity(self, flavor: Pheromone, x: int, y: int, nodes: list[list["Node"]]) -> float:
-        relevant_smells = []
-
-        def get_pheromone(x, y, direction):
-            if (x, y) in nodes[x][y].pheromones:
-                return nodes[x][y].pheromones[(x, y)][direction]
-            else:
-                return 0
+    def enter(self):
+        self.congestion.enter(self.id)
 
-        if x > 0 and nodes[x - 1][y] is not None and self.has_neighbor[Direction.Up.value]:
-            relevant_smells.append(get_pheromone(x - 1, y, Direction.Down.value))
-        else:
-            relevant_smells.append(0)
-
-        if x < len(nodes) - 1 and nodes[x + 1][y] is not None and self.has_neighbor[Direction.Right.value]:
-            relevant_smells.append(get_pheromone(x + 1, y, Direction.Left.value))
-        else:
-            relevant_smells.append(0)
+    def leave(self):
+        self.congestion.leave(self.id)
 
-        if y < len(nodes[0]) - 1 and nodes[x][y + 1] is not None and self.has_neighbor[Direction.Down.value]:
-            relevant_smells.append(get_pheromone(x, y + 1, Direction.Up.value))
-        else:
-            relevant_smells.append(0)
-
-        if y > 0 and nodes[x][y - 1] is not None and self.has_neighbor[Direction.Left.value]:
-            relevant_smells.append(get_pheromone(x, y - 1, Direction.Right.value))
-        else:
-            relevant_smells.append(0)
-
-        s = min(np.sum(relevant_smells), self.max_smell)
+    def mean_intensity(self, flavor: Pheromone) -> float:
+        relevant_smells = self.pheromones(flavor) * self.has_neighbor
+        s = min(float(relevant_smells.sum()), self.max_smell)
         return s / self.max_smell
 
 
+class NodeGrid:
+    """
+    Nodes of the path cells, created the first time they are looked up.
+
+    Indexed like a list of node columns, `nodes[x][y]`, or with `nodes[x, y]`.
+    Cells that are not traversable have no node and give None. The number of ants
+    on every node is kept in the `congestion` shared by all of them.
+    """
+    class Column:
+        def __init__(self, grid: "NodeGrid", x: int):
+            self.grid = grid
+            self.x = x
+
+        def __len__(self) -> int:
+            return self.grid.store.index.shape[1]
+
+        def __getitem__(self, y: int) -> Node | None:
+            return self.grid.node((self.x, y))
+
+        def __iter__(self):
+            return (self[y] for y in range(len(self)))
+
+    def __init__(self, store: PheromoneStore, settings: "GenericSimulationSettings"):
+        self.store = store
+        self.settings = settings
+        self.created: dict[Coords, Node] = {}
+        self.congestion = Congestion(store.index.size, settings.node_capacity)
+
+    def __len__(self) -> int:
+        return self.store.index.shape[0]
+
+    def __getitem__(self, key: int | Coords) -> "NodeGrid.Column | Node | None":
+        if isinstance(key, tuple):
+            return self.node(key)
+        return NodeGrid.Column(self, key)
+
+    def __iter__(self):
+        return (self[x] for x in range(len(self)))
+
+    def node(self, pos: Coords) -> Node | None:
+        node = self.created.get(pos)
+        if node is None:
+            node_id = self.store.index.id_of(pos)
+            if node_id < 0:
+                return None
+            node = Node(self.store, pos, self.store.index.neighbors[node_id] >= 0, self.settings,
+                        self.congestion)
+            self.created[pos] = node
+        return node
+
+    def update_cell(self, pos: Coords, traversable: bool) -> list[Coords]:
+        """
+        Add or remove the node of a cell whose tile changed, touching only the cell and its neighbors.
+
+        Returns:
+            The cells whose node changed, the cell itself and its neighbors on the path.
+        """
+        index = self.store.index
+        if traversable == (pos in index):
+            return []
+        if traversable:
+            node = index.add(pos)
+            self.store.add_node(node)
+            self.congestion.resize(index.size)
+        else:
+            # the store reads the links of the node, so it goes first
+            self.store.remove_node(index.id_of(pos))
+            index.remove(pos)
+
+        x, y = pos
+        changed = [pos] + [(x + dx, y + dy) for dx, dy in NEIGHBOR_OFFSETS if (x + dx, y + dy) in index]
+        # the nodes created for the cells cached their neighborhood
+        for cell in changed:
+            self.created.pop(cell, None)
+        return changed
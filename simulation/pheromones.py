@@ -0,0 +1,481 @@
+from constants.enums import FieldType
+from constants.types import Coords
+
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+# pheromone values are allocated in chunks of this many consecutive node ids
+CHUNK_BITS = 10
+CHUNK_SIZE = 1 << CHUNK_BITS
+# columns of the grid scanned at once when indexing it and cells looked up at once when linking
+# their neighbors, bound the temporary memory of indexing large maps
+INDEX_BAND = 256
+LOOKUP_BATCH = 1 << 20
+# decayed values below it are flushed to zero, repeated decay would otherwise leave float32 subnormals,
+# which are orders of magnitude slower to compute with
+ZERO_BELOW = np.float32(1e-30)
+# offsets of the up, right, down and left neighbor
+NEIGHBOR_OFFSETS = ((0, -1), (1, 0), (0, 1), (-1, 0))
+
+
+class PathIndex:
+    """
+    Dense numbering of the traversable cells of the grid.
+
+    Cells are numbered in (x, y) order and looked up by a binary search over their
+    linear position, so the index takes memory per path cell, not per grid cell.
+    Editing the map never renumbers the other cells: a cell added later gets the next
+    free id and is looked up in `added`, a removed cell is unlinked from its neighbors
+    and keeps its id in `removed`, to get it back if it is added again.
+
+    Attributes:
+        shape: The (W, H) size of the grid.
+        coords: (P, 2) array with the (x, y) position of every id, removed ones included.
+        keys: (B,) sorted array with the linear position x * H + y of the ids numbered at the start.
+        neighbors: (P, 4) array with the id of the up, right, down and left neighbor, -1 if there is none.
+        added: Linear position of every cell added after the start and its id.
+        removed: Ids of the removed cells.
+    """
+    def __init__(self, coords: np.ndarray, shape: tuple[int, int]):
+        self.shape = shape
+        self._coords: np.ndarray = np.asarray(coords, dtype=np.int32).reshape(-1, 2)
+        self._size = len(self._coords)
+        key_type = np.int32 if shape[0] * shape[1] < 2 ** 31 else np.int64
+        self.keys: np.ndarray = self._coords[:, 0].astype(key_type) * shape[1] + self._coords[:, 1]
+        self.added: dict[int, int] = {}
+        self.removed: set[int] = set()
+        self._added_keys = np.zeros(0, dtype=np.int64)
+        self._added_ids = np.zeros(0, dtype=np.int32)
+        self._removed_ids = np.zeros(0, dtype=np.int32)
+
+        self._neighbors: np.ndarray = np.full((self.size, 4), -1, dtype=np.int32)
+        # cells are sorted by column, a cell right below another in the same column is the next id
+        below = (self.keys[1:] == self.keys[:-1] + 1) & (self.coords[:-1, 1] < shape[1] - 1)
+        ids = np.flatnonzero(below).astype(np.int32)
+        self._neighbors[ids, 2] = ids + 1
+        self._neighbors[ids + 1, 0] = ids
+        for start in range(0, self.size, LOOKUP_BATCH):
+            x = self.coords[start:start + LOOKUP_BATCH, 0]
+            y = self.coords[start:start + LOOKUP_BATCH, 1]
+            self._neighbors[start:start + LOOKUP_BATCH, 1] = self.lookup(x + 1, y)
+            self._neighbors[start:start + LOOKUP_BATCH, 3] = self.lookup(x - 1, y)
+
+    @staticmethod
+    def from_mask(is_traversable: np.ndarray) -> "PathIndex":
+        return PathIndex(np.argwhere(is_traversable), is_traversable.shape)
+
+    @staticmethod
+    def from_grid(grid: np.ndarray, band: int = INDEX_BAND) -> "PathIndex":
+        """Index the path cells of a grid, reading it a band of columns at a time so it can be memory-mapped."""
+        coords = [
+            (np.argwhere(grid[x:x + band] == FieldType.PATH.value) + np.array([x, 0])).astype(np.int32)
+            for x in range(0, grid.shape[0], band)
+        ]
+        return PathIndex(np.concatenate(coords) if coords else np.zeros((0, 2)), grid.shape)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def coords(self) -> np.ndarray:
+        # the arrays have room for cells added later, only the ids in use are shown
+        return self._coords[:self._size]
+
+    @property
+    def neighbors(self) -> np.ndarray:
+        return self._neighbors[:self._size]
+
+    def alive(self) -> np.ndarray:
+        """(P,) mask of the ids that were not removed."""
+        alive = np.ones(self.size, dtype=bool)
+        alive[self._removed_ids] = False
+        return alive
+
+    def lookup(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """Ids of the cells, -1 for the ones that are not path cells or lie outside the grid."""
+        x = np.asarray(x, dtype=np.int64)
+        y = np.asarray(y, dtype=np.int64)
+        inside = (x >= 0) & (x < self.shape[0]) & (y >= 0) & (y < self.shape[1])
+        keys = x * self.shape[1] + y
+        ids = np.full(np.shape(x), -1, dtype=np.int32)
+        if len(self.keys) > 0:
+            found = np.searchsorted(self.keys, keys.astype(self.keys.dtype)).clip(max=len(self.keys) - 1)
+            ids = np.where(inside & (self.keys[found] == keys), found, -1).astype(np.int32)
+        if self.added:
+            found = np.searchsorted(self._added_keys, keys).clip(max=len(self._added_keys) - 1)
+            ids = np.where(inside & (self._added_keys[found] == keys), self._added_ids[found], ids)
+        if self.removed:
+            ids[np.isin(ids, self._removed_ids)] = -1
+        return ids
+
+    def __contains__(self, pos: Coords) -> bool:
+        return self.id_of(pos) >= 0
+
+    def id_of(self, pos: Coords) -> int:
+        # the scalar `lookup`, used per ant by the reference engine
+        x, y = pos
+        if not (0 <= x < self.shape[0] and 0 <= y < self.shape[1]):
+            return -1
+        node = self._id_of_key(int(x) * self.shape[1] + int(y))
+        return -1 if self.removed and node in self.removed else node
+
+    def _id_of_key(self, key: int) -> int:
+        # removed cells included, the key has the type of the keys or numpy would convert all of them to search
+        found = int(self.keys.searchsorted(self.keys.dtype.type(key)))
+        if found < len(self.keys) and self.keys[found] == key:
+            return found
+        return self.added.get(key, -1) if self.added else -1
+
+    def ids_of(self, positions: np.ndarray) -> np.ndarray:
+        return self.lookup(positions[:, 0], positions[:, 1])
+
+    def ids_in(self, x0: int, y0: int, x1: int, y1: int) -> np.ndarray:
+        """Ids of the path cells in the [x0, x1) x [y0, y1) rectangle."""
+        # the cells of a range of columns numbered at the start have consecutive ids
+        first, last = np.searchsorted(self.keys, np.array([x0, x1], dtype=self.keys.dtype) * self.shape[1])
+        ids = np.arange(first, last, dtype=np.int32)
+        y = self.coords[first:last, 1]
+        ids = ids[(y >= y0) & (y < y1)]
+        if self.added:
+            x, y = self.coords[self._added_ids].T
+            inside = (x >= x0) & (x < x1) & (y >= y0) & (y < y1)
+            ids = np.concatenate([ids, self._added_ids[inside]])
+        if self.removed:
+            ids = ids[~np.isin(ids, self._removed_ids)]
+        return ids
+
+    def add(self, pos: Coords) -> int:
+        """Make a cell a path cell linked with its neighbors, returns its id."""
+        node = self.id_of(pos)
+        if node >= 0:
+            return node
+        key = int(pos[0]) * self.shape[1] + int(pos[1])
+        node = self._id_of_key(key)
+        if node >= 0:
+            self.removed.discard(node)
+        else:
+            node = self._size
+            if node == len(self._coords):
+                # grown by an eighth at once, so adding cells one by one takes amortized constant time
+                extra = max(16, node // 8)
+                self._coords = np.concatenate([self._coords, np.zeros((extra, 2), dtype=np.int32)])
+                self._neighbors = np.concatenate([self._neighbors, np.full((extra, 4), -1, dtype=np.int32)])
+            self._coords[node] = pos
+            self._size += 1
+            self.added[key] = node
+        self._edited()
+
+        x, y = pos
+        for direction, (dx, dy) in enumerate(NEIGHBOR_OFFSETS):
+            neighbor = self.id_of((x + dx, y + dy))
+            self._neighbors[node, direction] = neighbor
+            if neighbor >= 0:
+                self._neighbors[neighbor, (direction + 2) % 4] = node
+        return node
+
+    def remove(self, pos: Coords) -> int:
+        """Unlink a path cell from its neighbors, returns its id, -1 if it was not a path cell."""
+        node = self.id_of(pos)
+        if node < 0:
+            return node
+        for direction, neighbor in enumerate(self._neighbors[node]):
+            if neighbor >= 0:
+                self._neighbors[neighbor, (direction + 2) % 4] = -1
+        self._neighbors[node] = -1
+        self.removed.add(node)
+        self._edited()
+        return node
+
+    def _edited(self):
+        # sorted copies of the edits for the batched lookups
+        keys = np.fromiter(self.added.keys(), dtype=np.int64, count=len(self.added))
+        ids = np.fromiter(self.added.values(), dtype=np.int32, count=len(self.added))
+        order = np.argsort(keys)
+        self._added_keys = keys[order]
+        self._added_ids = ids[order]
+        self._removed_ids = np.array(sorted(self.removed), dtype=np.int32)
+
+
+class PheromoneStore(ABC):
+    """
+    Pheromone trail values shared by all the nodes of the grid.
+
+    Values are kept per (destination, node, direction). A destination gets its
+    layer the first time something is written for it. How the values of the
+    layers are stored is up to the subclasses, which implement the abstract
+    reads and writes below.
+
+    `version` is bumped on every write, readers can use it to tell whether
+    anything they derived from the values is stale.
+    """
+    def __init__(self, index: PathIndex, max_smell: float):
+        self.index = index
+        self.max_smell = max_smell
+        self.layers: dict[Coords, int] = {}
+        # layer of every node id used as a destination, -1 for the rest
+        self.layer_of_node = np.full(index.size, -1, dtype=np.int32)
+        self.version = 0
+
+    @property
+    @abstractmethod
+    def nbytes(self) -> int:
+        """Memory taken by the values."""
+
+    @property
+    @abstractmethod
+    def values(self) -> np.ndarray:
+        """Dense (D, P, 4) copy of all the values, built on every call."""
+
+    @abstractmethod
+    def rows(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        (N,) layers, (N,) nodes and (N, 4) values of the rows holding non-zero values, sorted by layer and node.
+        Unlike `values` it takes memory per row in use, not per node of the map.
+        """
+
+    def layer_id(self, destination: Coords) -> int:
+        layer = self.layers.get(destination)
+        if layer is None:
+            node = self.index.id_of(destination)
+            if node < 0:
+                raise ValueError(f"pheromone destination {destination} is not a path cell")
+            layer = len(self.layers)
+            self._add_layer(layer)
+            self.layers[destination] = layer
+            self.layer_of_node[node] = layer
+        return layer
+
+    def _add_layer(self, layer: int):
+        """Make room for the values of a new layer."""
+
+    def tick(self):
+        """Advance the clock of the store by a tick, values only change with time in stores that evaporate."""
+
+    def _grow_layer_of_node(self):
+        size = self.index.size
+        if size > len(self.layer_of_node):
+            extra = max(size - len(self.layer_of_node), len(self.layer_of_node) // 8)
+            self.layer_of_node = np.concatenate([self.layer_of_node, np.full(extra, -1, dtype=np.int32)])
+
+    @abstractmethod
+    def add_node(self, node: int):
+        """Make room for a node added to the index, its values start at zero."""
+
+    @abstractmethod
+    def remove_node(self, node: int):
+        """
+        Zero the values of a node about to be removed from the index and the entries of its
+        neighbors for the links leading to it, so nothing is left if the cell comes back.
+        """
+
+    def layer_values(self, destination: Coords) -> np.ndarray:
+        """Dense (P, 4) copy of the values for a destination."""
+        layer = self.layers.get(destination)
+        if layer is None:
+            return np.zeros((self.index.size, 4), dtype=np.float32)
+        nodes = np.arange(self.index.size, dtype=np.int32)
+        return self.read(np.full(len(nodes), layer, dtype=np.int32), nodes)
+
+    @abstractmethod
+    def read(self, layers: np.ndarray, nodes: np.ndarray) -> np.ndarray:
+        """(N, 4) values of the nodes, each in its own layer."""
+
+    @abstractmethod
+    def node_values(self, layer: int, node: int) -> np.ndarray:
+        """(4,) values of a node in a layer."""
+
+    def get(self, destination: Coords, node: int) -> np.ndarray:
+        layer = self.layers.get(destination)
+        if layer is None:
+            return np.zeros(4, dtype=np.float32)
+        return self.node_values(layer, node)
+
+    @abstractmethod
+    def deposit(self, destination: Coords, node: int, direction: int, delta: float):
+        """Add to the value of a link of the node, capped at `max_smell`."""
+
+    @abstractmethod
+    def decay(self, destination: Coords, node: int, delta: float):
+        """Divide all the values of the node by 1 + delta."""
+
+    @abstractmethod
+    def deposit_many(self, layers: np.ndarray, nodes: np.ndarray, directions: np.ndarray, deltas: np.ndarray):
+        """The batched `deposit`, deltas landing on the same entry add up before the cap."""
+
+    @abstractmethod
+    def decay_many(self, layers: np.ndarray, nodes: np.ndarray, deltas: np.ndarray):
+        """The batched `decay`, decays of the same node compound."""
+
+    @abstractmethod
+    def assign(self, destination: Coords, nodes: np.ndarray, values: np.ndarray):
+        """Overwrite the (N, 4) values of the nodes."""
+
+    def intensity(self, flavor: Coords, nodes: np.ndarray | None = None) -> np.ndarray:
+        """
+        Normalized pheromone intensity of the nodes, the batched `Node.mean_intensity`.
+
+        Args:
+            nodes: Ids of the nodes, all of them when None.
+        """
+        if nodes is None:
+            nodes = np.arange(self.index.size, dtype=np.int32)
+        layer = self.layers.get(flavor)
+        if layer is None:
+            return np.zeros(len(nodes), dtype=np.float32)
+        values = self.read(np.full(len(nodes), layer, dtype=np.int32), nodes)
+        smells = (values * (self.index.neighbors[nodes] >= 0)).sum(axis=1)
+        return np.minimum(smells, self.max_smell) / self.max_smell
+
+
+class ChunkedPheromoneStore(PheromoneStore):
+    """
+    Pheromone store allocating the values of a layer in chunks as they are written.
+
+    The nodes of a layer are split into chunks of CHUNK_SIZE consecutive ids that
+    are only allocated once something is written into them, so the memory grows
+    with the number of destinations in use and the part of the map the ants walk,
+    not with the map. Chunks that were never written read as zeros.
+    """
+    def __init__(self, index: PathIndex, max_smell: float):
+        super().__init__(index, max_smell)
+        self.chunk_count = -(-index.size // CHUNK_SIZE)
+        # pool slot of every (layer, chunk), -1 while the chunk is not allocated
+        self._slots = np.full((0, self.chunk_count), -1, dtype=np.int32)
+        self._pool = np.zeros((0, CHUNK_SIZE, 4), dtype=np.float32)
+        self.allocated_chunks = 0
+
+    @property
+    def nbytes(self) -> int:
+        """Memory taken by the allocated chunks."""
+        return self.allocated_chunks * CHUNK_SIZE * 4 * self._pool.itemsize
+
+    @property
+    def values(self) -> np.ndarray:
+        layer_count = len(self.layers)
+        values = np.zeros((layer_count, self.chunk_count, CHUNK_SIZE, 4), dtype=np.float32)
+        layer, chunk = np.nonzero(self._slots[:layer_count, :self.chunk_count] >= 0)
+        values[layer, chunk] = self._pool[self._slots[layer, chunk]]
+        return values.reshape(layer_count, self.chunk_count * CHUNK_SIZE, 4)[:, :self.index.size]
+
+    def rows(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # nonzero walks the slot table layer by layer and chunk by chunk, so the rows come out sorted
+        layer, chunk = np.nonzero(self._slots[:len(self.layers)] >= 0)
+        values = self._pool[self._slots[layer, chunk]].reshape(-1, 4)
+        nodes = (chunk[:, None].astype(np.int32) * CHUNK_SIZE + np.arange(CHUNK_SIZE, dtype=np.int32)).ravel()
+        used = values.any(axis=1)
+        return np.repeat(layer.astype(np.int32), CHUNK_SIZE)[used], nodes[used], values[used]
+
+    def _add_layer(self, layer: int):
+        if layer == self._slots.shape[0]:
+            grown = np.full((max(1, 2 * layer), self._slots.shape[1]), -1, dtype=np.int32)
+            grown[:layer] = self._slots
+            self._slots = grown
+
+    def add_node(self, node: int):
+        self._grow_layer_of_node()
+        self.chunk_count = -(-self.index.size // CHUNK_SIZE)
+        if self.chunk_count > self._slots.shape[1]:
+            grown = np.full((self._slots.shape[0], self.chunk_count + self.chunk_count // 8), -1, dtype=np.int32)
+            grown[:, :self._slots.shape[1]] = self._slots
+            self._slots = grown
+        self.version += 1
+
+    def remove_node(self, node: int):
+        layer_count = len(self.layers)
+        entries = [(node, slice(None))] + [
+            (int(neighbor), (direction + 2) % 4)
+            for direction, neighbor in enumerate(self.index.neighbors[node]) if neighbor >= 0
+        ]
+        for cell, directions in entries:
+            slots = self._slots[:layer_count, cell >> CHUNK_BITS]
+            self._pool[slots[slots >= 0], cell & (CHUNK_SIZE - 1), directions] = 0
+        self.version += 1
+
+    @property
+    def slots(self) -> np.ndarray:
+        """(L, C) pool slot of every (layer, chunk), -1 for the chunks that are not allocated."""
+        return self._slots
+
+    @property
+    def pool(self) -> np.ndarray:
+        """
+        (S, CHUNK_SIZE, 4) allocated chunks, for kernels working on the values in place.
+        Kernels writing into them bump `version` themselves.
+        """
+        return self._pool
+
+    def allocate(self, layers: np.ndarray, nodes: np.ndarray) -> np.ndarray:
+        """Pool slots of the chunks of the nodes, allocating the missing ones."""
+        chunks = nodes >> CHUNK_BITS
+        slots = self._slots[layers, chunks]
+        missing = slots < 0
+        if missing.any():
+            pairs = np.unique(np.stack([layers[missing], chunks[missing]], axis=1), axis=0)
+            needed = self.allocated_chunks + len(pairs)
+            if needed > len(self._pool):
+                grown = np.zeros((max(needed, 2 * len(self._pool)), CHUNK_SIZE, 4), dtype=np.float32)
+                grown[:self.allocated_chunks] = self._pool[:self.allocated_chunks]
+                self._pool = grown
+            self._slots[pairs[:, 0], pairs[:, 1]] = np.arange(self.allocated_chunks, needed, dtype=np.int32)
+            self.allocated_chunks = needed
+            slots = self._slots[layers, chunks]
+        return slots
+
+    def read(self, layers: np.ndarray, nodes: np.ndarray) -> np.ndarray:
+        slots = self._slots[layers, nodes >> CHUNK_BITS]
+        rows = np.zeros((len(nodes), 4), dtype=np.float32)
+        allocated = slots >= 0
+        rows[allocated] = self._pool[slots[allocated], nodes[allocated] & (CHUNK_SIZE - 1)]
+        return rows
+
+    def node_values(self, layer: int, node: int) -> np.ndarray:
+        slot = self._slots[layer, node >> CHUNK_BITS]
+        if slot < 0:
+            return np.zeros(4, dtype=np.float32)
+        return self._pool[slot, node & (CHUNK_SIZE - 1)]
+
+    def _row(self, destination: Coords, node: int) -> np.ndarray:
+        layer = self.layer_id(destination)
+        slot = self._slots[layer, node >> CHUNK_BITS]
+        if slot < 0:
+            slot = self.allocate(np.array([layer]), np.array([node]))[0]
+        return self._pool[slot, node & (CHUNK_SIZE - 1)]
+
+    def deposit(self, destination: Coords, node: int, direction: int, delta: float):
+        row = self._row(destination, node)
+        row[direction] = min(row[direction] + delta, self.max_smell)
+        self.version += 1
+
+    def decay(self, destination: Coords, node: int, delta: float):
+        row = self._row(destination, node)
+        row /= (1 + delta)
+        row[row < ZERO_BELOW] = 0
+        self.version += 1
+
+    def deposit_many(self, layers: np.ndarray, nodes: np.ndarray, directions: np.ndarray, deltas: np.ndarray):
+        slots = self.allocate(layers, nodes)
+        entries = (slots, nodes & (CHUNK_SIZE - 1), directions)
+        np.add.at(self._pool, entries, deltas)
+        self._pool[entries] = np.minimum(self._pool[entries], self.max_smell)
+        self.version += 1
+
+    def decay_many(self, layers: np.ndarray, nodes: np.ndarray, deltas: np.ndarray):
+        slots = self._slots[layers, nodes >> CHUNK_BITS]
+        # nothing to decay in a chunk that was never written
+        allocated = slots >= 0
+        entries = (slots[allocated], nodes[allocated] & (CHUNK_SIZE - 1))
+        np.multiply.at(self._pool, entries, (1 / (1 + deltas[allocated]))[:, None])
+        rows = self._pool[entries]
+        self._pool[entries] = np.where(rows < ZERO_BELOW, 0, rows)
+        self.version += 1
+
+    def assign(self, destination: Coords, nodes: np.ndarray, values: np.ndarray):
+        """Overwrite the (N, 4) values of the nodes, without allocating chunks for rows that are all zeros."""
+        layers = np.full(len(nodes), self.layer_id(destination), dtype=np.int32)
+        written = values.any(axis=1) | (self._slots[layers, nodes >> CHUNK_BITS] >= 0)
+        nodes = nodes[written]
+        slots = self.allocate(layers[written], nodes)
+        self._pool[slots, nodes & (CHUNK_SIZE - 1)] = values[written]
+        self.version += 1
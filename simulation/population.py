@@ -1,68 +1,174 @@
 from simulation.ant import Ant
-from simulation.node import Node
+from simulation.colony import Colony
+from simulation.metrics import Metrics
+from simulation.node import NodeGrid, Coords
 from settings.simulation_settings import SimulationSettings
+from constants.enums import StepEngine, SpawnMode
 
-from pygame import Vector2
 import numpy as np
-import random
 
 class Population:
-    def __init__(self, sim_settings: SimulationSettings):
+    def __init__(self, sim_settings: SimulationSettings, metrics: Metrics | None = None):
         self.sim_settings = sim_settings
         self.spawn_interval = sim_settings.population.spawn_interval
         self.time_to_spawn = sim_settings.population.spawn_interval
+        self.ticks = 0
+        self.engine = sim_settings.population.engine
         self.ants: list[Ant] = []
-        self.foods = [Vector2(7, 7)] # just visual, to be removed
-
-    def step(self, grid: np.ndarray, objects: np.ndarray, nodes: list[list[Node]]):
-        assert len(self.foods) == 1
+        self.colony: Colony = None
+        self.rng = np.random.default_rng(sim_settings.generic.seed)
+        self.destinations: list[Coords] | None = None
+        self.metrics = metrics if metrics is not None else Metrics.from_settings(sim_settings.metrics)
 
+    def step(self, grid: np.ndarray, objects: np.ndarray, nodes: NodeGrid):
+        if not self.has_trip_ends():
+            raise ValueError("the source or the target was painted over or not set, set them again before stepping")
+        self.ticks += 1
         self.time_to_spawn -= 1
+        nodes.store.tick()
 
-        if self.time_to_spawn <= 0 or len(self.ants) == 0:
-            self.ants = []
-
+        if self.time_to_spawn <= 0 or len(self) == 0:
             self.time_to_spawn = self.spawn_interval
             print("next generation")
+            with self.metrics.timer("spawn"):
+                self.spawn_generation(nodes)
+
+        if self.engine == StepEngine.REFERENCE:
+            # the phases of an Ant are interleaved with the other ants, so they are only timed together
+            positions = [ant.pos for ant in self.ants] if self.metrics.enabled else None
+            with self.metrics.timer("step"):
+                draws = self.rng.random((len(self.ants), 2))
+                # the ants waiting longest for a place in a full node go first
+                order = sorted(range(len(self.ants)), key=lambda i: -self.ants[i].waiting)
+                for i in order:
+                    self.ants[i].step(grid, objects, nodes, draws[i])
+
+            if self.metrics.enabled:
+                self.metrics.count("stalled", sum(ant.pos == pos for ant, pos in zip(self.ants, positions)))
+                self.metrics.count("blocked", sum(ant.waiting > 0 for ant in self.ants))
+                self.metrics.count("arrived", sum(ant.ready_to_die for ant in self.ants))
+            self.release(nodes, [ant for ant in self.ants if ant.ready_to_die])
+            self.ants = [ant for ant in self.ants if not ant.ready_to_die]
+        else:
+            with self.metrics.timer("step"):
+                self.colony.step()
+        self.metrics.end_tick(self.ticks)
+
+    def __len__(self) -> int:
+        if self.engine == StepEngine.REFERENCE:
+            return len(self.ants)
+        return len(self.colony) if self.colony is not None else 0
+
+    def positions(self) -> np.ndarray:
+        """(N, 2) array with the (x, y) position of every ant."""
+        if self.engine == StepEngine.REFERENCE:
+            return np.array([ant.pos for ant in self.ants], dtype=np.int32).reshape(-1, 2)
+        return self.colony.positions() if self.colony is not None else np.zeros((0, 2), dtype=np.int32)
+
+    def has_trip_ends(self) -> bool:
+        """Whether the generic source and target the SINGLE_PAIR mode spawns ants between are set."""
+        generic = self.sim_settings.generic
+        if self.sim_settings.population.spawn_mode != SpawnMode.SINGLE_PAIR:
+            return True
+        return generic.source is not None and generic.target is not None
+
+    def active_destinations(self, nodes: NodeGrid) -> list[Coords]:
+        """Destinations of the ALL_PAIRS mode, drawn uniformly from the path cells unless given in the settings."""
+        if self.destinations is None:
+            settings = self.sim_settings.population
+            if settings.destinations:
+                self.destinations = [tuple(pos) for pos in settings.destinations]
+                for pos in self.destinations:
+                    if pos not in nodes.store.index:
+                        raise ValueError(f"destination {pos} is not on a path")
+            else:
+                index = nodes.store.index
+                coords = index.coords[index.alive()]
+                count = min(settings.random_destinations, len(coords))
+                chosen = self.rng.choice(len(coords), size=count, replace=False)
+                self.destinations = [(int(x), int(y)) for x, y in coords[chosen]]
+        if len(self.destinations) < 2:
+            raise ValueError("ALL_PAIRS spawn mode needs at least 2 destinations")
+        return self.destinations
+
+    def trips(self, nodes: NodeGrid) -> tuple[list[Coords], list[Coords]]:
+        """Sources and destinations of the ants of the next generation."""
+        settings = self.sim_settings.population
+        if settings.spawn_mode == SpawnMode.SINGLE_PAIR:
+            # ants deposit on the layer of their source and follow the one of their destination,
+            # so half of them are launched from the target to lay the trail the other half follows
+            source = self.sim_settings.generic.source
+            target = self.sim_settings.generic.target
+            outbound = settings.ants_per_generation - settings.ants_per_generation // 2
+            inbound = settings.ants_per_generation // 2
+            return [source] * outbound + [target] * inbound, [target] * outbound + [source] * inbound
+
+        # ants are launched from every active node towards a uniformly random other one,
+        # so the only pheromone layers in use are the ones of the active destinations
+        destinations = self.active_destinations(nodes)
+        source_ids = np.repeat(np.arange(len(destinations)), settings.ants_per_node)
+        destination_ids = self.rng.integers(0, len(destinations) - 1, size=len(source_ids))
+        destination_ids += destination_ids >= source_ids
+        return [destinations[i] for i in source_ids], [destinations[i] for i in destination_ids]
+
+    def spawn_generation(self, nodes: NodeGrid):
+        settings = self.sim_settings.population
+        sources, destinations = self.trips(nodes)
+
+        if self.engine == StepEngine.REFERENCE:
+            self.metrics.count("expired", len(self.ants))
+            self.metrics.count("spawned", len(sources))
+            self.release(nodes, self.ants)
+            self.ants = [
+                Ant(position=source, destination=destination, exploration_chance=settings.exploration_chance)
+                for source, destination in zip(sources, destinations)
+            ]
+            for ant in self.ants:
+                nodes[ant.pos].enter()
+            return
+
+        if self.colony is None:
+            engine = Colony
+            if self.engine == StepEngine.COMPILED:
+                # importing Numba takes a while, so it only happens for the engine that uses it
+                from simulation.kernels import CompiledColony
+                engine = CompiledColony
+            self.colony = engine(nodes.store, settings.exploration_chance, self.rng, self.metrics,
+                                 nodes.congestion)
+            if self.engine == StepEngine.COMPILED and not self.colony.compiled:
+                print("Numba is not installed or can't step this pheromone store, stepping with NumPy")
+        self.colony.clear()
+        self.colony.spawn(sources, destinations)
+
+    def update_cell(self, nodes: NodeGrid, pos: Coords, traversable: bool) -> list[Coords]:
+        """
+        Apply a repainted tile to the nodes, the ants standing on or heading to a cell that stops being
+        a path are removed.
+
+        Returns:
+            The cells whose node changed, see `NodeGrid.update_cell`.
+        """
+        if not traversable and pos in nodes.store.index:
+            generic = self.sim_settings.generic
+            # the run can't go on until a new one is set, see `has_trip_ends`
+            if pos == generic.source:
+                generic.source = None
+            if pos == generic.target:
+                generic.target = None
+            if self.destinations is not None and pos in self.destinations:
+                # a destination painted over is dropped, too few random ones left are drawn again on the next spawn
+                self.destinations.remove(pos)
+                if len(self.destinations) < 2 and not self.sim_settings.population.destinations:
+                    self.destinations = None
+            if self.engine == StepEngine.REFERENCE:
+                self.release(nodes, [ant for ant in self.ants if pos in (ant.pos, ant.destination)])
+                self.ants = [ant for ant in self.ants if pos not in (ant.pos, ant.destination)]
+            elif self.colony is not None:
+                self.colony.drop_at(nodes.store.index.id_of(pos))
+        return nodes.update_cell(pos, traversable)
 
-            for _ in range(10):
-                self.ants.append(
-                    Ant(
-                        position=self.sim_settings.generic.source,
-                        destination=self.sim_settings.generic.target,
-                    )
-                )
-
-            # for _ in range(3):
-            #     self.ants.append(
-            #         Ant(
-            #             position=(random.randint(0, 14), random.randint(0, 14)),
-            #             destination=(7, 7),
-            #         )
-            #     )
-
-            # TEMP restriction, also in initialize.grid
-            # for x in range(15):
-            #     for y in range(15):
-            #         if random.random() < 0.5:
-            #             continue
-            #         goalx = random.randint(0, 14)
-            #         goaly = random.randint(0, 14)
-            #         if x == goalx and y == goaly:
-            #             continue
-
-            #         self.ants.append(
-            #         Ant(
-            #             position=(int(x), int(y)),
-            #             destination=(int(goalx), int(goaly)),
-            #         )
-            #     )
-            # randi = random.randint(0, len(self.ants) - 1)
-            # replace = self.ants[randi]
-            # self.ants[randi] = Ant(position=replace.pos, destination=(7, 7))
-
-
-        for ant in self.ants:
-            ant.step(grid, objects, nodes)
-
-        self.ants = [ant for ant in self.ants if not ant.ready_to_die]
\ No newline at end of file
+    @staticmethod
+    def release(nodes: NodeGrid, ants: list[Ant]):
+        """Give back the places of ants leaving the simulation."""
+        for ant in ants:
+            nodes[ant.pos].leave()
@@ -0,0 +1,192 @@
+from simulation.pheromones import Coords, PheromoneStore
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable
+
+import numpy as np
+
+Route = list[Coords]
+
+# cells of the (pairs, P) visited table of a batch of walks, the pairs beyond it go in further batches
+VISITED_BUDGET = 1 << 24
+
+
+def follow_pheromones(store: PheromoneStore, flavor: Coords, start: Coords, goal: Coords) -> Route | None:
+    """
+    Greedily follow the strongest pheromone of the given flavor from start to goal.
+
+    Links leading back to an already visited cell are skipped, so a trail that
+    loops continues along its next strongest link instead.
+
+    Returns:
+        The visited cells including start and goal, or None if the trail runs
+        out before reaching the goal.
+    """
+    index = store.index
+    layer = store.layers.get(flavor)
+    if layer is None or start not in index or goal not in index:
+        return None
+
+    node = index.id_of(start)
+    goal_id = index.id_of(goal)
+    path = [node]
+    visited = {node}
+    while node != goal_id:
+        neighbors = index.neighbors[node]
+        unvisited = [neighbor >= 0 and int(neighbor) not in visited for neighbor in neighbors]
+        smells = store.node_values(layer, node) * unvisited
+        if not smells.any():
+            return None
+        node = int(neighbors[smells.argmax()])
+        visited.add(node)
+        path.append(node)
+
+    return [(int(x), int(y)) for x, y in index.coords[path]]
+
+
+def follow_pheromones_many(store: PheromoneStore, pairs: list[tuple[Coords, Coords]]) -> list[Route | None]:
+    """
+    The batched `follow_pheromones` from each source to its destination, along the pheromones of the destination.
+
+    All the walks take their steps together, each over its own visited cells, so the
+    routes are the ones `follow_pheromones` traces for the pairs one by one.
+    """
+    index = store.index
+    routes: list[Route | None] = [None] * len(pairs)
+    if not pairs:
+        return routes
+    ends = np.array(pairs, dtype=np.int64).reshape(len(pairs), 2, 2)
+    layers = np.array([store.layers.get(destination, -1) for _, destination in pairs], dtype=np.int32)
+    starts = index.ids_of(ends[:, 0])
+    goals = index.ids_of(ends[:, 1])
+    walking = np.flatnonzero((layers >= 0) & (starts >= 0) & (goals >= 0))
+
+    batch = max(1, VISITED_BUDGET // max(index.size, 1))
+    for first in range(0, len(walking), batch):
+        pair_ids = walking[first:first + batch]
+        paths = _walk(store, layers[pair_ids], starts[pair_ids], goals[pair_ids])
+        for pair, path in zip(pair_ids, paths):
+            if path is not None:
+                routes[pair] = [(int(x), int(y)) for x, y in index.coords[path]]
+    return routes
+
+
+def _walk(store: PheromoneStore, layers: np.ndarray, starts: np.ndarray, goals: np.ndarray) -> list[np.ndarray | None]:
+    # node ids of the walks, None for the ones whose trail runs out
+    index = store.index
+    count = len(starts)
+    node = starts.copy()
+    visited = np.zeros((count, index.size), dtype=bool)
+    visited[np.arange(count), node] = True
+    steps = np.where(node == goals, 0, -1)
+    walking = np.flatnonzero(node != goals)
+    history = [node.copy()]
+    while len(walking) > 0:
+        neighbors = index.neighbors[node[walking]]
+        unvisited = (neighbors >= 0) & ~visited[walking[:, None], neighbors]
+        smells = store.read(layers[walking], node[walking]) * unvisited
+        stuck = ~smells.any(axis=1)
+        walking = walking[~stuck]
+        node[walking] = neighbors[~stuck, smells[~stuck].argmax(axis=1)]
+        visited[walking, node[walking]] = True
+        history.append(node.copy())
+
+        arrived = node[walking] == goals[walking]
+        steps[walking[arrived]] = len(history) - 1
+        walking = walking[~arrived]
+
+    history = np.stack(history)
+    return [history[:length + 1, walk] if length >= 0 else None for walk, length in enumerate(steps)]
+
+
+@dataclass(frozen=True)
+class RouteResult:
+    """
+    Attributes:
+        path: The cells of the route, including the source and the destination.
+        length: The number of steps along the route.
+    """
+    path: tuple[Coords, ...]
+    length: int
+
+
+class RouteTable:
+    """
+    Routes learned by the colony, served from an LRU cache.
+
+    Entries are keyed by (source, destination, pheromone version), so a cached
+    route is never served once the pheromones it was traced on have changed.
+    """
+    def __init__(self, store: PheromoneStore, max_size: int = 4096):
+        self.store = store
+        self.max_size = max_size
+        self.cache: OrderedDict[tuple[Coords, Coords, int], RouteResult | None] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def trace(self, source: Coords, destination: Coords) -> RouteResult | None:
+        # a destination no ant started from has no layer, and so no route towards it
+        path = follow_pheromones(self.store, destination, source, destination)
+        if path is None:
+            return None
+        return RouteResult(tuple(path), len(path) - 1)
+
+    def route(self, source: Coords, destination: Coords) -> RouteResult | None:
+        key = (source, destination, self.store.version)
+        if key in self.cache:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return self.cache[key]
+
+        self.misses += 1
+        result = self.trace(source, destination)
+        self.cache[key] = result
+        if len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+        return result
+
+    def routes(self, pairs: Iterable[tuple[Coords, Coords]]) -> list[RouteResult | None]:
+        """The batched `route`, the pairs missing from the cache are traced together."""
+        version = self.store.version
+        keys = [(source, destination, version) for source, destination in pairs]
+        results: list[RouteResult | None] = [None] * len(keys)
+        missing: dict[tuple[Coords, Coords, int], list[int]] = {}
+        for i, key in enumerate(keys):
+            if key in self.cache:
+                self.hits += 1
+                self.cache.move_to_end(key)
+                results[i] = self.cache[key]
+            else:
+                missing.setdefault(key, []).append(i)
+
+        self.misses += len(missing)
+        # the repeats of a pair would have found it cached
+        self.hits += sum(len(places) - 1 for places in missing.values())
+        paths = follow_pheromones_many(self.store, [(source, destination) for source, destination, _ in missing])
+        for (key, places), path in zip(missing.items(), paths):
+            result = RouteResult(tuple(path), len(path) - 1) if path is not None else None
+            for i in places:
+                results[i] = result
+            self.cache[key] = result
+        while len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+        return results
+
+    def carry_over(self, version: int, changed: Iterable[Coords]):
+        """
+        Keep the routes traced at `version` valid at the current version after an edit of the map.
+
+        Only the routes through the changed cells are dropped, the others read nothing the edit
+        touched. Missing routes are dropped as well, a new path cell may open one.
+        """
+        changed = set(changed)
+        for (source, destination, traced_at), result in list(self.cache.items()):
+            if traced_at != version:
+                continue
+            del self.cache[(source, destination, traced_at)]
+            if result is not None and changed.isdisjoint(result.path):
+                self.cache[(source, destination, self.store.version)] = result
+
+    def clear(self):
+        self.cache.clear()
@@ -0,0 +1,67 @@
+from simulation.pheromones import Coords, PathIndex
+from simulation.routes import Route
+
+import heapq
+import numpy as np
+
+UNREACHABLE = -1
+
+
+def distance_field(index: PathIndex, goal: Coords) -> np.ndarray:
+    """
+    Number of steps from every path cell to the goal, UNREACHABLE where there is no way.
+
+    Breadth-first search expanding the whole frontier with array operations at once,
+    every step between neighboring cells costs the same.
+    """
+    if goal not in index:
+        raise ValueError(f"goal {goal} is not a path cell")
+    distance = np.full(index.size, UNREACHABLE, dtype=np.int32)
+    frontier = np.array([index.id_of(goal)], dtype=np.int32)
+    distance[frontier] = 0
+    steps = 0
+    while len(frontier) > 0:
+        steps += 1
+        candidates = index.neighbors[frontier].ravel()
+        candidates = candidates[candidates >= 0]
+        candidates = np.unique(candidates[distance[candidates] == UNREACHABLE])
+        distance[candidates] = steps
+        frontier = candidates
+    return distance
+
+
+def shortest_path(index: PathIndex, source: Coords, target: Coords) -> Route | None:
+    """A* search between two path cells with the Manhattan distance as the heuristic."""
+    if source not in index or target not in index:
+        return None
+    start = index.id_of(source)
+    goal = index.id_of(target)
+    goal_x, goal_y = index.coords[goal]
+
+    def heuristic(node: int) -> int:
+        x, y = index.coords[node]
+        return abs(int(x) - int(goal_x)) + abs(int(y) - int(goal_y))
+
+    came_from = {start: start}
+    cost = {start: 0}
+    queue = [(heuristic(start), 0, start)]
+    while queue:
+        _, steps, node = heapq.heappop(queue)
+        if node == goal:
+            break
+        if steps > cost[node]:
+            continue
+        for neighbor in index.neighbors[node]:
+            neighbor = int(neighbor)
+            if neighbor < 0 or cost.get(neighbor, steps + 2) <= steps + 1:
+                continue
+            cost[neighbor] = steps + 1
+            came_from[neighbor] = node
+            heapq.heappush(queue, (steps + 1 + heuristic(neighbor), steps + 1, neighbor))
+    else:
+        return None
+
+    path = [goal]
+    while path[-1] != start:
+        path.append(came_from[path[-1]])
+    return [(int(x), int(y)) for x, y in index.coords[path[::-1]]]
@@ -2,11 +2,16 @@ from settings.simulation_settings import SimulationSettings
 from settings.display_settings import DisplaySettings
 from constants.enums import FieldType, ObjectType
 
-from simulation import initialize
+from simulation import initialize, snapshot
+from simulation.metrics import Metrics
 from simulation.population import Population
+from simulation.worker import FrameSnapshot, SimulationWorker
+
+from contextlib import nullcontext
 
 import pygame as pg
-import numpy as np
+import time
+import traceback
 
 class PygameSimulation:
     class IRenderer:
@@ -16,20 +21,26 @@ class PygameSimulation:
         def tile_at_mouse_pos(sim: "PygameSimulation"):
             raise NotImplementedError
 
+        def handle_view_event(sim: "PygameSimulation", event: pg.event.Event) -> bool:
+            """Zoom or pan on the event, returns whether it was used."""
+            raise NotImplementedError
+
     def __init__(self, save_name: str, renderer: IRenderer, sim_settings: SimulationSettings, display_settings: DisplaySettings):
         self.save_name = save_name
         self.sim_settings: SimulationSettings = sim_settings
         self.display_settings: DisplaySettings = display_settings
-        old_grid_size = (self.display_settings.GRID_WIDTH_OLD, self.display_settings.GRID_HEIGHT_OLD)
-        new_grid_size = (self.display_settings.GRID_WIDTH_NEW, self.display_settings.GRID_HEIGHT_NEW)
-        self.sim_settings.generic.grid_size = old_grid_size if sim_settings.generic.simple_map else new_grid_size
+        self.sim_settings.generic.grid_size = initialize.detect_grid_size(save_name, sim_settings)
         self.sim_settings.generic.tile_size = self.display_settings.TILE_SIZE_OLD if sim_settings.generic.simple_map else self.display_settings.TILE_SIZE_NEW
 
         # display
         pg.init()
         self.renderer = renderer
-        self.screen = initialize.window(sim_settings)
-        self.grid, self.objects, self.nodes = initialize.grid_and_objects(save_name, sim_settings)
+        self.screen = initialize.window(sim_settings, display_settings.MAX_WINDOW_SIZE)
+        self.metrics = Metrics.from_settings(sim_settings.metrics)
+        self.grid, self.objects, self.nodes = initialize.grid_and_objects(save_name, sim_settings, self.metrics)
+        self.store = self.nodes.store
+        # key 9 saves a full snapshot the first time and after edits, only the pheromones otherwise
+        self.checkpointer = snapshot.Checkpointer(save_name)
         self.show_pheromones = False
         self.show_ants = True
 
@@ -40,6 +51,9 @@ class PygameSimulation:
         self.debug = False
         self.step_by_step = True
         self.step_requested = False
+        self.ticks_per_frame = display_settings.TICKS_PER_FRAME
+        self.time_budgeted = False
+        self.ticks_last_frame = 0
         self.target: tuple[int, int] = None
         self.source: tuple[int, int] = None
 
@@ -48,46 +62,132 @@ class PygameSimulation:
         # self.trips = [ # use for displaying paths
         #     ((0, 2), (0, 10))
         # ]
-        self.population: Population = Population(sim_settings)
+        self.population: Population = Population(sim_settings, self.metrics)
+        self.worker: SimulationWorker | None = None
+        if display_settings.THREADED_SIMULATION:
+            self.worker = SimulationWorker(self.population, self.grid, self.objects, self.nodes,
+                                           1 / display_settings.MAX_FPS, display_settings.PHEROMONE_REFRESH_TICKS)
+            self.worker.start()
 
     def run(self):
+        # in the threaded mode the worker profiles the simulation instead
+        with self.metrics.profiling() if self.worker is None else nullcontext():
+            self.loop()
+        if self.worker is not None:
+            self.worker.stop()
+        self.metrics.close()
+
+    def loop(self):
         clock = pg.time.Clock()
         while not self.done:
 
             clock.tick(self.display_settings.MAX_FPS)
             self.handle_events()
+            self.report_worker_error()
 
             need_to_step = self.step_by_step and self.step_requested
-            if not self.paused or need_to_step:
+            if self.worker is not None:
+                # the worker thread steps the simulation on its own
+                pass
+            elif not self.paused:
+                self.advance()
+            elif need_to_step:
                 self.step_requested = False
                 self.population.step(self.grid, self.objects, self.nodes)
+                self.ticks_last_frame = 1
 
-            self.screen.fill((255, 255, 255))
             self.renderer.draw(self)
 
             pg.display.flip()
 
+    def frame(self) -> FrameSnapshot:
+        """State of the simulation to draw, published by the worker when it runs in the background."""
+        if self.worker is not None:
+            return self.worker.latest()
+        return FrameSnapshot.capture(self.population, self.store)
+
+    def report_worker_error(self):
+        """Print what stopped the worker thread, which pauses itself, and pause the UI with it."""
+        error = self.worker.take_error() if self.worker is not None else None
+        if error is not None:
+            print("The simulation stopped with an error:")
+            traceback.print_exception(error)
+            self.paused = True
+
+    def state_lock(self):
+        """Held while reading the pheromone store or the path index, which the worker thread changes."""
+        return self.worker.state_lock if self.worker is not None else nullcontext()
+
+    def advance(self):
+        """Run the simulation ticks of a single frame."""
+        if self.time_budgeted:
+            deadline = time.perf_counter() + self.display_settings.SIMULATION_BUDGET / self.display_settings.MAX_FPS
+            ticks = 0
+            while ticks < self.display_settings.MAX_TICKS_PER_FRAME:
+                self.population.step(self.grid, self.objects, self.nodes)
+                ticks += 1
+                if time.perf_counter() >= deadline:
+                    break
+        else:
+            ticks = self.ticks_per_frame
+            for _ in range(ticks):
+                self.population.step(self.grid, self.objects, self.nodes)
+        self.ticks_last_frame = ticks
+
+    def change_speed(self, factor: float):
+        self.ticks_per_frame = int(max(1, min(self.ticks_per_frame * factor,
+                                              self.display_settings.MAX_TICKS_PER_FRAME)))
+        print("Ticks per frame: ", self.ticks_per_frame)
+
     def set_target(self, target):
         self.target = target
-        self.sim_settings.generic.target = target
+        if self.worker is not None:
+            self.worker.send("set_target", target)
+        else:
+            self.sim_settings.generic.target = target
         print("Target set to: ", target)
 
     def set_source(self, source):
         self.source = source
-        self.sim_settings.generic.source = source
+        if self.worker is not None:
+            self.worker.send("set_source", source)
+        else:
+            self.sim_settings.generic.source = source
         print("Source set to: ", source)
 
+    def paint_tile(self, pos: tuple[int, int], field_type: FieldType):
+        """Change the terrain of a tile, updating only the nodes around it."""
+        if self.grid[pos] == field_type.value:
+            return
+        self.grid[pos] = field_type.value
+        traversable = field_type == FieldType.PATH
+        if self.worker is not None:
+            self.worker.send("update_cell", pos, traversable)
+        else:
+            self.population.update_cell(self.nodes, pos, traversable)
+        if not traversable:
+            if self.objects is not None:
+                self.objects[pos] = ObjectType.NOTHING.value
+            if pos in (self.source, self.target):
+                print("Source or target painted over, set it again")
+                self.source = None if pos == self.source else self.source
+                self.target = None if pos == self.target else self.target
+
     def isTargetAndSourceSetCheck(self) -> bool:
         return self.target is not None and self.source is not None
 
     def toggle_pause(self):
         if self.isTargetAndSourceSetCheck():
             self.paused = not self.paused
+            if self.worker is not None:
+                self.worker.send("pause" if self.paused else "resume")
         else:
             print("Set target and source: press 't' to set target and 's' to set source")
 
     def handle_events(self):
         for event in pg.event.get():
+            if self.renderer.handle_view_event(self, event):
+                continue
             if event.type == pg.QUIT:
                 self.done = True
             elif event.type == pg.KEYDOWN:
@@ -96,7 +196,11 @@ class PygameSimulation:
                 elif event.key == pg.K_SPACE:
                     self.toggle_pause()
                 elif event.key == pg.K_TAB:
-                    if self.step_by_step:
+                    if not self.isTargetAndSourceSetCheck():
+                        print("Set target and source: press 't' to set target and 's' to set source")
+                    elif self.step_by_step and self.worker is not None:
+                        self.worker.send("step")
+                    elif self.step_by_step:
                         self.step_requested = True
                 elif event.key == pg.K_t:
                     print("Selected target")
@@ -113,20 +217,35 @@ class PygameSimulation:
                 elif event.key == pg.K_3:
                     self.selected_tile_type = FieldType.WATER
                     print("Selected water")
+                elif event.key == pg.K_4:
+                    self.selected_tile_type = FieldType.PATH
+                    print("Selected path")
                 elif event.key == pg.K_9:
-                    np.savez(self.save_name, grid=self.grid, objects=self.objects, nodes=self.nodes)
-                    print("Saved grid to file")
+                    with self.state_lock():
+                        saved = self.checkpointer.checkpoint(self.grid, self.objects, self.store)
+                    print("Saved grid to file" if saved else "Nothing changed since the last save")
                 elif event.key == pg.K_p:
                     self.step_by_step = not self.step_by_step
                 elif event.key == pg.K_f:
                     self.show_pheromones = not self.show_pheromones
+                    if self.worker is not None:
+                        self.worker.send("show_pheromones", self.show_pheromones)
                 elif event.key == pg.K_a:
                     self.show_ants = not self.show_ants
+                elif event.key in (pg.K_EQUALS, pg.K_PLUS, pg.K_KP_PLUS):
+                    self.change_speed(2)
+                elif event.key in (pg.K_MINUS, pg.K_KP_MINUS):
+                    self.change_speed(0.5)
+                elif event.key == pg.K_b:
+                    self.time_budgeted = not self.time_budgeted
+                    print("Time budgeted mode:", "on" if self.time_budgeted else "off")
         if pg.mouse.get_pressed()[0]:
             if self.paused:
-                # TODO nodes have to be updated as well if we paint a path
                 x, y = self.renderer.tile_at_mouse_pos(self)
-                if self.nodes[x][y] == None:
+                # the index, not `self.nodes`, which would create and cache a Node while the worker edits it
+                with self.state_lock():
+                    on_path = (x, y) in self.store.index
+                if not on_path:
                     print("Can't place target/source on non-traversable terrain")
                     return
 
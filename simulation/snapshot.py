@@ -0,0 +1,343 @@
+from constants.enums import FieldType, ObjectType
+from simulation.pheromones import ChunkedPheromoneStore, PathIndex, PheromoneStore
+
+from dataclasses import dataclass
+from enum import Enum
+from typing import TYPE_CHECKING
+
+import os
+import struct
+import uuid
+import zipfile
+import numpy as np
+
+if TYPE_CHECKING:
+    from settings.simulation_settings import SimulationSettings
+
+FORMAT_VERSION = 2
+# bit of every neighbor in the adjacency bitmask, in the up, right, down, left order
+NEIGHBOR_BITS = np.array([1, 2, 4, 8], dtype=np.uint8)
+# rows copied into a store at once when restoring, bounds the memory read from a memory-mapped save
+RESTORE_BATCH = 1 << 20
+ROW_ARRAYS = ("pheromone_layers", "pheromone_nodes", "pheromone_values")
+
+
+@dataclass
+class PheromoneRows:
+    """
+    Pheromone values of some (layer, node) pairs, sorted by layer and node.
+
+    Attributes:
+        layers: (N,) layer of every row, an index into the layer destinations.
+        nodes: (N,) node of every row, an index into the path cells.
+        values: (N, 4) values of every row.
+    """
+    layers: np.ndarray
+    nodes: np.ndarray
+    values: np.ndarray
+
+    @staticmethod
+    def of(store: PheromoneStore) -> "PheromoneRows":
+        return PheromoneRows(*store.rows())
+
+    def __len__(self) -> int:
+        return len(self.layers)
+
+    def keys(self) -> np.ndarray:
+        return (np.asarray(self.layers, dtype=np.int64) << 32) | np.asarray(self.nodes, dtype=np.int64)
+
+    def arrays(self) -> dict[str, np.ndarray]:
+        return dict(zip(ROW_ARRAYS, (self.layers, self.nodes, self.values)))
+
+    def changed_since(self, saved: "PheromoneRows") -> "PheromoneRows":
+        """The rows that differ from the saved ones, with zeros for the saved rows that are gone."""
+        keys, saved_keys = self.keys(), saved.keys()
+        found = np.searchsorted(saved_keys, keys).clip(max=max(len(saved_keys) - 1, 0))
+        same = np.zeros(len(keys), dtype=bool)
+        if len(saved_keys) > 0:
+            same = (saved_keys[found] == keys) & (saved.values[found] == self.values).all(axis=1)
+        gone = ~np.isin(saved_keys, keys, assume_unique=True)
+        order = np.argsort(np.concatenate([keys[~same], saved_keys[gone]]), kind="stable")
+        return PheromoneRows(
+            np.concatenate([self.layers[~same], saved.layers[gone]])[order],
+            np.concatenate([self.nodes[~same], saved.nodes[gone]])[order],
+            np.concatenate([self.values[~same], np.zeros((gone.sum(), 4), dtype=np.float32)])[order],
+        )
+
+
+@dataclass
+class Snapshot:
+    """
+    Saved state of a simulation, made of plain arrays only.
+
+    Attributes:
+        grid: (W, H) FieldType values.
+        objects: (W, H) ObjectType values.
+        neighbors: (W, H) adjacency bitmask, see NEIGHBOR_BITS.
+        path_cells: (P, 2) position of every path cell, in pheromone node order.
+        layer_destinations: (D, 2) destination of every pheromone layer.
+        pheromones: The saved pheromone rows followed by the checkpoints changing them, applied in order.
+    """
+    grid: np.ndarray
+    objects: np.ndarray
+    neighbors: np.ndarray
+    path_cells: np.ndarray
+    layer_destinations: np.ndarray
+    pheromones: list[PheromoneRows]
+
+    def restore_pheromones(self, store: PheromoneStore):
+        """Copy the saved pheromones into a store, matching nodes by their position."""
+        for rows in self.pheromones:
+            for start in range(0, len(rows), RESTORE_BATCH):
+                layers = np.asarray(rows.layers[start:start + RESTORE_BATCH])
+                ids = store.index.ids_of(self.path_cells[np.asarray(rows.nodes[start:start + RESTORE_BATCH])])
+                values = np.asarray(rows.values[start:start + RESTORE_BATCH])
+                still_path = ids >= 0
+                for layer in np.unique(layers):
+                    destination = (int(self.layer_destinations[layer, 0]), int(self.layer_destinations[layer, 1]))
+                    if destination not in store.index:
+                        continue
+                    restored = still_path & (layers == layer)
+                    store.assign(destination, ids[restored], values[restored])
+        store.version += 1
+
+
+def as_codes(array: np.ndarray, default: Enum) -> np.ndarray:
+    """Convert an object array of enum members (the old save format) to uint8 values."""
+    if array.dtype == np.uint8:
+        return array
+    return np.array([(member if member is not None else default).value for member in array.ravel()],
+                    dtype=np.uint8).reshape(array.shape)
+
+
+def neighbor_bitmask(grid: np.ndarray) -> np.ndarray:
+    index = PathIndex.from_grid(grid)
+    bitmask = np.zeros(grid.shape, dtype=np.uint8)
+    bitmask[index.coords[:, 0], index.coords[:, 1]] = ((index.neighbors >= 0) * NEIGHBOR_BITS).sum(axis=1)
+    return bitmask
+
+
+def pheromone_file(file_name: str) -> str:
+    stem, extension = os.path.splitext(file_name)
+    return f"{stem}.pheromones{extension}"
+
+
+def delta_file(file_name: str, number: int) -> str:
+    """The file of the number-th checkpoint holding only the rows changed since the one before it, from 1."""
+    stem, extension = os.path.splitext(file_name)
+    return f"{stem}.pheromones.{number}{extension}"
+
+
+def _write(file_name: str, compressed: bool, **arrays: np.ndarray):
+    # written next to the target and moved over it, so an interrupted save never leaves half a file
+    temporary = file_name + ".tmp"
+    with open(temporary, "wb") as file:
+        (np.savez_compressed if compressed else np.savez)(file, **arrays)
+    os.replace(temporary, file_name)
+
+
+def _remove_deltas(file_name: str):
+    number = 1
+    while os.path.exists(delta_file(file_name, number)):
+        os.remove(delta_file(file_name, number))
+        number += 1
+
+
+def _layer_destinations(store: PheromoneStore) -> np.ndarray:
+    return np.array(list(store.layers), dtype=np.int32).reshape(-1, 2)
+
+
+def save_snapshot(file_name: str, grid: np.ndarray, objects: np.ndarray | None, store: PheromoneStore,
+                  compressed: bool = True, rows: PheromoneRows | None = None) -> str:
+    """
+    Save a full snapshot and drop the pheromone checkpoints of the previous one.
+
+    Args:
+        rows: The rows of the store, when the caller already has them.
+
+    Returns:
+        The id of the snapshot, checkpoints are only applied to the snapshot they were made for.
+    """
+    if objects is None:
+        objects = np.full(grid.shape, ObjectType.NOTHING.value, dtype=np.uint8)
+    rows = rows if rows is not None else PheromoneRows.of(store)
+    snapshot_id = uuid.uuid4().hex
+    _write(
+        file_name,
+        compressed,
+        format_version=np.array(FORMAT_VERSION),
+        snapshot_id=np.array(snapshot_id),
+        grid=grid.astype(np.uint8),
+        objects=objects.astype(np.uint8),
+        neighbors=neighbor_bitmask(grid),
+        path_cells=store.index.coords,
+        layer_destinations=_layer_destinations(store),
+        **rows.arrays(),
+    )
+    if os.path.exists(pheromone_file(file_name)):
+        os.remove(pheromone_file(file_name))
+    _remove_deltas(file_name)
+    return snapshot_id
+
+
+def _memmap_member(file_name: str, archive: zipfile.ZipFile, name: str) -> np.ndarray | None:
+    """Memory-map an array stored without compression inside an npz file."""
+    info = archive.getinfo(name + ".npy")
+    if info.compress_type != zipfile.ZIP_STORED:
+        return None
+    with open(file_name, "rb") as file:
+        file.seek(info.header_offset)
+        local_header = file.read(30)
+        name_length, extra_length = struct.unpack("<HH", local_header[26:30])
+        file.seek(info.header_offset + 30 + name_length + extra_length)
+        version = np.lib.format.read_magic(file)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(file)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(file)
+        offset = file.tell()
+    if 0 in shape:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(file_name, dtype=dtype, mode="r", offset=offset, shape=shape,
+                     order="F" if fortran_order else "C")
+
+
+def is_legacy_save(file_name: str) -> bool:
+    with zipfile.ZipFile(file_name) as archive:
+        return "format_version.npy" not in archive.namelist()
+
+
+def _read_rows(file_name: str, mmap: bool) -> PheromoneRows:
+    with np.load(file_name, allow_pickle=False) as data, zipfile.ZipFile(file_name) as archive:
+        if "pheromones" in data.files:
+            # format 1 saved the dense (D, P, 4) values
+            values = data["pheromones"]
+            layers, nodes = np.nonzero(values.any(axis=2))
+            return PheromoneRows(layers.astype(np.int32), nodes.astype(np.int32), values[layers, nodes])
+        arrays = [_memmap_member(file_name, archive, name) if mmap else None for name in ROW_ARRAYS]
+        return PheromoneRows(*(array if array is not None else data[name] for array, name in zip(arrays, ROW_ARRAYS)))
+
+
+def load_snapshot(file_name: str, mmap: bool = False) -> Snapshot:
+    """
+    Load a snapshot together with its pheromone checkpoints.
+
+    Args:
+        mmap: Memory-map the pheromones instead of reading them, when they were saved uncompressed.
+    """
+    with np.load(file_name, allow_pickle=False) as data:
+        if "format_version" not in data.files:
+            raise ValueError(f"{file_name} uses the old pickled format, migrate it with migrate_legacy_save")
+        if int(data["format_version"]) > FORMAT_VERSION:
+            raise ValueError(f"{file_name} uses snapshot format {int(data['format_version'])}, "
+                             f"newest supported is {FORMAT_VERSION}")
+        arrays = {name: data[name] for name in ("grid", "objects", "neighbors", "path_cells", "layer_destinations")}
+        base, base_id = file_name, str(data["snapshot_id"])
+
+    checkpoint = pheromone_file(file_name)
+    if os.path.exists(checkpoint):
+        with np.load(checkpoint, allow_pickle=False) as data:
+            if str(data["snapshot_id"]) == base_id:
+                base, base_id = checkpoint, str(data["checkpoint_id"])
+                arrays["layer_destinations"] = data["layer_destinations"]
+    pheromones = [_read_rows(base, mmap)]
+
+    # the deltas made since the base, a delta left over from an older base ends the chain
+    number = 1
+    while os.path.exists(delta_file(file_name, number)):
+        delta = delta_file(file_name, number)
+        with np.load(delta, allow_pickle=False) as data:
+            if str(data["base_id"]) != base_id:
+                break
+            arrays["layer_destinations"] = data["layer_destinations"]
+        pheromones.append(_read_rows(delta, mmap))
+        number += 1
+
+    return Snapshot(pheromones=pheromones, **arrays)
+
+
+class Checkpointer:
+    """
+    Periodic saves of a running simulation.
+
+    The first checkpoint, and any taken after the grid or the objects were edited,
+    writes a full snapshot. The rest, when the pheromones changed since the previous
+    checkpoint, write an uncompressed delta file with only the rows that changed.
+    Once the deltas hold more rows than the store, they are replaced by a single
+    pheromone file with all the rows, so loading never reads more than twice the rows.
+
+    The rows of the last checkpoint are kept to compare against, as much memory again
+    as the rows of the store.
+    """
+    def __init__(self, file_name: str, compressed: bool = True):
+        self.file_name = file_name
+        self.compressed = compressed
+        self.snapshot_id: str | None = None
+        # id of what the next delta applies on top of, the snapshot or the full pheromone file
+        self.base_id: str | None = None
+        self.saved_grid: np.ndarray | None = None
+        self.saved_objects: np.ndarray | None = None
+        self.saved_version: int | None = None
+        self.saved_rows: PheromoneRows | None = None
+        self.deltas = 0
+        self.delta_rows = 0
+
+    def checkpoint(self, grid: np.ndarray, objects: np.ndarray | None, store: PheromoneStore) -> bool:
+        """Returns whether anything was written."""
+        if self.snapshot_id is None or not np.array_equal(grid, self.saved_grid) or \
+                not np.array_equal(objects, self.saved_objects):
+            rows = PheromoneRows.of(store)
+            self.snapshot_id = save_snapshot(self.file_name, grid, objects, store, self.compressed, rows)
+            self.base_id = self.snapshot_id
+            self.saved_grid = grid.copy()
+            self.saved_objects = objects.copy() if objects is not None else None
+            self.deltas = self.delta_rows = 0
+        elif store.version != self.saved_version:
+            rows = PheromoneRows.of(store)
+            changed = rows.changed_since(self.saved_rows)
+            if self.delta_rows + len(changed) > len(rows):
+                self.base_id = uuid.uuid4().hex
+                _write(pheromone_file(self.file_name), False, snapshot_id=np.array(self.snapshot_id),
+                       checkpoint_id=np.array(self.base_id), layer_destinations=_layer_destinations(store),
+                       **rows.arrays())
+                _remove_deltas(self.file_name)
+                self.deltas = self.delta_rows = 0
+            elif len(changed) > 0:
+                self.deltas += 1
+                self.delta_rows += len(changed)
+                _write(delta_file(self.file_name, self.deltas), False, base_id=np.array(self.base_id),
+                       layer_destinations=_layer_destinations(store), **changed.arrays())
+            else:
+                # written and undone since, e.g. a deposit evaporated away
+                self.saved_version = store.version
+                return False
+        else:
+            return False
+        self.saved_rows = rows
+        self.saved_version = store.version
+        return True
+
+
+def migrate_legacy_save(file_name: str, sim_settings: "SimulationSettings", backup: bool = True):
+    """
+    Rewrite a save made with `np.savez(..., nodes=...)` in the snapshot format.
+
+    Only the grid and objects are carried over, pheromones of the old per-node
+    dictionaries were keyed differently and cannot be mapped onto the store.
+    """
+    with np.load(file_name, allow_pickle=True) as data:
+        grid = as_codes(data["grid"], FieldType.GRASS)
+        objects = data["objects"] if "objects" in data.files else None
+
+    if objects is None or objects.shape != grid.shape:
+        # saves made before any object was placed hold a single None
+        objects = np.full(grid.shape, ObjectType.NOTHING.value, dtype=np.uint8)
+    objects = as_codes(objects, ObjectType.NOTHING)
+
+    # the snapshot is written next to the original first, so a failed migration leaves the original in place
+    store = ChunkedPheromoneStore(PathIndex.from_grid(grid), sim_settings.generic.node_max_smell)
+    migrated = file_name + ".migrated"
+    save_snapshot(migrated, grid, objects, store)
+    if backup:
+        os.replace(file_name, file_name + ".legacy")
+    os.replace(migrated, file_name)
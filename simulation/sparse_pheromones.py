@@ -0,0 +1,265 @@
+from simulation.pheromones import Coords, PathIndex, PheromoneStore
+
+import math
+import numpy as np
+
+# keys of the free slots of the hash table, a deleted slot doesn't end a search like an empty one
+EMPTY = -1
+DELETED = -2
+# multiplier of the Fibonacci hashing of the keys
+GOLDEN_RATIO = np.uint64(0x9E3779B97F4A7C15)
+MIN_CAPACITY = 1 << 10
+# bits of the node id in a key, the layer is above them
+NODE_BITS = 32
+
+
+class RowTable:
+    """
+    Hash table from int64 keys to rows of a value pool, with batched operations.
+
+    Open addressing with linear probing. Every operation advances a whole batch of keys
+    a probe at a time, so a batch takes a few array operations however large it is.
+    The table is rebuilt larger once half of its slots are taken.
+
+    Attributes:
+        keys: The key of every slot, EMPTY or DELETED for the free ones.
+        rows: The pool row of every slot holding a key.
+        count: The number of keys in the table.
+    """
+    def __init__(self, capacity: int = MIN_CAPACITY):
+        self._reset(capacity)
+
+    def _reset(self, capacity: int):
+        self.keys = np.full(capacity, EMPTY, dtype=np.int64)
+        self.rows = np.zeros(capacity, dtype=np.int32)
+        self.shift = np.uint64(65 - capacity.bit_length())
+        self.mask = capacity - 1
+        self.count = 0
+        # slots holding a key or DELETED, the ones that lengthen the searches
+        self.used = 0
+
+    def _home(self, keys: np.ndarray) -> np.ndarray:
+        return ((keys.astype(np.uint64) * GOLDEN_RATIO) >> self.shift).astype(np.int64)
+
+    def find(self, keys: np.ndarray) -> np.ndarray:
+        """Slots of the keys, -1 for the ones that are not in the table."""
+        found = np.full(len(keys), -1, dtype=np.int64)
+        slot = self._home(keys)
+        pending = np.arange(len(keys))
+        while len(pending) > 0:
+            stored = self.keys[slot[pending]]
+            hit = stored == keys[pending]
+            found[pending[hit]] = slot[pending[hit]]
+            pending = pending[~hit & (stored != EMPTY)]
+            slot[pending] = (slot[pending] + 1) & self.mask
+        return found
+
+    def insert(self, keys: np.ndarray, rows: np.ndarray):
+        """Add keys that are not in the table yet, all of them different."""
+        if 2 * (self.used + len(keys)) > len(self.keys):
+            self._rebuild(self.count + len(keys))
+        slot = self._home(keys)
+        pending = np.arange(len(keys))
+        while len(pending) > 0:
+            free = np.flatnonzero(self.keys[slot[pending]] < 0)
+            # of the keys probing the same free slot the first one takes it, the others go on
+            taken, first = np.unique(slot[pending[free]], return_index=True)
+            winners = pending[free[first]]
+            self.used += int((self.keys[taken] == EMPTY).sum())
+            self.keys[taken] = keys[winners]
+            self.rows[taken] = rows[winners]
+            placed = np.zeros(len(pending), dtype=bool)
+            placed[free[first]] = True
+            pending = pending[~placed]
+            slot[pending] = (slot[pending] + 1) & self.mask
+        self.count += len(keys)
+
+    def remove(self, slots: np.ndarray):
+        """Free slots holding keys, all of them different."""
+        self.keys[slots] = DELETED
+        self.count -= len(slots)
+
+    def live(self) -> np.ndarray:
+        """The slots holding a key."""
+        return np.flatnonzero(self.keys >= 0)
+
+    def _rebuild(self, count: int):
+        live = self.live()
+        keys, rows = self.keys[live], self.rows[live]
+        capacity = MIN_CAPACITY
+        while capacity < 4 * count:
+            capacity *= 2
+        self._reset(capacity)
+        self.insert(keys, rows)
+
+
+class SparsePheromoneStore(PheromoneStore):
+    """
+    Pheromone store keeping only the (destination, node) rows with a value of at least `cutoff`.
+
+    Rows live in a pool and are found through a `RowTable` keyed by layer and node id.
+    A row that decays below the cutoff is freed, so the memory follows the area the
+    trails cover, at the granularity of single nodes.
+
+    With an evaporation rate every value loses that fraction of itself every tick.
+    Instead of touching the values, they are kept divided by a scale that shrinks with
+    time and is computed from the tick it was last folded into them, so a tick costs
+    O(1). The scale is folded in, dropping the rows that evaporated below the cutoff,
+    whenever it halved, which costs O(rows) once every ln 2 / rate ticks. All the layers
+    evaporate at the same rate, so they share the scale.
+    """
+    def __init__(self, index: PathIndex, max_smell: float, cutoff: float = 1e-4, evaporation_rate: float = 0.0):
+        super().__init__(index, max_smell)
+        self.cutoff = cutoff
+        self.evaporation_rate = evaporation_rate
+
+        self.table = RowTable()
+        self._pool = np.zeros((MIN_CAPACITY, 4), dtype=np.float32)
+        # rows given back by pruning, taken again before the pool grows
+        self._free_rows = np.zeros(0, dtype=np.int32)
+        self._pool_used = 0
+
+        self.now = 0
+        self.folded_at = 0
+        self.fold_interval = math.ceil(math.log(2) / -math.log1p(-evaporation_rate)) if evaporation_rate > 0 else 0
+
+    @property
+    def scale(self) -> float:
+        """What the stored values are multiplied by to get the current ones."""
+        if self.evaporation_rate == 0:
+            return 1.0
+        return (1 - self.evaporation_rate) ** (self.now - self.folded_at)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory taken by the hash table and the rows in use."""
+        return self.table.keys.nbytes + self.table.rows.nbytes + self.table.count * 4 * self._pool.itemsize
+
+    @property
+    def values(self) -> np.ndarray:
+        """Dense (D, P, 4) copy of all the values, built on every call."""
+        values = np.zeros((len(self.layers), self.index.size, 4), dtype=np.float32)
+        live = self.table.live()
+        keys = self.table.keys[live]
+        values[keys >> NODE_BITS, keys & ((1 << NODE_BITS) - 1)] = self._pool[self.table.rows[live]] * self.scale
+        return values
+
+    def rows(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        live = self.table.live()
+        keys = self.table.keys[live]
+        order = np.argsort(keys)
+        keys = keys[order]
+        values = self._pool[self.table.rows[live[order]]] * self.scale
+        return (keys >> NODE_BITS).astype(np.int32), (keys & ((1 << NODE_BITS) - 1)).astype(np.int32), values
+
+    def tick(self):
+        self.now += 1
+        if self.evaporation_rate > 0:
+            self.version += 1
+            if self.now - self.folded_at >= self.fold_interval:
+                self.fold()
+
+    def fold(self):
+        """Multiply the scale into the stored values and drop the rows that evaporated below the cutoff."""
+        live = self.table.live()
+        self._pool[self.table.rows[live]] *= self.scale
+        self.folded_at = self.now
+        self._drop_weak(live)
+
+    def add_node(self, node: int):
+        self._grow_layer_of_node()
+        self.version += 1
+
+    def remove_node(self, node: int):
+        layers = np.arange(len(self.layers), dtype=np.int64)
+        entries = [(node, slice(None))] + [
+            (int(neighbor), (direction + 2) % 4)
+            for direction, neighbor in enumerate(self.index.neighbors[node]) if neighbor >= 0
+        ]
+        for cell, directions in entries:
+            slots = self.table.find(self._keys(layers, np.full(len(layers), cell)))
+            slots = slots[slots >= 0]
+            self._pool[self.table.rows[slots], directions] = 0
+            self._drop_weak(slots)
+        self.version += 1
+
+    @staticmethod
+    def _keys(layers: np.ndarray, nodes: np.ndarray) -> np.ndarray:
+        return (layers.astype(np.int64) << NODE_BITS) | nodes
+
+    def _allocate_rows(self, count: int) -> np.ndarray:
+        reused = self._free_rows[len(self._free_rows) - min(count, len(self._free_rows)):]
+        self._free_rows = self._free_rows[:len(self._free_rows) - len(reused)]
+        fresh = count - len(reused)
+        if self._pool_used + fresh > len(self._pool):
+            grown = np.zeros((max(self._pool_used + fresh, 2 * len(self._pool)), 4), dtype=np.float32)
+            grown[:self._pool_used] = self._pool[:self._pool_used]
+            self._pool = grown
+        rows = np.concatenate([reused, np.arange(self._pool_used, self._pool_used + fresh, dtype=np.int32)])
+        self._pool_used += fresh
+        return rows
+
+    def _rows(self, layers: np.ndarray, nodes: np.ndarray) -> np.ndarray:
+        """Pool rows of the entries, allocating zeroed rows for the missing ones."""
+        keys = self._keys(layers, nodes)
+        slots = self.table.find(keys)
+        rows = np.where(slots >= 0, self.table.rows[slots], -1)
+        missing = rows < 0
+        if missing.any():
+            new_keys, inverse = np.unique(keys[missing], return_inverse=True)
+            new_rows = self._allocate_rows(len(new_keys))
+            self.table.insert(new_keys, new_rows)
+            rows[missing] = new_rows[inverse]
+        return rows
+
+    def _drop_weak(self, slots: np.ndarray):
+        """Free the rows of the slots whose values are all below the cutoff."""
+        slots = np.unique(slots)
+        rows = self.table.rows[slots]
+        weak = self._pool[rows].max(axis=1) * self.scale < self.cutoff
+        self.table.remove(slots[weak])
+        self._pool[rows[weak]] = 0
+        self._free_rows = np.concatenate([self._free_rows, rows[weak]])
+
+    def read(self, layers: np.ndarray, nodes: np.ndarray) -> np.ndarray:
+        slots = self.table.find(self._keys(layers, nodes))
+        rows = np.zeros((len(nodes), 4), dtype=np.float32)
+        found = slots >= 0
+        rows[found] = self._pool[self.table.rows[slots[found]]] * self.scale
+        return rows
+
+    def node_values(self, layer: int, node: int) -> np.ndarray:
+        return self.read(np.array([layer]), np.array([node]))[0]
+
+    def deposit(self, destination: Coords, node: int, direction: int, delta: float):
+        self.deposit_many(np.array([self.layer_id(destination)]), np.array([node]), np.array([direction]),
+                          np.array([delta], dtype=np.float32))
+
+    def decay(self, destination: Coords, node: int, delta: float):
+        self.decay_many(np.array([self.layer_id(destination)]), np.array([node]), np.array([delta]))
+
+    def deposit_many(self, layers: np.ndarray, nodes: np.ndarray, directions: np.ndarray, deltas: np.ndarray):
+        rows = self._rows(layers, nodes)
+        scale = self.scale
+        np.add.at(self._pool, (rows, directions), deltas / scale)
+        self._pool[rows, directions] = np.minimum(self._pool[rows, directions], self.max_smell / scale)
+        self.version += 1
+
+    def decay_many(self, layers: np.ndarray, nodes: np.ndarray, deltas: np.ndarray):
+        slots = self.table.find(self._keys(layers, nodes))
+        found = slots >= 0
+        np.multiply.at(self._pool, self.table.rows[slots[found]], (1 / (1 + deltas[found]))[:, None])
+        self._drop_weak(slots[found])
+        self.version += 1
+
+    def assign(self, destination: Coords, nodes: np.ndarray, values: np.ndarray):
+        """Overwrite the (N, 4) values of the nodes, rows below the cutoff are dropped."""
+        layers = np.full(len(nodes), self.layer_id(destination), dtype=np.int32)
+        written = values.max(axis=1) >= self.cutoff
+        rows = self._rows(layers[written], nodes[written])
+        self._pool[rows] = values[written] / self.scale
+        slots = self.table.find(self._keys(layers[~written], nodes[~written]))
+        slots = slots[slots >= 0]
+        self._pool[self.table.rows[slots]] = 0
+        self._drop_weak(slots)
+        self.version += 1
@@ -0,0 +1,203 @@
+from constants.types import parse_coords
+from settings.simulation_settings import SimulationSettings, get_default_simulation_settings
+from simulation.headless import HeadlessSimulation
+from simulation.pheromones import Coords
+from simulation.shortest_path import distance_field, UNREACHABLE
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, fields
+from enum import Enum
+from multiprocessing import shared_memory
+
+import contextlib
+import io
+import itertools
+import random
+import time
+import types
+import typing
+import numpy as np
+
+Params = dict[str, float | int | bool | Enum | Coords]
+
+# read-only grid shared by the trials of a worker process, attached by `_attach_grid`
+_shared_grid: np.ndarray | None = None
+_shared_memory: shared_memory.SharedMemory | None = None
+
+
+@dataclass
+class Trial:
+    """
+    A single headless run of a sweep.
+
+    Attributes:
+        params: Setting overrides keyed by their dotted path, e.g. "population.exploration_chance".
+        seed: Seed of the simulation random number generator.
+    """
+    params: Params
+    seed: int
+
+
+@dataclass
+class TrialResult:
+    """
+    Attributes:
+        first_route_tick: The first check at which the ants had a route, None if they never had one.
+        converged_tick: The check after which the route stayed the same for `patience` checks.
+        final_ratio: Learned route length over the optimal one at the end of the run.
+        best_ratio: The lowest ratio seen during the run.
+        seconds: Wall time of the run.
+    """
+    trial: Trial
+    first_route_tick: int | None
+    converged_tick: int | None
+    final_ratio: float | None
+    best_ratio: float | None
+    seconds: float
+
+
+def coerce_setting(name: str, value: float | str | Coords) -> float | int | bool | Enum | Coords:
+    """
+    Convert a swept value, a number or its command line text, to the type of the setting,
+    as annotated on its dataclass field.
+
+    Int, bool and enum settings only take whole numbers, enums by their value or their name
+    and bools as true or false too. Coords settings take (x, y) pairs or "x,y" text. An optional
+    setting like `generic.seed` takes the type it has when it is set.
+    """
+    group, _, attribute = name.partition(".")
+    settings = getattr(get_default_simulation_settings(), group, None)
+    annotations = {field.name: field.type for field in fields(settings)} if settings is not None else {}
+    if attribute not in annotations:
+        raise ValueError(f"unknown setting {name}")
+    kind = annotations[attribute]
+    if typing.get_origin(kind) in (typing.Union, types.UnionType):
+        kind = next(option for option in typing.get_args(kind) if option is not type(None))
+
+    if typing.get_origin(kind) is tuple:
+        try:
+            x, y = parse_coords(value) if isinstance(value, str) else value
+            whole = float(x).is_integer() and float(y).is_integer()
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} takes x,y coordinates, got {value!r}") from None
+        if not whole:
+            raise ValueError(f"{name} only takes whole coordinates, got {value!r}")
+        return int(x), int(y)
+    if not isinstance(kind, type):
+        raise ValueError(f"{name} is a {kind} setting, which can't be swept")
+
+    if isinstance(value, str):
+        if issubclass(kind, Enum) and value.upper() in kind.__members__:
+            return kind[value.upper()]
+        if kind is bool and value.lower() in ("true", "false"):
+            return value.lower() == "true"
+        try:
+            value = float(value)
+        except ValueError:
+            raise ValueError(f"{name} takes a {kind.__name__}, got {value!r}") from None
+
+    if isinstance(value, kind):
+        return value
+    if kind is float:
+        return float(value)
+    if kind in (int, bool) or issubclass(kind, Enum):
+        if not float(value).is_integer() or kind is bool and value not in (0, 1):
+            raise ValueError(f"{name} only takes whole numbers, got {value}")
+        return int(value) if kind is int else kind(int(value))
+    raise ValueError(f"{name} is a {kind.__name__} setting, which can't be swept")
+
+
+def apply_params(sim_settings: SimulationSettings, params: Params):
+    for name, value in params.items():
+        group, attribute = name.split(".")
+        setattr(getattr(sim_settings, group), attribute, coerce_setting(name, value))
+
+
+def grid_trials(space: dict[str, list[float]], repeats: int = 1, samples: int | None = None,
+                seed: int = 0) -> list[Trial]:
+    """
+    Trials for every combination of the values, or for `samples` combinations drawn at random.
+    Every combination is run `repeats` times with different seeds.
+    """
+    names = list(space)
+    combinations = [dict(zip(names, values)) for values in itertools.product(*space.values())]
+    if samples is not None and samples < len(combinations):
+        combinations = random.Random(seed).sample(combinations, samples)
+    return [
+        Trial(params, seed + i * repeats + repeat)
+        for i, params in enumerate(combinations)
+        for repeat in range(repeats)
+    ]
+
+
+def _attach_grid(name: str, shape: tuple[int, int], dtype: str):
+    global _shared_grid, _shared_memory
+    _shared_memory = shared_memory.SharedMemory(name=name)
+    _shared_grid = np.ndarray(shape, dtype=dtype, buffer=_shared_memory.buf)
+    _shared_grid.flags.writeable = False
+
+
+def run_trial(trial: Trial, source: Coords, target: Coords, max_ticks: int, interval: int, patience: int,
+              grid: np.ndarray | None = None) -> TrialResult:
+    grid = grid if grid is not None else _shared_grid
+    sim_settings = get_default_simulation_settings()
+    apply_params(sim_settings, trial.params)
+    sim_settings.generic.seed = trial.seed
+    # swept trip ends take the place of the ones of the whole sweep
+    source = sim_settings.generic.source if "generic.source" in trial.params else source
+    target = sim_settings.generic.target if "generic.target" in trial.params else target
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        sim = HeadlessSimulation(None, sim_settings, source, target, grid=grid)
+        optimum = int(distance_field(sim.store.index, target)[sim.store.index.id_of(source)])
+        if optimum == UNREACHABLE:
+            raise ValueError(f"target {target} can't be reached from {source}")
+
+        first_route_tick = None
+        converged_tick = None
+        ratio = None
+        best_ratio = None
+        previous = None
+        stable = 0
+        while sim.ticks < max_ticks:
+            for _ in range(min(interval, max_ticks - sim.ticks)):
+                sim.step()
+            route = sim.routes.route(source, target)
+            if route is None:
+                ratio = None
+                stable = 0
+                previous = None
+                continue
+
+            ratio = route.length / max(optimum, 1)
+            best_ratio = ratio if best_ratio is None else min(best_ratio, ratio)
+            if first_route_tick is None:
+                first_route_tick = sim.ticks
+            stable = stable + 1 if route.path == previous else 0
+            previous = route.path
+            if stable >= patience and converged_tick is None:
+                converged_tick = sim.ticks
+
+    return TrialResult(trial, first_route_tick, converged_tick, ratio, best_ratio, time.perf_counter() - start)
+
+
+def run_sweep(grid: np.ndarray, trials: list[Trial], source: Coords, target: Coords, max_ticks: int,
+              interval: int = 100, patience: int = 5, workers: int | None = None) -> list[TrialResult]:
+    """
+    Run the trials in a process pool. The grid is copied once into shared memory that
+    every worker maps read-only, instead of being pickled with every trial.
+    """
+    memory = shared_memory.SharedMemory(create=True, size=max(grid.nbytes, 1))
+    try:
+        np.ndarray(grid.shape, dtype=grid.dtype, buffer=memory.buf)[:] = grid
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach_grid,
+                                 initargs=(memory.name, grid.shape, grid.dtype.str)) as pool:
+            futures = [
+                pool.submit(run_trial, trial, source, target, max_ticks, interval, patience)
+                for trial in trials
+            ]
+            return [future.result() for future in futures]
+    finally:
+        memory.close()
+        memory.unlink()
@@ -0,0 +1,90 @@
+from constants.enums import FieldType
+
+import os
+import numpy as np
+
+# colors of the map images
+MAP_COLORS = {
+    FieldType.GRASS: (255, 255, 255),
+    FieldType.PATH: (255, 191, 0),
+    FieldType.BUILDINGS: (0, 0, 0),
+}
+# rows of the map image converted at once, bounds the temporary memory of the conversion
+BAND_ROWS = 512
+
+
+def pack_colors(image: np.ndarray) -> np.ndarray:
+    image = image.astype(np.uint32)
+    return (image[..., 0] << 16) | (image[..., 1] << 8) | image[..., 2]
+
+
+def field_types(image: np.ndarray, row_offset: int = 0) -> np.ndarray:
+    """
+    FieldType values of the pixels of an (H, W, 3) image, in the same (H, W) layout.
+
+    Args:
+        row_offset: The row of the full image the first row belongs to, for the error of an unknown color.
+    """
+    known_colors = pack_colors(np.array(list(MAP_COLORS.values()), dtype=np.uint8))
+    order = np.argsort(known_colors)
+    known_colors = known_colors[order]
+    field_codes = np.array([field.value for field in MAP_COLORS], dtype=np.uint8)[order]
+
+    packed = pack_colors(image)
+    position = np.searchsorted(known_colors, packed).clip(max=len(known_colors) - 1)
+    unknown = known_colors[position] != packed
+    if unknown.any():
+        i, j = np.argwhere(unknown)[0]
+        raise ValueError(f"Unknown color at {i + row_offset}, {j}: {image[i, j]}")
+    return field_codes[position]
+
+
+def image_size(image_path: str) -> tuple[int, int]:
+    """Size of the map image in (x, y) format, read from its header only."""
+    # PIL is only imported for reading map images, grids and saves don't need it
+    from PIL import Image
+    with Image.open(image_path) as image:
+        return image.size
+
+
+def grid_cache_path(image_path: str) -> str:
+    stem, _ = os.path.splitext(image_path)
+    return stem + ".grid.npy"
+
+
+def convert_map_image(image_path: str, grid_path: str, band_rows: int = BAND_ROWS):
+    """
+    Convert a map image into a (W, H) FieldType grid saved as an .npy file.
+
+    The image is converted a band of rows at a time straight into the memory-mapped
+    output, so apart from the decoded image only a single band is held in memory.
+    """
+    from PIL import Image
+    with Image.open(image_path) as image:
+        width, height = image.size
+        grid = np.lib.format.open_memmap(grid_path + ".tmp", mode="w+", dtype=np.uint8, shape=(width, height))
+        for top in range(0, height, band_rows):
+            bottom = min(top + band_rows, height)
+            band = np.asarray(image.crop((0, top, width, bottom)).convert("RGB"))
+            grid[:, top:bottom] = field_types(band, top).transpose() # numpy uses height first
+        grid.flush()
+        del grid
+    os.replace(grid_path + ".tmp", grid_path)
+
+
+def load_map_grid(image_path: str, band_rows: int = BAND_ROWS) -> np.ndarray:
+    """
+    Memory-mapped FieldType grid of a map image.
+
+    The grid is converted once and cached next to the image, later loads only map the
+    cache, so the pages of the map are read from disk when they are first touched.
+    The mapping is copy-on-write, editing the grid never changes the cache.
+    """
+    grid_path = grid_cache_path(image_path)
+    if not os.path.exists(grid_path) or os.path.getmtime(grid_path) < os.path.getmtime(image_path):
+        convert_map_image(image_path, grid_path, band_rows)
+    grid = np.load(grid_path, mmap_mode="c")
+    if grid.shape != image_size(image_path):
+        convert_map_image(image_path, grid_path, band_rows)
+        grid = np.load(grid_path, mmap_mode="c")
+    return grid
@@ -0,0 +1,161 @@
+from simulation.node import NodeGrid
+from simulation.pheromones import Coords, PheromoneStore
+from simulation.population import Population
+
+from dataclasses import dataclass
+
+import queue
+import threading
+import time
+import numpy as np
+
+
+@dataclass(frozen=True)
+class FrameSnapshot:
+    """
+    What the renderer needs from the simulation for a single frame.
+
+    Attributes:
+        ticks: The number of ticks simulated so far.
+        version: The pheromone store version the snapshot was taken at.
+        positions: (N, 2) positions of the ants.
+        flavor: The pheromone flavor of `intensity`.
+        intensity: Normalized pheromone intensity of every node, None when it wasn't requested.
+    """
+    ticks: int
+    version: int
+    positions: np.ndarray
+    flavor: Coords | None = None
+    intensity: np.ndarray | None = None
+
+    @staticmethod
+    def capture(population: Population, store: PheromoneStore, flavor: Coords | None = None) -> "FrameSnapshot":
+        intensity = store.intensity(flavor) if flavor is not None else None
+        return FrameSnapshot(population.ticks, store.version, population.positions(), flavor, intensity)
+
+
+class SimulationWorker(threading.Thread):
+    """
+    Steps the population in a background thread and publishes snapshots for the renderer.
+
+    Snapshots are double-buffered: a new one is built in the back slot and the
+    slots are swapped once it is complete, so `latest` always returns a whole
+    snapshot without waiting for the simulation. Everything that changes the
+    simulation is sent through `send` and applied by the worker between ticks.
+    The worker holds `state_lock` while it changes the simulation, readers of the
+    pheromone store or the path index on other threads take it as well. A command or
+    tick that raises pauses the worker, the exception is kept for the UI thread to
+    collect with `take_error`.
+
+    Commands:
+        ("pause",), ("resume",), ("step",): control the run.
+        ("set_source", (x, y)), ("set_target", (x, y)): change the generic source and target.
+        ("show_pheromones", bool): include the intensity of the source's pheromones in the snapshots.
+        ("update_cell", (x, y), bool): make a repainted cell a path cell or not, see `Population.update_cell`.
+        ("stop",): end the thread.
+    """
+    def __init__(self, population: Population, grid: np.ndarray, objects: np.ndarray, nodes: NodeGrid,
+                 publish_interval: float, pheromone_refresh_ticks: int):
+        super().__init__(daemon=True, name="simulation")
+        self.population = population
+        self.grid = grid
+        self.objects = objects
+        self.nodes = nodes
+        self.publish_interval = publish_interval
+        self.pheromone_refresh_ticks = pheromone_refresh_ticks
+
+        self.commands: queue.Queue[tuple] = queue.Queue()
+        self.paused = True
+        self.stopped = False
+        self.show_pheromones = False
+
+        self.buffers: list[FrameSnapshot] = [FrameSnapshot.capture(population, nodes.store)] * 2
+        self.front = 0
+        self.swap_lock = threading.Lock()
+        self.state_lock = threading.Lock()
+        self.last_publish = 0.0
+        self.error: BaseException | None = None
+
+    def send(self, *command):
+        self.commands.put(command)
+
+    def take_error(self) -> BaseException | None:
+        """The exception that paused the worker since the last call, None if there was none."""
+        with self.state_lock:
+            error, self.error = self.error, None
+        return error
+
+    def latest(self) -> FrameSnapshot:
+        with self.swap_lock:
+            return self.buffers[self.front]
+
+    def publish(self):
+        previous = self.buffers[self.front]
+        flavor = self.population.sim_settings.generic.source if self.show_pheromones else None
+        intensity = None
+        if flavor is not None:
+            elapsed = self.population.ticks - previous.ticks
+            # a version changed without a tick means the map was edited
+            edited = elapsed == 0 and previous.version != self.nodes.store.version
+            fresh = previous.flavor == flavor and previous.intensity is not None and \
+                elapsed < self.pheromone_refresh_ticks and not edited
+            intensity = previous.intensity if fresh else self.nodes.store.intensity(flavor)
+
+        back = 1 - self.front
+        self.buffers[back] = FrameSnapshot(self.population.ticks, self.nodes.store.version,
+                                           self.population.positions(), flavor, intensity)
+        with self.swap_lock:
+            self.front = back
+        self.last_publish = time.perf_counter()
+
+    def handle(self, command: tuple):
+        name, *args = command
+        settings = self.population.sim_settings.generic
+        if name == "pause":
+            self.paused = True
+        elif name == "resume":
+            self.paused = False
+        elif name == "step":
+            self.population.step(self.grid, self.objects, self.nodes)
+        elif name == "set_source":
+            settings.source = args[0]
+        elif name == "set_target":
+            settings.target = args[0]
+        elif name == "update_cell":
+            self.population.update_cell(self.nodes, *args)
+        elif name == "show_pheromones":
+            self.show_pheromones = args[0]
+        elif name == "stop":
+            self.stopped = True
+        else:
+            raise ValueError(f"unknown command {name}")
+
+    def run(self):
+        with self.population.metrics.profiling():
+            self.loop()
+
+    def loop(self):
+        while not self.stopped:
+            try:
+                # a paused worker sleeps until a command comes in
+                command = self.commands.get(timeout=self.publish_interval) if self.paused \
+                    else self.commands.get_nowait()
+            except queue.Empty:
+                command = None
+
+            with self.state_lock:
+                try:
+                    if command is not None:
+                        self.handle(command)
+                    if not self.paused:
+                        self.population.step(self.grid, self.objects, self.nodes)
+                except Exception as error:
+                    # the thread lives on, so the run can go on once the cause is fixed
+                    self.error = error
+                    self.paused = True
+                if self.paused or time.perf_counter() - self.last_publish >= self.publish_interval:
+                    self.publish()
+
+    def stop(self):
+        self.send("stop")
+        self.join()
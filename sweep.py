@@ -0,0 +1,77 @@
+from constants.types import parse_coords
+from settings.simulation_settings import get_default_simulation_settings
+from simulation import initialize
+from simulation.sweep import coerce_setting, grid_trials, run_sweep
+
+from enum import Enum
+
+import argparse
+import csv
+
+
+def parse_param(text: str) -> tuple[str, list]:
+    name, values = text.split("=")
+    # coordinates hold a comma, a list of them is separated by semicolons
+    group, _, attribute = name.partition(".")
+    takes_coords = isinstance(getattr(getattr(get_default_simulation_settings(), group, None), attribute, None), tuple)
+    return name, [coerce_setting(name, value) for value in values.split(";" if takes_coords else ",")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep simulation settings with headless runs in a process pool.")
+    parser.add_argument("--source", type=parse_coords, required=True, help="source tile as x,y")
+    parser.add_argument("--target", type=parse_coords, required=True, help="target tile as x,y")
+    parser.add_argument("--param", type=parse_param, action="append", required=True,
+                        help="setting and its values, e.g. population.exploration_chance=0.1,0.3,0.5, "
+                             "population.engine=vectorized,compiled or generic.source='6,15;20,4'")
+    parser.add_argument("--samples", type=int, help="run only this many random combinations")
+    parser.add_argument("--repeats", type=int, default=1, help="runs with different seeds per combination")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--ticks", type=int, default=10_000)
+    parser.add_argument("--interval", type=int, default=100, help="ticks between route checks")
+    parser.add_argument("--patience", type=int, default=5, help="checks the route has to stay the same")
+    parser.add_argument("--workers", type=int, help="number of processes, all cores by default")
+    parser.add_argument("--simple-map", action="store_true", help="use the small map saved in ant.npz")
+    parser.add_argument("--csv", help="also write the results to this file")
+    args = parser.parse_args()
+
+    sim_settings = get_default_simulation_settings()
+    sim_settings.generic.simple_map = args.simple_map
+    sim_settings.generic.create_grid_from_img = not args.simple_map
+    save_name = "ant.npz" if args.simple_map else "agh.npz"
+    sim_settings.generic.grid_size = initialize.detect_grid_size(save_name, sim_settings)
+    if args.simple_map:
+        grid = initialize.load_grid_from_file(save_name, sim_settings).grid
+    else:
+        grid = initialize.create_grid(sim_settings)
+
+    trials = grid_trials(dict(args.param), args.repeats, args.samples, args.seed)
+    print(f"running {len(trials)} trials")
+    results = run_sweep(grid, trials, args.source, args.target, args.ticks, args.interval, args.patience,
+                        args.workers)
+
+    def plain(value):
+        return value.name if isinstance(value, Enum) else value
+
+    names = [name for name, _ in args.param]
+    columns = ["seed", "first_route_tick", "converged_tick", "final_ratio", "best_ratio", "seconds"]
+    rows = [
+        [plain(result.trial.params[name]) for name in names]
+        + [result.trial.seed, result.first_route_tick, result.converged_tick,
+           result.final_ratio, result.best_ratio, round(result.seconds, 2)]
+        for result in results
+    ]
+
+    def cell(value) -> str:
+        if value is None:
+            return "-"
+        return f"{value:.2f}" if isinstance(value, float) else str(value)
+
+    print(" ".join(f"{column:>18}" for column in names + columns))
+    for row in rows:
+        print(" ".join(f"{cell(value):>18}" for value in row))
+    if args.csv:
+        with open(args.csv, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(names + columns)
+            writer.writerows(rows)
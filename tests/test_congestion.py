@@ -0,0 +1,85 @@
+from constants.enums import FieldType, StepEngine
+from settings.simulation_settings import get_default_simulation_settings
+from simulation.congestion import ADMISSION_ROUNDS, Congestion
+from simulation.headless import HeadlessSimulation
+
+import numpy as np
+
+
+def occupied(size: int, capacity: int, nodes: list[int]) -> Congestion:
+    congestion = Congestion(size, capacity)
+    congestion.enter(np.array(nodes))
+    return congestion
+
+
+def admit(congestion: Congestion, nodes: list[int], targets: list[int], waiting: list[int] | None = None,
+          exempt: list[bool] | None = None) -> list[bool]:
+    waiting = waiting if waiting is not None else [0] * len(nodes)
+    return congestion.admit(np.array(nodes), np.array(targets), np.array(waiting),
+                            np.array(exempt) if exempt is not None else None).tolist()
+
+
+def test_two_ants_swap_across_a_full_pair_of_nodes():
+    congestion = occupied(4, 1, [1, 2])
+    assert admit(congestion, [1, 2], [2, 1]) == [True, True]
+    # without the other one leaving, neither fits
+    assert admit(congestion, [1], [2]) == [False]
+
+
+def test_a_queue_moves_up_together_behind_a_free_node():
+    congestion = occupied(12, 1, list(range(10)))
+    assert admit(congestion, list(range(10)), list(range(1, 11))) == [True] * 10
+
+
+def test_a_queue_behind_a_blocked_front_stays():
+    # longer than the rounds of admission, which then fall back to the spare places only
+    queue = 2 * ADMISSION_ROUNDS
+    congestion = occupied(queue + 2, 1, list(range(queue + 1)))
+    assert admit(congestion, list(range(queue)), list(range(1, queue + 1))) == [False] * queue
+
+
+def test_the_longest_waiting_ants_go_first():
+    congestion = occupied(8, 2, [1, 2, 3, 4, 7])
+    # node 7 has one spare place
+    assert admit(congestion, [1, 2, 3, 4], [7, 7, 7, 7], waiting=[0, 3, 1, 3]) == [False, True, False, False]
+    # ties go to the ant spawned first
+    assert admit(congestion, [1, 2, 3], [7, 7, 7], waiting=[2, 1, 2]) == [True, False, False]
+
+
+def test_ants_arriving_at_their_destination_always_fit():
+    congestion = occupied(4, 1, [1, 2])
+    assert admit(congestion, [1], [2], exempt=[True]) == [True]
+    # and don't take the places of the others
+    congestion = occupied(4, 1, [0, 1, 3])
+    assert admit(congestion, [0, 1, 3], [2, 2, 2], waiting=[5, 0, 0], exempt=[False, True, False]) == \
+        [True, True, False]
+
+
+def test_occupancy_follows_the_ants_and_stays_within_capacity():
+    grid = np.full((14, 3), FieldType.GRASS.value, dtype=np.uint8)
+    grid[:, 1] = FieldType.PATH.value
+    grid[6, :] = FieldType.PATH.value
+    sim_settings = get_default_simulation_settings()
+    sim_settings.population.engine = StepEngine.VECTORIZED
+    sim_settings.population.ants_per_generation = 12
+    sim_settings.population.spawn_interval = 60
+    sim_settings.generic.node_capacity = 1
+    sim_settings.generic.seed = 0
+    sim_settings.metrics.enabled = True
+    sim = HeadlessSimulation(None, sim_settings, (0, 1), (13, 1), grid=grid)
+    index = sim.store.index
+    ends = [index.id_of(sim.source), index.id_of(sim.target)]
+
+    blocked = 0
+    for _ in range(300):
+        sim.step()
+        colony = sim.population.colony
+        occupancy = sim.nodes.congestion.occupancy[:index.size]
+        np.testing.assert_array_equal(occupancy, np.bincount(colony.node, minlength=index.size))
+        # only the spawn cells, which are the destinations too, hold more
+        assert np.delete(occupancy, ends).max() <= 1
+
+        # the ants held back this tick are the ones waiting now
+        assert sim.metrics.totals["blocked"] - blocked == (colony.waiting > 0).sum()
+        blocked = sim.metrics.totals["blocked"]
+    assert blocked > 0 and sim.metrics.totals["arrived"] > 0
@@ -0,0 +1,43 @@
+from constants.enums import FieldType, SpawnMode, StepEngine
+from settings.simulation_settings import get_default_simulation_settings
+from simulation.headless import HeadlessSimulation
+
+import numpy as np
+import pytest
+
+pytest.importorskip("numba")
+
+
+def lattice_run(engine: StepEngine, spawn_mode: SpawnMode, node_capacity: int, ticks: int) -> HeadlessSimulation:
+    grid = np.full((30, 24), FieldType.GRASS.value, dtype=np.uint8)
+    grid[::3, :] = FieldType.PATH.value
+    grid[:, ::4] = FieldType.PATH.value
+    grid[np.random.default_rng(3).random(grid.shape) < 0.08] = FieldType.GRASS.value
+    grid[0, 0] = grid[9, 8] = FieldType.PATH.value
+
+    sim_settings = get_default_simulation_settings()
+    sim_settings.population.engine = engine
+    sim_settings.population.spawn_mode = spawn_mode
+    sim_settings.population.ants_per_generation = 60
+    sim_settings.population.ants_per_node = 20
+    sim_settings.population.random_destinations = 6
+    sim_settings.population.spawn_interval = 120
+    sim_settings.generic.node_capacity = node_capacity
+    sim_settings.generic.seed = 7
+    sim_settings.metrics.enabled = True
+    sim = HeadlessSimulation(None, sim_settings, (0, 0), (9, 8), grid=grid)
+    sim.run(ticks)
+    return sim
+
+
+@pytest.mark.parametrize("spawn_mode", list(SpawnMode))
+@pytest.mark.parametrize("node_capacity", [0, 2])
+def test_compiled_engine_takes_the_steps_of_the_vectorized_one(spawn_mode, node_capacity):
+    vectorized = lattice_run(StepEngine.VECTORIZED, spawn_mode, node_capacity, 400)
+    compiled = lattice_run(StepEngine.COMPILED, spawn_mode, node_capacity, 400)
+    assert compiled.population.colony.compiled
+
+    np.testing.assert_array_equal(compiled.population.colony.node, vectorized.population.colony.node)
+    np.testing.assert_array_equal(compiled.store.values, vectorized.store.values)
+    assert compiled.metrics.totals["arrived"] == vectorized.metrics.totals["arrived"] > 0
+    assert compiled.metrics.totals["blocked"] == vectorized.metrics.totals["blocked"]
@@ -0,0 +1,48 @@
+from simulation.metrics import Metrics
+
+import json
+import sys
+import threading
+
+
+def test_counts_and_times_from_two_threads_all_add_up(tmp_path):
+    # switch threads as often as possible to interleave the updates
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    log_path = tmp_path / "metrics.json"
+    metrics = Metrics(enabled=True, log_path=str(log_path))
+    ticks = 2_000
+
+    def simulate():
+        for tick in range(ticks):
+            metrics.count("arrived")
+            metrics.add_time("step", 1.0)
+            metrics.end_tick(tick)
+
+    def draw():
+        for i in range(ticks):
+            # a phase new to the overlay on every frame, the overlay is read meanwhile
+            metrics.add_time(f"draw_{i % 50}", 1.0)
+            metrics.count("blocked", 2)
+            metrics.overlay_lines()
+
+    try:
+        threads = [threading.Thread(target=simulate), threading.Thread(target=draw)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+        metrics.close()
+
+    assert metrics.totals["arrived"] == ticks
+    assert metrics.totals["blocked"] == 2 * ticks
+    rows = [json.loads(line) for line in log_path.read_text().splitlines()]
+    assert [row["tick"] for row in rows] == list(range(ticks))
+    assert sum(row.get("arrived", 0) for row in rows) == ticks
+    assert sum(row.get("step", 0) for row in rows) == ticks
+    # every time and count of the drawing lands in one of the rows, none is lost when a tick ends
+    assert sum(row.get("blocked", 0) for row in rows) + metrics.counts.get("blocked", 0) == 2 * ticks
+    drawn = sum(value for row in rows for name, value in row.items() if name.startswith("draw_"))
+    assert drawn + sum(value for name, value in metrics.times.items() if name.startswith("draw_")) == ticks
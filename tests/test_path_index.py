@@ -0,0 +1,86 @@
+from constants.enums import FieldType, StepEngine
+from settings.simulation_settings import get_default_simulation_settings
+from simulation.headless import HeadlessSimulation
+from simulation.pheromones import PathIndex
+
+import numpy as np
+
+
+def cells_of(index: PathIndex, ids: np.ndarray) -> set[tuple[int, int]]:
+    return {(int(x), int(y)) for x, y in index.coords[ids]}
+
+
+def links_of(index: PathIndex) -> dict[tuple[int, int], tuple]:
+    """The cell of every path cell's up, right, down and left neighbor, None where there is none."""
+    ids = np.flatnonzero(index.alive())
+    return {
+        (int(x), int(y)): tuple(tuple(map(int, index.coords[n])) if n >= 0 else None for n in neighbors)
+        for (x, y), neighbors in zip(index.coords[ids], index.neighbors[ids])
+    }
+
+
+def assert_matches_rebuilt(index: PathIndex, grid: np.ndarray):
+    rebuilt = PathIndex.from_grid(grid)
+    alive = np.flatnonzero(index.alive())
+    assert cells_of(index, alive) == cells_of(rebuilt, np.arange(rebuilt.size))
+    assert links_of(index) == links_of(rebuilt)
+
+    # every cell of the grid, with a border around it, looks up its own id
+    x, y = np.meshgrid(np.arange(-1, grid.shape[0] + 1), np.arange(-1, grid.shape[1] + 1), indexing="ij")
+    ids = index.lookup(x.ravel(), y.ravel())
+    expected = rebuilt.lookup(x.ravel(), y.ravel()) >= 0
+    np.testing.assert_array_equal(ids >= 0, expected)
+    np.testing.assert_array_equal(index.coords[ids[expected]], np.stack([x.ravel(), y.ravel()], axis=1)[expected])
+    assert all(index.id_of((int(a), int(b))) == i for a, b, i in zip(x.ravel()[::7], y.ravel()[::7], ids[::7]))
+
+    assert cells_of(index, index.ids_in(3, 2, 17, 9)) == cells_of(rebuilt, rebuilt.ids_in(3, 2, 17, 9))
+
+
+def test_edits_match_a_rebuilt_index():
+    rng = np.random.default_rng(0)
+    grid = np.where(rng.random((24, 18)) < 0.6, FieldType.PATH.value, FieldType.GRASS.value).astype(np.uint8)
+    index = PathIndex.from_grid(grid)
+    ids = {}
+
+    for _ in range(400):
+        pos = (int(rng.integers(0, grid.shape[0])), int(rng.integers(0, grid.shape[1])))
+        if pos in index:
+            ids[pos] = index.remove(pos)
+            grid[pos] = FieldType.GRASS.value
+        else:
+            # a cell painted back gets the id it had
+            assert ids.setdefault(pos, index.add(pos)) == index.id_of(pos)
+            grid[pos] = FieldType.PATH.value
+
+    assert index.added and index.removed
+    assert_matches_rebuilt(index, grid)
+
+
+def test_repainting_keeps_occupancy_of_the_ants():
+    rng = np.random.default_rng(1)
+    grid = np.full((20, 20), FieldType.GRASS.value, dtype=np.uint8)
+    grid[::3, :] = FieldType.PATH.value
+    grid[:, ::3] = FieldType.PATH.value
+    sim_settings = get_default_simulation_settings()
+    sim_settings.population.engine = StepEngine.VECTORIZED
+    sim_settings.population.ants_per_generation = 60
+    sim_settings.population.spawn_interval = 40
+    sim_settings.generic.node_capacity = 2
+    sim_settings.generic.seed = 0
+    source, target = (0, 0), (18, 18)
+    sim = HeadlessSimulation(None, sim_settings, source, target, grid=grid)
+
+    for _ in range(150):
+        sim.step()
+        pos = (int(rng.integers(0, 20)), int(rng.integers(0, 20)))
+        if pos in (source, target):
+            continue
+        sim.paint_tile(pos, FieldType.GRASS if pos in sim.store.index else FieldType.PATH)
+
+        colony = sim.population.colony
+        index = sim.store.index
+        assert (index.lookup(*index.coords[colony.node].T) == colony.node).all()
+        occupancy = np.bincount(colony.node, minlength=index.size)
+        np.testing.assert_array_equal(sim.nodes.congestion.occupancy[:index.size], occupancy)
+
+    assert_matches_rebuilt(sim.store.index, sim.grid)
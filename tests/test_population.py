@@ -0,0 +1,52 @@
+from constants.enums import FieldType, StepEngine
+from settings.simulation_settings import get_default_simulation_settings
+from simulation.headless import HeadlessSimulation
+
+import numpy as np
+import pytest
+
+
+def corridor_sim(engine: StepEngine, ants: int = 4, node_capacity: int = 0, seed: int = 0) -> HeadlessSimulation:
+    grid = np.full((12, 5), FieldType.GRASS.value, dtype=np.uint8)
+    grid[1:11, 2] = FieldType.PATH.value
+    grid[5, 0:5] = FieldType.PATH.value
+    sim_settings = get_default_simulation_settings()
+    sim_settings.population.engine = engine
+    sim_settings.population.ants_per_generation = ants
+    sim_settings.generic.node_capacity = node_capacity
+    sim_settings.generic.seed = seed
+    return HeadlessSimulation(None, sim_settings, (1, 2), (10, 2), grid=grid)
+
+
+@pytest.mark.parametrize("engine", list(StepEngine))
+def test_painting_over_the_source_stops_the_run_until_it_is_set(engine):
+    sim = corridor_sim(engine)
+    sim.run(5)
+    sim.paint_tile((1, 2), FieldType.WATER)
+    assert sim.source is None and sim.sim_settings.generic.source is None
+    assert sim.best_path() is None
+
+    ticks = sim.population.ticks
+    with pytest.raises(ValueError, match="source or the target"):
+        sim.step()
+    assert sim.population.ticks == ticks
+    with pytest.raises(ValueError, match="not on a path"):
+        sim.set_source((1, 2))
+
+    sim.set_source((5, 0))
+    sim.run(20)
+    assert sim.population.ticks == ticks + 20
+    assert (sim.population.positions() != (1, 2)).any(axis=1).all()
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_a_single_ant_takes_the_same_steps_with_every_engine(seed):
+    # the batched engines write the pheromones after all the ants chose, so only a single ant matches REFERENCE
+    sims = [corridor_sim(engine, ants=1, seed=seed) for engine in (StepEngine.REFERENCE, StepEngine.VECTORIZED)]
+    for _ in range(300):
+        for sim in sims:
+            sim.step()
+        reference, vectorized = (sim.population.positions() for sim in sims)
+        np.testing.assert_array_equal(reference, vectorized)
+    np.testing.assert_allclose(sims[0].store.values, sims[1].store.values, rtol=1e-6)
+    assert sims[0].store.values.any()
@@ -0,0 +1,125 @@
+from constants.enums import FieldType, SpawnMode, StepEngine
+from settings.simulation_settings import get_default_simulation_settings
+from simulation.headless import HeadlessSimulation
+from simulation.pheromones import ChunkedPheromoneStore, PathIndex
+from simulation.routes import RouteTable, follow_pheromones, follow_pheromones_many
+
+import numpy as np
+
+GOAL = (1, 2)
+
+
+def block_store(trail: dict) -> ChunkedPheromoneStore:
+    """A 2x3 block of path cells with the given (up, right, down, left) values towards GOAL."""
+    grid = np.full((2, 3), FieldType.PATH.value, dtype=np.uint8)
+    store = ChunkedPheromoneStore(PathIndex.from_grid(grid), max_smell=10)
+    cells = np.array(list(trail), dtype=np.int64)
+    store.assign(GOAL, store.index.ids_of(cells), np.array(list(trail.values()), dtype=np.float32))
+    return store
+
+
+# (0, 0) -> (1, 0) -> (1, 1) -> (0, 1) leads back to the start, (0, 1) has a weaker way out to the goal
+LOOP = {(0, 0): [0, 5, 0, 0], (1, 0): [0, 0, 5, 0], (1, 1): [0, 0, 1, 5], (0, 1): [5, 0, 1, 0], (0, 2): [0, 1, 0, 0]}
+
+
+def test_a_trail_looping_back_goes_on_along_its_next_strongest_link():
+    store = block_store(LOOP)
+    route = [(0, 0), (1, 0), (1, 1), (0, 1), (0, 2), (1, 2)]
+    assert follow_pheromones(store, GOAL, (0, 0), GOAL) == route
+    # from (1, 1) the loop ends at (1, 0), with nothing left but visited cells
+    assert follow_pheromones_many(store, [((0, 0), GOAL), ((1, 1), GOAL)]) == [route, None]
+
+
+def test_a_trail_closing_on_itself_has_no_route():
+    store = block_store({**LOOP, (0, 1): [5, 0, 0, 0]})
+    assert follow_pheromones(store, GOAL, (0, 0), GOAL) is None
+    assert follow_pheromones_many(store, [((0, 0), GOAL)]) == [None]
+
+
+def test_a_destination_no_ant_started_from_has_no_route():
+    # only the trail towards (0, 0), which isn't followed backwards
+    grid = np.full((2, 3), FieldType.PATH.value, dtype=np.uint8)
+    store = ChunkedPheromoneStore(PathIndex.from_grid(grid), max_smell=10)
+    store.assign((0, 0), store.index.ids_of(np.array([[1, 2], [1, 1], [1, 0]])),
+                 np.array([[5, 0, 0, 0], [5, 0, 0, 0], [0, 0, 0, 5]], dtype=np.float32))
+    table = RouteTable(store)
+    assert table.route((0, 0), GOAL) is None
+    assert table.routes([((0, 0), GOAL)]) == [None]
+    assert table.route(GOAL, (0, 0)).path == ((1, 2), (1, 1), (1, 0), (0, 0))
+
+
+def test_routes_are_cached_until_the_pheromones_change():
+    store = block_store(LOOP)
+    table = RouteTable(store, max_size=2)
+    first = table.route((0, 0), GOAL)
+    assert first.length == 5
+    assert table.route((0, 0), GOAL) is first
+    assert (table.hits, table.misses) == (1, 1)
+
+    store.deposit(GOAL, store.index.id_of((0, 2)), 1, 1)
+    assert table.route((0, 0), GOAL) is not first
+    assert (table.hits, table.misses) == (1, 2)
+
+    # the least recently used one goes first
+    version = store.version
+    table.route((1, 0), GOAL)
+    assert list(table.cache) == [((0, 0), GOAL, version), ((1, 0), GOAL, version)]
+    # a batch counts its repeats as hits
+    table.routes([((1, 0), GOAL), ((0, 1), GOAL), ((0, 1), GOAL)])
+    assert (table.hits, table.misses) == (3, 4)
+    assert list(table.cache) == [((1, 0), GOAL, version), ((0, 1), GOAL, version)]
+
+
+def corridor_run() -> HeadlessSimulation:
+    grid = np.full((12, 5), FieldType.GRASS.value, dtype=np.uint8)
+    grid[1:11, 2] = FieldType.PATH.value
+    grid[5, 0:5] = FieldType.PATH.value
+    sim_settings = get_default_simulation_settings()
+    sim_settings.population.engine = StepEngine.VECTORIZED
+    sim_settings.generic.seed = 0
+    sim = HeadlessSimulation(None, sim_settings, (1, 2), (10, 2), grid=grid)
+    sim.run(300)
+    return sim
+
+
+def test_editing_the_map_keeps_only_the_routes_away_from_the_edit():
+    sim = corridor_run()
+    route = sim.best_path()
+    assert route == [(x, 2) for x in range(1, 11)]
+
+    # the end of the cross isn't on the route
+    sim.paint_tile((5, 0), FieldType.GRASS)
+    misses = sim.routes.misses
+    assert sim.best_path() == route
+    assert sim.routes.misses == misses
+
+    sim.paint_tile((7, 2), FieldType.GRASS)
+    assert sim.best_path() is None
+    assert sim.routes.misses == misses + 1
+
+
+def test_batched_routes_are_the_ones_traced_one_by_one():
+    grid = np.full((30, 24), FieldType.GRASS.value, dtype=np.uint8)
+    grid[::3, :] = FieldType.PATH.value
+    grid[:, ::4] = FieldType.PATH.value
+    grid[np.random.default_rng(3).random(grid.shape) < 0.08] = FieldType.GRASS.value
+    grid[0, 0] = grid[9, 8] = FieldType.PATH.value
+    sim_settings = get_default_simulation_settings()
+    sim_settings.population.engine = StepEngine.VECTORIZED
+    sim_settings.population.spawn_mode = SpawnMode.ALL_PAIRS
+    sim_settings.population.ants_per_node = 20
+    sim_settings.population.random_destinations = 6
+    sim_settings.generic.seed = 7
+    sim = HeadlessSimulation(None, sim_settings, (0, 0), (9, 8), grid=grid)
+    sim.run(400)
+
+    store = sim.store
+    rng = np.random.default_rng(0)
+    starts = store.index.coords[rng.integers(0, store.index.size, 300)]
+    destinations = list(store.layers) + [(2, 2)]
+    pairs = [((int(x), int(y)), destinations[i % len(destinations)]) for i, (x, y) in enumerate(starts)]
+
+    one_by_one = [follow_pheromones(store, destination, source, destination) for source, destination in pairs]
+    assert follow_pheromones_many(store, pairs) == one_by_one
+    assert sum(route is not None for route in one_by_one) > 20
+    assert sum(route is None for route in one_by_one) > 0
@@ -0,0 +1,60 @@
+from constants.enums import FieldType
+from simulation.pheromones import PathIndex
+from simulation.shortest_path import UNREACHABLE, distance_field, shortest_path
+
+import numpy as np
+import pytest
+
+# rows are y, columns are x, (2, 4) is cut off from the rest
+MAZE = [
+    ".....",
+    ".#.#.",
+    ".#...",
+    ".###.",
+    ".#.#.",
+]
+
+
+def maze_index() -> PathIndex:
+    grid = np.array([[FieldType.PATH.value if cell == "." else FieldType.GRASS.value for cell in row]
+                     for row in MAZE], dtype=np.uint8).T
+    return PathIndex.from_grid(grid)
+
+
+def test_distances_are_the_steps_to_the_goal():
+    index = maze_index()
+    distance = distance_field(index, (4, 4))
+    expected = {
+        (0, 0): 8, (1, 0): 7, (2, 0): 6, (3, 0): 5, (4, 0): 4,
+        (0, 1): 9, (2, 1): 5, (4, 1): 3,
+        (0, 2): 10, (2, 2): 4, (3, 2): 3, (4, 2): 2,
+        (0, 3): 11, (4, 3): 1,
+        (0, 4): 12, (2, 4): UNREACHABLE, (4, 4): 0,
+    }
+    assert {cell: int(distance[index.id_of(cell)]) for cell in expected} == expected
+    assert index.size == len(expected)
+
+
+def test_shortest_paths_are_as_long_as_the_distances():
+    index = maze_index()
+    assert shortest_path(index, (2, 2), (0, 4)) == \
+        [(2, 2), (2, 1), (2, 0), (1, 0), (0, 0), (0, 1), (0, 2), (0, 3), (0, 4)]
+
+    distance = distance_field(index, (4, 4))
+    for node, (x, y) in enumerate(index.coords):
+        path = shortest_path(index, (int(x), int(y)), (4, 4))
+        if distance[node] == UNREACHABLE:
+            assert path is None
+            continue
+        assert len(path) - 1 == distance[node]
+        steps = np.abs(np.diff(np.array(path), axis=0)).sum(axis=1)
+        assert (steps == 1).all() and all(cell in index for cell in path)
+
+
+def test_a_goal_off_the_paths_is_refused():
+    index = maze_index()
+    with pytest.raises(ValueError, match="not a path cell"):
+        distance_field(index, (1, 1))
+    with pytest.raises(ValueError, match="not a path cell"):
+        distance_field(index, (5, 0))
+    assert shortest_path(index, (0, 0), (1, 1)) is None
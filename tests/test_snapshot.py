@@ -0,0 +1,66 @@
+from constants.enums import FieldType
+from simulation.pheromones import ChunkedPheromoneStore, PathIndex
+from simulation.snapshot import Checkpointer, delta_file, load_snapshot, pheromone_file, save_snapshot
+
+import os
+import numpy as np
+
+
+def test_empty_store_round_trip(tmp_path):
+    grid = np.full((8, 6), FieldType.GRASS.value, dtype=np.uint8)
+    grid[2, 1:5] = FieldType.PATH.value
+    store = ChunkedPheromoneStore(PathIndex.from_grid(grid), 10.0)
+
+    file_name = str(tmp_path / "empty.npz")
+    save_snapshot(file_name, grid, None, store)
+    snapshot = load_snapshot(file_name)
+
+    assert len(snapshot.pheromones) == 1
+    assert len(snapshot.pheromones[0]) == 0
+    assert snapshot.layer_destinations.shape == (0, 2)
+    np.testing.assert_array_equal(snapshot.grid, grid)
+
+
+def restored(file_name: str, grid: np.ndarray) -> ChunkedPheromoneStore:
+    store = ChunkedPheromoneStore(PathIndex.from_grid(grid), 10.0)
+    load_snapshot(file_name, mmap=True).restore_pheromones(store)
+    return store
+
+
+def test_checkpoints_write_only_changed_rows(tmp_path):
+    grid = np.full((40, 30), FieldType.PATH.value, dtype=np.uint8)
+    store = ChunkedPheromoneStore(PathIndex.from_grid(grid), 10.0)
+    rng = np.random.default_rng(0)
+    file_name = str(tmp_path / "run.npz")
+    checkpointer = Checkpointer(file_name)
+
+    def walk(count: int):
+        nodes = rng.integers(0, store.index.size, count).astype(np.int32)
+        layers = np.array([store.layer_id(destination) for destination in [(1, 1), (30, 20)]], dtype=np.int32)
+        store.deposit_many(layers[rng.integers(0, 2, count)], nodes, rng.integers(0, 4, count),
+                           rng.random(count).astype(np.float32))
+        store.decay_many(np.zeros(count, dtype=np.int32), nodes[::-1].copy(), np.full(count, 0.3))
+
+    walk(200)
+    assert checkpointer.checkpoint(grid, None, store)
+    walk(20)
+    assert checkpointer.checkpoint(grid, None, store)
+    assert os.path.exists(delta_file(file_name, 1)) and not os.path.exists(pheromone_file(file_name))
+    assert len(load_snapshot(file_name).pheromones[1]) < len(store.rows()[0])
+    # a row zeroed since is written as zeros
+    layers, nodes, _ = store.rows()
+    store.assign(list(store.layers)[layers[0]], nodes[:1], np.zeros((1, 4), dtype=np.float32))
+    assert checkpointer.checkpoint(grid, None, store)
+    np.testing.assert_allclose(restored(file_name, grid).values, store.values)
+
+    # once the deltas outgrow the store they are folded into one file
+    for _ in range(5):
+        walk(2000)
+        checkpointer.checkpoint(grid, None, store)
+    assert os.path.exists(pheromone_file(file_name))
+    assert not checkpointer.checkpoint(grid, None, store)
+    np.testing.assert_allclose(restored(file_name, grid).values, store.values)
+
+    grid[0, 0] = FieldType.GRASS.value
+    assert checkpointer.checkpoint(grid, None, store)
+    assert not os.path.exists(pheromone_file(file_name)) and not os.path.exists(delta_file(file_name, 1))
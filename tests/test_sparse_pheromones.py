@@ -0,0 +1,125 @@
+from constants.enums import FieldType
+from simulation.pheromones import ChunkedPheromoneStore, PathIndex
+from simulation.sparse_pheromones import MIN_CAPACITY, RowTable, SparsePheromoneStore
+
+import numpy as np
+import pytest
+
+DESTINATIONS = [(0, 0), (6, 7), (31, 3)]
+
+
+def lattice() -> PathIndex:
+    grid = np.full((40, 30), FieldType.GRASS.value, dtype=np.uint8)
+    grid[::2, :] = FieldType.PATH.value
+    grid[:, ::3] = FieldType.PATH.value
+    return PathIndex.from_grid(grid)
+
+
+def run_both(sparse: SparsePheromoneStore, dense: ChunkedPheromoneStore, ticks: int, seed: int = 0):
+    """Apply the same random writes to both stores, evaporating the dense one by hand."""
+    rng = np.random.default_rng(seed)
+    size = sparse.index.size
+    # the same layer ids in both stores
+    for store in (sparse, dense):
+        for destination in DESTINATIONS:
+            store.layer_id(destination)
+    for _ in range(ticks):
+        sparse.tick()
+        dense.pool[:dense.allocated_chunks] *= np.float32(1 - sparse.evaporation_rate)
+
+        count = int(rng.integers(1, 200))
+        layers = rng.integers(0, len(DESTINATIONS), count).astype(np.int32)
+        # a few nodes so the same entries are written many times in a batch
+        nodes = rng.integers(0, min(size, 50), count).astype(np.int32)
+        directions = rng.integers(0, 4, count)
+        deposited = rng.random(count).astype(np.float32)
+        for store in (sparse, dense):
+            store.deposit_many(layers, nodes, directions, deposited)
+        deltas = rng.random(count)
+        for store in (sparse, dense):
+            store.decay_many(layers, nodes[::-1].copy(), deltas)
+
+        node = int(rng.integers(0, size))
+        for store in (sparse, dense):
+            store.deposit(DESTINATIONS[1], node, 2, 0.5)
+            store.decay(DESTINATIONS[1], node, 0.25)
+
+
+@pytest.mark.parametrize("ticks", [1, 60])
+def test_matches_chunked_store_without_cutoff(ticks):
+    index = lattice()
+    sparse = SparsePheromoneStore(index, 4.0, cutoff=0.0)
+    dense = ChunkedPheromoneStore(index, 4.0)
+    run_both(sparse, dense, ticks)
+
+    np.testing.assert_allclose(sparse.values, dense.values, rtol=1e-5, atol=1e-30)
+    nodes = np.arange(index.size, dtype=np.int32)
+    for destination in DESTINATIONS:
+        np.testing.assert_allclose(sparse.layer_values(destination), dense.layer_values(destination),
+                                   rtol=1e-5, atol=1e-30)
+        np.testing.assert_allclose(sparse.intensity(destination, nodes), dense.intensity(destination, nodes),
+                                   rtol=1e-5, atol=1e-6)
+
+
+def test_matches_chunked_store_with_evaporation():
+    index = lattice()
+    sparse = SparsePheromoneStore(index, 4.0, cutoff=1e-4, evaporation_rate=0.1)
+    dense = ChunkedPheromoneStore(index, 4.0)
+    # long enough for the scale to be folded into the values many times and the early deposits to evaporate
+    run_both(sparse, dense, 15 * sparse.fold_interval)
+
+    # rows are only dropped once all their values are below the cutoff
+    np.testing.assert_allclose(sparse.values, dense.values, rtol=1e-4, atol=1e-4)
+    layers, nodes, values = sparse.rows()
+    assert (values.max(axis=1) >= sparse.cutoff).all()
+    assert 0 < len(layers) == sparse.table.count < (dense.values.max(axis=2) > 0).sum()
+
+
+def test_weak_rows_are_dropped():
+    index = lattice()
+    store = SparsePheromoneStore(index, 4.0, cutoff=1e-2)
+    nodes = np.arange(100, dtype=np.int32)
+    layers = np.full(len(nodes), store.layer_id(DESTINATIONS[0]), dtype=np.int32)
+    store.deposit_many(layers, nodes, np.zeros(len(nodes), dtype=np.int32), np.full(len(nodes), 1.0, np.float32))
+    assert store.table.count == 100
+
+    # the first half decays below the cutoff and gives its rows back, which new rows take again
+    store.decay_many(layers[:50], nodes[:50], np.full(50, 200.0))
+    assert store.table.count == 50
+    assert not store.read(layers[:50], nodes[:50]).any()
+    store.deposit_many(layers[:50], nodes[:50] + 100, np.ones(50, dtype=np.int32), np.full(50, 1.0, np.float32))
+    assert store._pool_used == 100
+    np.testing.assert_array_equal(store.read(layers[:50], nodes[:50] + 100)[:, 1], 1.0)
+
+
+def test_row_table_insert_remove_and_reinsert_across_rebuild():
+    table = RowTable()
+    rng = np.random.default_rng(0)
+    keys = rng.choice(1 << 40, size=3 * MIN_CAPACITY, replace=False).astype(np.int64)
+    rows = np.arange(len(keys), dtype=np.int32)
+    first, removed = MIN_CAPACITY // 4, MIN_CAPACITY // 8
+
+    table.insert(keys[:first], rows[:first])
+    table.remove(table.find(keys[:removed]))
+    assert (table.find(keys[:removed]) == -1).all()
+    assert table.used > table.count
+
+    # the removed keys come back with new rows in the batch that grows the table, which drops the deleted slots
+    capacity = len(table.keys)
+    rows[:removed] += 10_000
+    table.insert(np.concatenate([keys[:removed], keys[first:]]), np.concatenate([rows[:removed], rows[first:]]))
+    assert len(table.keys) > capacity
+    assert table.used == table.count == len(keys)
+    np.testing.assert_array_equal(table.rows[table.find(keys)], rows)
+
+    # removed again and re-inserted without a rebuild, past the deleted slots left behind
+    capacity = len(table.keys)
+    table.remove(table.find(keys[::3]))
+    assert (table.find(keys[::3]) == -1).all()
+    np.testing.assert_array_equal(table.rows[table.find(keys[1::3])], rows[1::3])
+    rows[::3] += 20_000
+    table.insert(keys[::3], rows[::3])
+    assert len(table.keys) == capacity
+    np.testing.assert_array_equal(table.rows[table.find(keys)], rows)
+    assert table.count == len(table.live()) == len(keys)
+    assert (table.find(rng.choice(1 << 40, size=100) + (1 << 41)) == -1).all()
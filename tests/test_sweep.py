@@ -0,0 +1,70 @@
+from constants.enums import FieldType, PheromoneStorage, StepEngine
+from settings.simulation_settings import get_default_simulation_settings
+from simulation.sweep import Trial, apply_params, coerce_setting, run_trial
+
+import numpy as np
+import pytest
+
+
+@pytest.mark.parametrize("name, value, expected", [
+    ("population.engine", 2, StepEngine.COMPILED),
+    ("population.engine", 2.0, StepEngine.COMPILED),
+    ("population.engine", "compiled", StepEngine.COMPILED),
+    ("population.engine", "2", StepEngine.COMPILED),
+    ("generic.pheromone_storage", 1, PheromoneStorage.SPARSE),
+    ("generic.simple_map", 1, True),
+    ("generic.simple_map", "false", False),
+    ("generic.simple_map", "0", False),
+    ("generic.node_capacity", 3.0, 3),
+    ("generic.node_capacity", "3", 3),
+    ("generic.seed", 7.0, 7),
+    ("population.exploration_chance", 1, 1.0),
+    ("population.exploration_chance", "0.25", 0.25),
+    ("generic.source", (4.0, 5), (4, 5)),
+    ("generic.target", "12,3", (12, 3)),
+])
+def test_swept_values_take_the_type_of_their_setting(name, value, expected):
+    coerced = coerce_setting(name, value)
+    assert coerced == expected and type(coerced) is type(expected)
+
+
+@pytest.mark.parametrize("name, value, message", [
+    ("population.speed", 1, "unknown setting"),
+    ("seed", 1, "unknown setting"),
+    ("display.fps", 1, "unknown setting"),
+    ("generic.node_capacity", 1.5, "whole numbers"),
+    ("generic.node_capacity", "many", "takes a int"),
+    ("generic.simple_map", 2, "whole numbers"),
+    ("generic.simple_map", "yes", "takes a bool"),
+    ("population.engine", 0.5, "whole numbers"),
+    ("population.engine", 9, "not a valid StepEngine"),
+    ("population.engine", "fastest", "takes a StepEngine"),
+    ("generic.seed", float("inf"), "whole numbers"),
+    ("generic.source", "4", "x,y coordinates"),
+    ("generic.source", 4, "x,y coordinates"),
+    ("generic.source", (4.5, 5), "whole coordinates"),
+    ("generic.map_image_path", 1, "can't be swept"),
+    ("population.destinations", 1, "can't be swept"),
+])
+def test_bad_settings_and_values_are_refused(name, value, message):
+    with pytest.raises(ValueError, match=message):
+        coerce_setting(name, value)
+
+
+def test_params_are_applied_to_the_settings():
+    sim_settings = get_default_simulation_settings()
+    apply_params(sim_settings, {"population.engine": 0, "generic.node_capacity": 2.0, "generic.source": "3,4"})
+    assert sim_settings.population.engine == StepEngine.REFERENCE
+    assert sim_settings.generic.node_capacity == 2
+    assert sim_settings.generic.source == (3, 4)
+
+
+def test_a_swept_source_replaces_the_one_of_the_sweep():
+    grid = np.full((12, 5), FieldType.GRASS.value, dtype=np.uint8)
+    grid[1:11, 2] = FieldType.PATH.value
+    grid[5, 0:5] = FieldType.PATH.value
+    # (0, 0) isn't on a path, the run only starts with the swept source
+    result = run_trial(Trial({"generic.source": (5, 0)}, seed=0), (0, 0), (10, 2), max_ticks=300, interval=50,
+                       patience=2, grid=grid)
+    assert result.first_route_tick is not None
+    assert result.final_ratio >= 1
@@ -0,0 +1,56 @@
+from constants.enums import FieldType
+from simulation.tiled_map import MAP_COLORS, convert_map_image, field_types, pack_colors
+
+import numpy as np
+import pytest
+
+
+def striped_image() -> np.ndarray:
+    """A (4, 3, 3) image with every known color, one row per color and grass again in the last one."""
+    fields = list(MAP_COLORS) + [FieldType.GRASS]
+    return np.array([[MAP_COLORS[field]] * 3 for field in fields], dtype=np.uint8)
+
+
+def test_pixels_are_mapped_to_the_field_of_their_color():
+    image = striped_image()
+    image[0, 1] = MAP_COLORS[FieldType.BUILDINGS]
+    expected = np.array([[field.value] * 3 for field in list(MAP_COLORS) + [FieldType.GRASS]], dtype=np.uint8)
+    expected[0, 1] = FieldType.BUILDINGS.value
+
+    fields = field_types(image)
+    assert fields.dtype == np.uint8
+    np.testing.assert_array_equal(fields, expected)
+
+
+def test_colors_are_packed_into_one_integer():
+    np.testing.assert_array_equal(pack_colors(np.array([[255, 191, 0], [1, 2, 3]], dtype=np.uint8)),
+                                  [0xFFBF00, 0x010203])
+
+
+@pytest.mark.parametrize("color", [(0, 0, 1), (255, 191, 1), (255, 254, 255), (254, 191, 0)])
+def test_an_unknown_color_is_reported_with_its_position(color):
+    image = striped_image()
+    image[2, 1] = color
+    with pytest.raises(ValueError, match=r"Unknown color at 12, 1: \[" + " +".join(map(str, color))):
+        field_types(image, row_offset=10)
+
+
+def test_map_images_are_converted_in_bands(tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+    image = np.array([[MAP_COLORS[FieldType.PATH]] * 5] * 7, dtype=np.uint8)
+    image[::2, 1] = MAP_COLORS[FieldType.GRASS]
+    image[6, 4] = MAP_COLORS[FieldType.BUILDINGS]
+    image_path = str(tmp_path / "map.png")
+    Image.fromarray(image).save(image_path)
+
+    convert_map_image(image_path, str(tmp_path / "map.grid.npy"), band_rows=3)
+    grid = np.load(tmp_path / "map.grid.npy")
+    assert grid.shape == (5, 7)
+    np.testing.assert_array_equal(grid, field_types(image).T)
+    assert grid[4, 6] == FieldType.BUILDINGS.value
+
+    # the row of an unknown color counts from the top of the image, not of its band
+    image[4, 2] = (10, 20, 30)
+    Image.fromarray(image).save(image_path)
+    with pytest.raises(ValueError, match="Unknown color at 4, 2"):
+        convert_map_image(image_path, str(tmp_path / "map.grid.npy"), band_rows=3)
@@ -0,0 +1,36 @@
+from constants.enums import FieldType
+from settings.simulation_settings import get_default_simulation_settings
+from simulation.headless import HeadlessSimulation
+from simulation.worker import SimulationWorker
+
+import time
+import numpy as np
+
+
+def test_a_failing_step_pauses_the_worker_and_is_kept_for_the_ui():
+    grid = np.full((12, 5), FieldType.GRASS.value, dtype=np.uint8)
+    grid[1:11, 2] = FieldType.PATH.value
+    grid[5, 0:5] = FieldType.PATH.value
+    sim = HeadlessSimulation(None, get_default_simulation_settings(), (1, 2), (10, 2), grid=grid)
+    worker = SimulationWorker(sim.population, sim.grid, sim.objects, sim.nodes, 0.01, 10)
+    worker.start()
+    try:
+        worker.send("update_cell", (1, 2), False)
+        worker.send("step")
+        deadline = time.perf_counter() + 5
+        while worker.error is None and time.perf_counter() < deadline:
+            time.sleep(0.01)
+
+        error = worker.take_error()
+        assert isinstance(error, ValueError)
+        assert worker.take_error() is None
+        assert worker.is_alive() and worker.paused
+
+        # the run goes on once the source is set again
+        worker.send("set_source", (5, 0))
+        worker.send("step")
+        while sim.population.ticks == 0 and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        assert sim.population.ticks == 1 and worker.error is None
+    finally:
+        worker.stop()